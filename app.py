@@ -1,15 +1,21 @@
 import streamlit as st
-import google.generativeai as genai
-import PyPDF2
-import os
-import json
 from datetime import datetime
-import re
-import io # Import io for handling uploaded file bytes
+from utils import (
+    read_pdf as utils_read_pdf,
+    stream_contract_data as utils_stream_contract_data,
+    CONTRACT_FIELDS,
+    MODEL_NAME,
+    PDFReadError,
+    ExtractionCache,
+    PdfTextCache,
+    LLMConfigurationError,
+    LLMGenerationError,
+    JSONParsingError,
+)
 
 # --- Configuration ---
 # PDF_PATH is removed, we use file uploader now
-MODEL_NAME = "gemini-2.5-pro-exp-03-25" # Using latest available model, adjust if needed
+# The model comes from utils.MODEL_NAME, so the app and the CLI extract with the same one
 # It's best practice to set the API key as an environment variable
 # For local testing, you might uncomment the line below and paste your key
 # os.environ['GEMINI_API_KEY'] = "YOUR_API_KEY_HERE" 
@@ -39,207 +45,66 @@ def get_api_key():
 
 def read_pdf(file_input):
     """Reads text content from a PDF file (path or uploaded file object)."""
-    text = ""
+    # Uploaded files are BytesIO objects, so utils.read_pdf parses them in place without copying,
+    # and a file whose bytes were parsed before (by any click, session or batch run) is not parsed again
     try:
-        # Check if input is a file path (string) or an uploaded file object
-        if isinstance(file_input, str): # File path
-            if not os.path.exists(file_input):
-                 st.error(f"Error: PDF file not found at '{file_input}'.")
-                 return None
-            file_stream = open(file_input, 'rb')
-        elif hasattr(file_input, 'read'): # Uploaded file object (has read method)
-            # Use io.BytesIO to wrap the bytes from the uploaded file
-            # Reset position just in case it was read before
-            file_input.seek(0)
-            file_stream = io.BytesIO(file_input.read())
-        else:
-            st.error("Invalid input type for read_pdf. Expected file path or uploaded file object.")
-            return None
-
-        reader = PyPDF2.PdfReader(file_stream)
-        for page in reader.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\\n" # Add newline between pages
-
-        # Close the stream if it was opened from a file path
-        if isinstance(file_input, str):
-            file_stream.close()
-
-        return text
-
-    except FileNotFoundError: # Should be caught by os.path.exists for path case
+        return utils_read_pdf(file_input, text_cache=get_text_cache())
+    except FileNotFoundError:
         st.error(f"Error: PDF file not found at '{file_input}'.")
-        return None
-    except PyPDF2.errors.PdfReadError:
-        st.error("Error reading PDF: Invalid PDF file. It might be corrupted or password-protected.")
-        return None
-    except Exception as e:
-        st.error(f"Error reading PDF: {e}")
-        return None
+    except PDFReadError as e:
+        st.error(f"Error reading PDF: {e} It might be corrupted or password-protected.")
+    except TypeError as e:
+        st.error(f"Invalid input type for read_pdf: {e}")
+    return None
 
-def build_llm_prompt(contract_text):
-    """Builds the LLM prompt with contract text and JSON instructions."""
-    # Ensure contract_text is properly escaped for JSON within the prompt if necessary
-    # For simple text insertion, direct formatting is usually fine.
-    prompt = f"""
-Parse the following contract text into a JSON object. Adhere strictly to the specified fields, data types, formats, and accepted categorical values. If information for a field is not found, use null where allowed, or follow the specific instructions for that field.
-
-Return ONLY the JSON object, without any introductory text, explanations, or markdown formatting.
-
-JSON Structure and Instructions:
-
-{{
-  "Partner Name": {{
-    "description": "The name of the partner per the contract denoted as 'Subscriber'",
-    "type": "String",
-    "value": "Extract from contract" 
-  }},
-  "Effective date": {{
-    "description": "The effective date of the contract",
-    "type": "MM/DD/YYYY",
-    "value": "Find the date in the contract (e.g., 'Month DD, YYYY', 'MM/DD/YYYY', etc.) and convert it to MM/DD/YYYY format. Use null if not found."
-  }},
-  "Term length (days)": {{
-    "description": "The length of the contract in days",
-    "type": "Integer",
-    "value": "Calculate or extract integer, null if not specified"
-  }},
-  "Termination date": {{
-    "description": "The end date of the contract",
-    "type": "MM/DD/YYYY",
-    "value": "Find the date in the contract (e.g., 'Month DD, YYYY', 'MM/DD/YYYY', etc.) and convert it to MM/DD/YYYY format. Use null if not found."
-  }},
-  "Active Lore User Pricing/month": {{
-    "description": "The price Lore is charging per user, per month",
-    "type": "$ Integer",
-    "value": "Extract integer value, null if not specified" 
-  }},
-  "Eligible users": {{
-    "description": "Number of eligible users",
-    "type": "Integer",
-    "value": 0 
-  }},
-  "Lore users": {{
-    "description": "Number of Lore users",
-    "type": "Integer",
-    "value": 0
-  }},
-  "Total Monthly Active Users": {{
-    "description": "Total MAU",
-    "type": "Integer",
-    "value": 0 
-  }},
-  "Community Access": {{
-    "description": "Whether the signing Partner will provide access to the Lore community",
-    "type": "Boolean",
-    "value": "Extract True/False, null if not specified"
-  }},
-  "Data deletion policy (lorebot)": {{
-    "description": "Whether a data deletion policy is specifically stipulated",
-    "type": "Boolean",
-    "value": "Extract True/False, null if not specified" 
-  }},
-  "Timeframe (hours)": {{
-    "description": "Timeframe in hours for Lore to delete personal data per policy",
-    "type": "Integer",
-    "value": "Extract integer, null if no policy or not specified"
-  }},
-  "Dependents allowed": {{
-    "description": "Are dependents included in the list of eligible users?",
-    "type": "Boolean",
-    "value": "Extract True/False, null if not specified"
-  }},
-  "Eligibility": {{
-    "description": "Whether all employees are included or only those on insurance ('all' or 'only_insured')",
-    "type": "String",
-    "accepted_values": ["all", "only_insured"],
-    "value": "Extract value or null"
-  }}
-}}
-
-Contract Text:
---- START CONTRACT ---
-{contract_text}
---- END CONTRACT ---
-
-JSON Output:
-"""
-    return prompt
-
-def parse_llm_response(response_text):
-    """Parses the LLM response to extract the JSON object."""
-    # Remove potential markdown fences and surrounding whitespace
-    match = re.search(r"```json\s*({.*?})\s*```", response_text, re.DOTALL | re.IGNORECASE)
-    if match:
-        json_str = match.group(1)
-    else:
-        # If no markdown fences, assume the response is the JSON object itself
-        # Find the first '{' and the last '}'
-        start = response_text.find('{')
-        end = response_text.rfind('}')
-        if start != -1 and end != -1 and end > start:
-             json_str = response_text[start:end+1]
-        else:
-            st.error("Could not find valid JSON in the LLM response.")
-            st.code(response_text) # Show the raw response for debugging
-            return None
+@st.cache_resource
+def get_extraction_cache():
+    """Returns the on-disk extraction cache shared with main.py (one instance per server)."""
+    return ExtractionCache()
 
-    try:
-        # Load the JSON string into a Python dictionary
-        parsed_json = json.loads(json_str)
-        # Extract the 'value' from each field
-        extracted_data = {k: v.get('value', None) for k, v in parsed_json.items()}
-        return extracted_data
-    except json.JSONDecodeError as e:
-        st.error(f"Error decoding JSON from LLM response: {e}")
-        st.text("Raw JSON string received:")
-        st.code(json_str) # Show the string that failed parsing
-        return None
-    except Exception as e:
-        st.error(f"An unexpected error occurred during JSON parsing: {e}")
-        st.code(response_text)
-        return None
+@st.cache_resource
+def get_text_cache():
+    """Returns the on-disk PDF text cache shared with main.py (one instance per server)."""
+    return PdfTextCache()
 
 
-@st.cache_data(show_spinner="Parsing contract with AI...") # Cache the result based on text content
 def get_contract_data(contract_text, api_key):
-    """Sends prompt to Gemini and parses the response."""
-    # Ensure API key is configured (it should be from get_api_key())
-    genai.configure(api_key=api_key)
-    # Use a try-except block for model initialization as well
+    """Streams the contract through Gemini (or the shared extraction cache), showing each field as it arrives.
+
+    Returns the parsed data once the response is complete, or None on failure.
+    """
+    preview = st.empty()
+    with preview.container():
+        st.subheader("Parsing contract with AI...")
+        cols = st.columns(2)
+        half = (len(CONTRACT_FIELDS) + 1) // 2
+        placeholders = {field: cols[0 if i < half else 1].empty() for i, field in enumerate(CONTRACT_FIELDS)}
+        for field, placeholder in placeholders.items():
+            placeholder.caption(f"{field}: ...")
+
+    parsed_data = {}
     try:
-        model = genai.GenerativeModel(MODEL_NAME)
-    except Exception as e:
+        for field, value in utils_stream_contract_data(contract_text, api_key, model_name=MODEL_NAME,
+                                                       cache=get_extraction_cache()):
+            parsed_data[field] = value
+            if field in placeholders:
+                placeholders[field].markdown(f"**{field}:** {value if value is not None else '—'}")
+    except LLMConfigurationError as e:
         st.error(f"Error initializing Gemini model ({MODEL_NAME}): {e}")
         st.error("Please ensure the model name is correct and you have access.")
         return None
-
-    prompt = build_llm_prompt(contract_text)
-    try:
-        response = model.generate_content(prompt)
-        # Accessing the text part correctly based on the library's structure
-        if hasattr(response, 'text'):
-             response_text = response.text
-        # Add handling for potential BlockedPromptException or other safety issues
-        elif hasattr(response, 'prompt_feedback') and response.prompt_feedback.block_reason:
-             st.error(f"Content generation blocked. Reason: {response.prompt_feedback.block_reason}")
-             st.write(response.prompt_feedback)
-             return None
-        elif isinstance(response, str):
-             response_text = response
-        else:
-            # Handle potential variations in response structure if necessary
-            st.warning(f"Unexpected response structure from Gemini: {type(response)}")
-            st.write(response) # Uncomment to debug response structure
-            st.error("Could not extract text from Gemini response.")
-            return None
-
-        return parse_llm_response(response_text)
-    except Exception as e:
+    except JSONParsingError as e:
+        st.error(f"Error decoding JSON from LLM response: {e}")
+        return None
+    except LLMGenerationError as e:
         st.error(f"Error calling Gemini API: {e}")
-        # Consider logging the full exception details here if needed
         return None
+    except ValueError as e:
+        st.error(str(e))
+        return None
+    finally:
+        preview.empty() # The editable form below takes over once parsing finishes
+    return parsed_data
 
 # --- Streamlit App UI ---
 
@@ -283,7 +148,7 @@ if st.session_state.get("parse_button") and st.session_state.uploaded_file:
     contract_text = read_pdf(st.session_state.uploaded_file)
 
     if contract_text:
-        # Get Parsed Data from LLM (will use cache if text is identical)
+        # Get Parsed Data from LLM (served from the on-disk cache if this contract was parsed before)
         # Pass API key explicitly as it might not be in scope otherwise depending on execution flow
         parsed_data = get_contract_data(contract_text, api_key)
         st.session_state.parsed_data = parsed_data
@@ -331,7 +196,11 @@ if st.session_state.edited_data:
         "Data deletion policy (lorebot)": {"type": "boolean"},
         "Timeframe (hours)": {"type": "number", "min": 0, "step": 1},
         "Dependents allowed": {"type": "boolean"},
-        "Eligibility": {"type": "select", "options": ["all", "only_insured", None]}
+        "Eligibility": {"type": "select", "options": ["all", "only_insured", None]},
+        "Population of eligible users": {"type": "select", "options": ["Employees Only", "Employees and Dependents", "Medicare", "Medicare Advantage", "Other", None]},
+        "Limit on number of users": {"type": "number", "min": 0, "step": 1},
+        "Data sharing agreement or business associate agreement": {"type": "select", "options": ["Data sharing agreement", "Business associate agreement", None]},
+        "Users permitted to convert Lore points to money": {"type": "boolean"},
     }
 
     # Determine column for each item
@@ -347,7 +216,7 @@ if st.session_state.edited_data:
 
         with col:
             if field_def["type"] == "text":
-                 edited_data[key] = st.text_input(key, value=value if value is not None else "", key=widget_key)
+                 edited_data[key] = st.text_input(key, value=str(value) if value is not None else "", key=widget_key)
             elif field_def["type"] == "number":
                  # Handle potential '$' prefix in value if LLM includes it despite instructions
                  current_value_num = value # Keep track of original for int conversion attempt
@@ -0,0 +1,797 @@
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import threading
+import logging
+import argparse
+import resource
+import tempfile
+import statistics
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from google.api_core import exceptions as google_exceptions
+
+import utils
+from utils import (
+    read_contract_file,
+    PdfTextCache,
+    build_llm_prompt,
+    parse_llm_response,
+    find_json_object,
+    get_contract_data,
+    stream_contract_data,
+    aget_contract_data_batch,
+    LLMGenerationError,
+)
+
+# --- Configuration ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_FILES = [
+    os.path.join(BASE_DIR, "Lore SaaS Agreement and Order Form April 2025.md"),
+    os.path.join(BASE_DIR, "EXECUTED - Lore and Swire SaaS Agreement and Order Form.pdf"),
+]
+CANNED_OUTPUT_FILE = os.path.join(BASE_DIR, "contract_output.json")
+FAKE_API_KEY = "benchmark-fake-key"
+
+
+
+# --- Fake Gemini Backend ---
+
+def build_canned_response(canned_output_file=CANNED_OUTPUT_FILE):
+    """Returns the values in contract_output.json as the flat JSON object the response schema asks for."""
+    with open(canned_output_file, 'r', encoding='utf-8') as f:
+        values = json.load(f)
+    return json.dumps(values)
+
+
+_PACKED_ID_RE = re.compile(r"^Contract ID: (\S+)$", re.MULTILINE)
+
+
+class FakeResponse:
+    """Minimal stand-in for a GenerateContentResponse."""
+
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """
+    Local stand-in for genai.GenerativeModel.
+
+    Returns `response_text` after a configurable delay and fails a
+    configurable fraction of calls with a provider quota error, without any
+    network access or API key.
+    """
+
+    latency_seconds = 0.5
+    latency_jitter_seconds = 0.0
+    error_rate = 0.0
+    response_text = None
+    calls = 0
+    # Input characters billed at the full rate, and those served from cached content
+    input_characters = 0
+    cached_characters = 0
+    output_characters = 0
+    # Per-model overrides: latency in seconds, and {field: value} patched into the canned response
+    model_latency_seconds = {}
+    model_field_overrides = {}
+    # Functions applied to the text of the next responses, one per call
+    corrupt_next = []
+    _lock = None
+
+    def __init__(self, model_name, system_instruction=None, **kwargs):
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        self.kwargs = kwargs
+        self._client = None
+        self._async_client = None
+        self._cached_content = None
+
+    @classmethod
+    def from_cached_content(cls, cached_content, generation_config=None, **kwargs):
+        model = cls(cached_content.model, generation_config=generation_config, **kwargs)
+        model._cached_content = cached_content
+        return model
+
+    def _bill(self, prompt):
+        with self._lock:
+            if self._cached_content is not None:
+                FakeGenerativeModel.cached_characters += len(self._cached_content.system_instruction)
+            else:
+                FakeGenerativeModel.input_characters += len(self.system_instruction or "")
+            FakeGenerativeModel.input_characters += len(prompt)
+
+    @classmethod
+    def _next_outcome(cls, model_name=None):
+        with cls._lock:
+            cls.calls += 1
+        latency = cls.model_latency_seconds.get(model_name, cls.latency_seconds)
+        delay = max(0.0, latency + random.uniform(-cls.latency_jitter_seconds, cls.latency_jitter_seconds))
+        failed = random.random() < cls.error_rate
+        return delay, failed
+
+    def _response_for(self, prompt, generation_config):
+        """
+        The canned response (limited to the fields in the model's response
+        schema, like the real service), or one copy per contract ID for a
+        packed request.
+        """
+        overrides = self.model_field_overrides.get(self.model_name)
+        schema = (generation_config or self.kwargs.get("generation_config") or {}).get("response_schema") or {}
+        if "contracts" not in schema.get("properties", {}):
+            text = self.response_text
+            if overrides or len(schema.get("properties", utils.CONTRACT_FIELDS)) < len(utils.CONTRACT_FIELDS):
+                values = {**json.loads(text), **(overrides or {})}
+                if "properties" in schema:
+                    values = {field: value for field, value in values.items() if field in schema["properties"]}
+                text = json.dumps(values)
+            with self._lock:
+                corrupt = FakeGenerativeModel.corrupt_next.pop(0) if FakeGenerativeModel.corrupt_next else None
+            return corrupt(text) if corrupt else text
+        values = json.loads(self.response_text)
+        contract_ids = _PACKED_ID_RE.findall(prompt)
+        return json.dumps({"contracts": [{"contract_id": contract_id, **values} for contract_id in contract_ids]})
+
+    def generate_content(self, prompt, stream=False, generation_config=None, **kwargs):
+        self._bill(prompt)
+        delay, failed = self._next_outcome(self.model_name)
+        if stream:
+            return self._stream(delay, failed, self._response_for(prompt, generation_config))
+        time.sleep(delay)
+        if failed:
+            raise google_exceptions.ResourceExhausted("Fake quota exceeded")
+        text = self._response_for(prompt, generation_config)
+        with self._lock:
+            FakeGenerativeModel.output_characters += len(text)
+        return FakeResponse(text)
+
+    def _stream(self, delay, failed, text, chunks=20):
+        """Yields `text` in `chunks` pieces, spreading the latency evenly across them."""
+        if failed:
+            time.sleep(delay)
+            raise google_exceptions.ResourceExhausted("Fake quota exceeded")
+        size = -(-len(text) // chunks)
+        for start in range(0, len(text), size):
+            time.sleep(delay / chunks)
+            yield FakeResponse(text[start:start + size])
+
+    async def generate_content_async(self, prompt, generation_config=None, **kwargs):
+        self._bill(prompt)
+        delay, failed = self._next_outcome(self.model_name)
+        await asyncio.sleep(delay)
+        if failed:
+            raise google_exceptions.ResourceExhausted("Fake quota exceeded")
+        text = self._response_for(prompt, generation_config)
+        with self._lock:
+            FakeGenerativeModel.output_characters += len(text)
+        return FakeResponse(text)
+
+
+class FakeCachedContent:
+    """
+    Local stand-in for genai.caching.CachedContent.
+
+    Like the real service, it rejects prefixes smaller than `min_tokens`, so
+    the fallback to a plain system instruction can be exercised offline.
+    """
+
+    min_tokens = 0
+    created = 0
+
+    def __init__(self, model, name, system_instruction):
+        self.model = model
+        self.name = name
+        self.system_instruction = system_instruction
+
+    @classmethod
+    def create(cls, model, *, system_instruction=None, **kwargs):
+        system_instruction = system_instruction or ""
+        if utils.estimate_tokens(system_instruction) < cls.min_tokens:
+            raise google_exceptions.InvalidArgument(
+                f"Cached content is too small: below the minimum of {cls.min_tokens} tokens")
+        cls.created += 1
+        return cls(model, f"cachedContents/fake-{cls.created}", system_instruction)
+
+
+def install_fake_backend(latency_seconds=0.5, latency_jitter_seconds=0.0, error_rate=0.0):
+    """
+    Swaps genai.GenerativeModel for FakeGenerativeModel and resets the shared model pool.
+
+    Returns:
+        A function that puts the real genai classes back and clears the
+        model pool again, so no fake model outlives the caller's use of it.
+    """
+    real_model, real_cached_content = utils.genai.GenerativeModel, utils.genai.caching.CachedContent
+    FakeGenerativeModel.latency_seconds = latency_seconds
+    FakeGenerativeModel.latency_jitter_seconds = latency_jitter_seconds
+    FakeGenerativeModel.error_rate = error_rate
+    FakeGenerativeModel.response_text = build_canned_response()
+    FakeGenerativeModel.calls = 0
+    FakeGenerativeModel.input_characters = 0
+    FakeGenerativeModel.cached_characters = 0
+    FakeGenerativeModel.output_characters = 0
+    FakeGenerativeModel.model_latency_seconds = {}
+    FakeGenerativeModel.model_field_overrides = {}
+    FakeGenerativeModel.corrupt_next = []
+    FakeGenerativeModel._lock = threading.Lock()
+    FakeCachedContent.created = 0
+    utils.genai.GenerativeModel = FakeGenerativeModel
+    utils.genai.caching.CachedContent = FakeCachedContent
+    utils.clear_model_pool()
+
+    def uninstall():
+        utils.genai.GenerativeModel = real_model
+        utils.genai.caching.CachedContent = real_cached_content
+        utils.clear_model_pool()
+    return uninstall
+
+
+# --- Measurements ---
+
+def _summarize(samples):
+    """Returns mean/p50/p95/max (in milliseconds) of a list of durations in seconds."""
+    ordered = sorted(samples)
+    p95_index = min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))
+    return {
+        "n": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "p50_ms": round(statistics.median(ordered) * 1000, 3),
+        "p95_ms": round(ordered[p95_index] * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def _time(fn, iterations):
+    samples = []
+    result = None
+    for _ in range(iterations):
+        started = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - started)
+    return samples, result
+
+
+def bench_stages(fixtures, iterations):
+    """
+    Times read -> build_llm_prompt -> get_contract_data -> parse_llm_response
+    for each fixture, plus reads served from a warm PDF text cache.
+    """
+    results = {}
+    text_cache = PdfTextCache(tempfile.mkdtemp(prefix="bench_text_cache_"))
+    for path in fixtures:
+        name = os.path.basename(path)
+        # PDF text extraction is slow, so it gets fewer rounds than the in-memory stages
+        read_samples, contract_text = _time(lambda: read_contract_file(path), max(1, iterations // 10))
+        read_contract_file(path, text_cache)
+        cached_read_samples, _ = _time(lambda: read_contract_file(path, text_cache), iterations)
+        prompt_samples, prompt = _time(lambda: build_llm_prompt(contract_text), iterations)
+        extract_samples, _ = _time(lambda: get_contract_data(contract_text, FAKE_API_KEY), max(1, iterations // 10))
+        parse_samples, _ = _time(lambda: parse_llm_response(FakeGenerativeModel.response_text), iterations)
+        results[name] = {
+            "characters": len(contract_text),
+            "prompt_characters": len(prompt),
+            "read": _summarize(read_samples),
+            "read_cached": _summarize(cached_read_samples),
+            "build_llm_prompt": _summarize(prompt_samples),
+            "get_contract_data": _summarize(extract_samples),
+            "parse_llm_response": _summarize(parse_samples),
+        }
+    return results
+
+
+def bench_streaming(fixtures, iterations):
+    """Compares time-to-first-field of stream_contract_data with the full get_contract_data latency."""
+    results = {}
+    for path in fixtures:
+        contract_text = read_contract_file(path)
+        first_field_samples, total_samples = [], []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            first = None
+            for _ in stream_contract_data(contract_text, FAKE_API_KEY):
+                if first is None:
+                    first = time.perf_counter() - started
+            total_samples.append(time.perf_counter() - started)
+            first_field_samples.append(first)
+        results[os.path.basename(path)] = {
+            "time_to_first_field": _summarize(first_field_samples),
+            "time_to_all_fields": _summarize(total_samples),
+        }
+    return results
+
+
+def bench_context_cache(fixtures, contracts):
+    """
+    Compares the input billed per contract with the instruction prefix sent
+    every time, served from cached content, and after falling back because
+    the prefix is below the provider's minimum cacheable size.
+    """
+    fixture_texts = [read_contract_file(path) for path in fixtures]
+    texts = [fixture_texts[i % len(fixture_texts)] for i in range(contracts)]
+    prefix_tokens = utils.estimate_tokens(utils.SYSTEM_INSTRUCTION)
+    latency_seconds = FakeGenerativeModel.latency_seconds
+    FakeGenerativeModel.latency_seconds = 0.0 # Only billing is measured here
+    results = []
+    try:
+        for label, context_cache, min_tokens in (("off", False, 0), ("cached", True, 0),
+                                                 ("fallback", True, prefix_tokens + 1)):
+            utils.clear_model_pool()
+            FakeCachedContent.min_tokens = min_tokens
+            FakeCachedContent.created = 0
+            FakeGenerativeModel.input_characters = 0
+            FakeGenerativeModel.cached_characters = 0
+            for text in texts:
+                get_contract_data(text, FAKE_API_KEY, context_cache=context_cache)
+            results.append({
+                "mode": label,
+                "contracts": contracts,
+                "caches_created": FakeCachedContent.created,
+                "input_tokens_per_contract": round(FakeGenerativeModel.input_characters / utils.CHARS_PER_TOKEN / contracts),
+                "cached_tokens_per_contract": round(FakeGenerativeModel.cached_characters / utils.CHARS_PER_TOKEN / contracts),
+            })
+    finally:
+        FakeGenerativeModel.latency_seconds = latency_seconds
+        FakeCachedContent.min_tokens = 0
+        utils.clear_model_pool()
+    return results
+
+
+def bench_packing(fixtures, contracts, small_chars, concurrency):
+    """
+    Extracts `contracts` small documents (the first `small_chars` characters of
+    each fixture, standing in for short order forms) one per request and
+    packed, and reports requests made and contracts/second for each.
+    """
+    fixture_texts = [read_contract_file(path)[:small_chars] for path in fixtures]
+    # Vary each text so no two contracts are identical
+    texts = [f"{fixture_texts[i % len(fixture_texts)]}\nReference: {i}" for i in range(contracts)]
+    results = []
+    for mode in ("single", "packed"):
+        calls_before = FakeGenerativeModel.calls
+        started = time.perf_counter()
+        if mode == "single":
+            errors = _run_threaded(texts, concurrency)
+        else:
+            outcomes = utils.get_contract_data_packed(texts, FAKE_API_KEY, max_workers=concurrency)
+            errors = sum(isinstance(outcome, Exception) for outcome in outcomes)
+        elapsed = time.perf_counter() - started
+        results.append({
+            "mode": mode,
+            "contracts": contracts,
+            "contract_characters": small_chars,
+            "requests": FakeGenerativeModel.calls - calls_before,
+            "errors": errors,
+            "seconds": round(elapsed, 3),
+            "contracts_per_second": round(contracts / elapsed, 2),
+        })
+    return results
+
+
+def bench_rules(fixtures, iterations):
+    """Runs the rule-based pre-extractor over each fixture and reports per-field hit rate and latency."""
+    rules = utils.RuleExtractor()
+    resolved = {}
+    for path in fixtures:
+        contract_text = read_contract_file(path)
+        for _ in range(iterations):
+            values, _ = rules.extract(contract_text)
+        resolved[os.path.basename(path)] = sorted(values)
+    return {"fields": rules.stats(), "resolved": resolved}
+
+
+def bench_normalize(fixtures, iterations):
+    """Reports the character/token reduction of `normalize_contract_text` on each fixture, and its cost."""
+    results = {}
+    for path in fixtures:
+        contract_text = read_contract_file(path)
+        stats = {}
+        samples, _ = _time(lambda: utils.normalize_contract_text(contract_text, stats=stats), iterations)
+        results[os.path.basename(path)] = {
+            "characters_before": stats["characters_before"],
+            "characters_after": stats["characters_after"],
+            "tokens_before": stats["tokens_before"],
+            "tokens_after": stats["tokens_after"],
+            "sections_dropped": len(stats["sections_dropped"]),
+            "normalize": _summarize(samples),
+        }
+    return results
+
+
+def bench_incremental(fixtures):
+    """
+    Amends one phrase of each fixture and compares a full re-extraction with
+    `get_contract_data_incremental` (fields requested and input billed).
+    """
+    amendments = (("monthly reports", "quarterly reports"), ("business associate agreement", "data sharing agreement"))
+    results = []
+    for path in fixtures:
+        previous_text = read_contract_file(path)
+        for old, new in amendments:
+            if old not in previous_text:
+                continue
+            new_text = previous_text.replace(old, new, 1)
+            previous_data = get_contract_data(previous_text, FAKE_API_KEY)
+            FakeGenerativeModel.input_characters = 0
+            get_contract_data(new_text, FAKE_API_KEY)
+            full_characters = FakeGenerativeModel.input_characters
+            FakeGenerativeModel.input_characters = 0
+            provenance = {}
+            utils.get_contract_data_incremental(previous_text, new_text, FAKE_API_KEY, previous_data=previous_data,
+                                                provenance=provenance)
+            results.append({
+                "fixture": os.path.basename(path),
+                "amendment": f"{old} -> {new}",
+                "fields_reextracted": sum(entry["source"] == "llm" for entry in provenance.values()),
+                "full_input_characters": full_characters,
+                "incremental_input_characters": FakeGenerativeModel.input_characters,
+            })
+    return results
+
+
+def bench_cascade(fixtures, contracts, fast_latency_seconds, flawed_every=4):
+    """
+    Compares single-model extraction with `get_contract_data_cascade`, with
+    and without rule checks. The fast model answers in `fast_latency_seconds`
+    and returns invalid values for two fields on every `flawed_every`-th
+    contract; accuracy counts fields that match the large model's answer.
+    """
+    flawed = {"Eligibility": "all employees", "Term length (days)": "one year"}
+    expected = json.loads(FakeGenerativeModel.response_text)
+    FakeGenerativeModel.model_latency_seconds = {utils.FAST_MODEL_NAME: fast_latency_seconds}
+    rows = []
+    try:
+        for path in fixtures:
+            contract_text = read_contract_file(path)
+            for mode, rules in (("single", None), ("cascade", None), ("cascade+rules", utils.RuleExtractor())):
+                samples, escalated, correct = [], 0, 0
+                for i in range(contracts):
+                    FakeGenerativeModel.model_field_overrides = {utils.FAST_MODEL_NAME: flawed} if i % flawed_every == 0 else {}
+                    provenance = {}
+                    started = time.perf_counter()
+                    if mode == "single":
+                        data = get_contract_data(contract_text, FAKE_API_KEY)
+                    else:
+                        data = utils.get_contract_data_cascade(contract_text, FAKE_API_KEY, rules=rules,
+                                                               provenance=provenance)
+                    samples.append(time.perf_counter() - started)
+                    escalated += sum("escalated" in entry for entry in provenance.values())
+                    correct += sum(data.get(field) == expected.get(field) for field in utils.CONTRACT_FIELDS)
+                rows.append({
+                    "fixture": os.path.basename(path),
+                    "mode": mode,
+                    "latency": _summarize(samples),
+                    "escalated_per_contract": round(escalated / contracts, 2),
+                    "accuracy": round(correct / (contracts * len(utils.CONTRACT_FIELDS)), 3),
+                })
+    finally:
+        FakeGenerativeModel.model_latency_seconds = {}
+        FakeGenerativeModel.model_field_overrides = {}
+    return rows
+
+
+REPAIR_CASES = {
+    "trailing comma, single quotes": lambda text: text.replace('"', "'").replace("}", ",}"),
+    "truncated at 60%": lambda text: text[:len(text) * 3 // 5],
+    "invalid values": lambda text: json.dumps({**json.loads(text), "Eligibility": "everyone",
+                                               "Term length (days)": "one year"}),
+    "unrecoverable": lambda text: "I'm sorry, I can't help with that.",
+}
+
+
+FIELD_SUBSETS = {
+    "all fields": None,
+    "renewal alerts": ["Termination date"],
+    "BAA audit": ["Data sharing agreement or business associate agreement"],
+    "pricing": ["Active Lore User Pricing/month", "Eligible users", "Limit on number of users"],
+}
+
+
+def bench_fields(fixtures):
+    """Compares the prompt, billed input and response size of a full extraction with narrow `fields=` queries."""
+    rows = []
+    for path in fixtures:
+        contract_text = read_contract_file(path)
+        for name, fields in FIELD_SUBSETS.items():
+            FakeGenerativeModel.input_characters = 0
+            FakeGenerativeModel.output_characters = 0
+            data = get_contract_data(contract_text, FAKE_API_KEY, fields=fields)
+            rows.append({
+                "fixture": os.path.basename(path),
+                "subset": name,
+                "fields": len(data),
+                "instruction_characters": len(build_llm_prompt("", fields=fields)),
+                "input_characters": FakeGenerativeModel.input_characters,
+                "output_characters": FakeGenerativeModel.output_characters,
+            })
+    return rows
+
+
+def bench_repair(fixtures):
+    """
+    Corrupts the first response of an extraction in several ways and reports
+    how `get_contract_data` recovers: extra calls, the input they were billed
+    for next to a full extraction, and whether the result matches.
+    """
+    expected = json.loads(FakeGenerativeModel.response_text)
+    rows = []
+    for path in fixtures:
+        contract_text = read_contract_file(path)
+        FakeGenerativeModel.input_characters = 0
+        get_contract_data(contract_text, FAKE_API_KEY, repair=True)
+        full_characters = FakeGenerativeModel.input_characters
+        for case, corrupt in REPAIR_CASES.items():
+            FakeGenerativeModel.corrupt_next = [corrupt]
+            calls = FakeGenerativeModel.calls
+            FakeGenerativeModel.input_characters = 0
+            try:
+                data = get_contract_data(contract_text, FAKE_API_KEY, repair=True)
+                outcome = "ok" if data == expected else "mismatch"
+            except utils.JSONParsingError:
+                outcome = "JSONParsingError"
+            rows.append({
+                "fixture": os.path.basename(path),
+                "case": case,
+                "outcome": outcome,
+                "follow_up_calls": FakeGenerativeModel.calls - calls - 1,
+                "follow_up_input_characters": FakeGenerativeModel.input_characters - full_characters,
+                "full_input_characters": full_characters,
+            })
+    FakeGenerativeModel.corrupt_next = []
+    return rows
+
+
+def _run_threaded(texts, workers):
+    errors = 0
+
+    def extract(text):
+        try:
+            get_contract_data(text, FAKE_API_KEY)
+            return True
+        except LLMGenerationError:
+            return False
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for ok in executor.map(extract, texts):
+            errors += not ok
+    return errors
+
+
+def _run_async(texts, workers):
+    results = asyncio.run(aget_contract_data_batch(texts, FAKE_API_KEY, max_concurrency=workers))
+    return sum(isinstance(result, Exception) for result in results)
+
+
+def bench_throughput(fixtures, contracts, concurrency_levels, mode="threads"):
+    """Extracts `contracts` documents at each concurrency level and reports contracts/second and peak memory."""
+    fixture_texts = [read_contract_file(path) for path in fixtures]
+    texts = [fixture_texts[i % len(fixture_texts)] for i in range(contracts)]
+    runner = _run_async if mode == "async" else _run_threaded
+
+    results = []
+    for workers in concurrency_levels:
+        tracemalloc.start()
+        started = time.perf_counter()
+        errors = runner(texts, workers)
+        elapsed = time.perf_counter() - started
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results.append({
+            "mode": mode,
+            "concurrency": workers,
+            "contracts": contracts,
+            "errors": errors,
+            "seconds": round(elapsed, 3),
+            "contracts_per_second": round(contracts / elapsed, 2),
+            "peak_python_mb": round(peak_bytes / 1e6, 2),
+        })
+    return results
+
+
+def _legacy_locate_json(response_text):
+    """The pre-scanner locator (lazy DOTALL regex, then find/rfind), kept for comparison."""
+    match = re.search(r"```json\s*({.*?})\s*```", response_text, re.DOTALL | re.IGNORECASE)
+    if match:
+        json_str = match.group(1).strip()
+    else:
+        start = response_text.find('{')
+        end = response_text.rfind('}')
+        json_str = response_text[start:end + 1] if start != -1 and end > start else None
+    try:
+        return json.loads(json_str) if json_str else None
+    except json.JSONDecodeError:
+        return None
+
+
+def _adversarial_responses(size, canned_response):
+    """Builds LLM-style responses of roughly `size` characters that stress JSON location."""
+    payload = canned_response
+    fenced = "```json\n" + payload + "\n```"
+    return {
+        # Long chatty preamble and epilogue full of braces around a fenced block
+        "chatty_prose": "Notes {see clause} " * (size // 38) + fenced + " Also {this}." * (size // 26),
+        # Many fence openers that never close: the lazy regex rescans the tail from each one
+        "unclosed_fences": "```json {a}. " * (size // 13) + payload,
+        # A valid object followed by a second one: find/rfind spans both and fails
+        "two_objects": payload + "\n" + "x" * size + "\n" + payload,
+    }
+
+
+def bench_json_locator(sizes, legacy_max_size=100000):
+    """Times the linear JSON locator against the legacy regex + find/rfind on adversarial responses."""
+    canned_response = FakeGenerativeModel.response_text or build_canned_response()
+    results = []
+    for size in sizes:
+        for case, text in _adversarial_responses(size, canned_response).items():
+            row = {"case": case, "characters": len(text)}
+            started = time.perf_counter()
+            found, _ = find_json_object(text)
+            row["scanner_ms"] = round((time.perf_counter() - started) * 1000, 3)
+            row["scanner_found"] = found is not None
+            if size <= legacy_max_size:
+                started = time.perf_counter()
+                legacy_found = _legacy_locate_json(text)
+                row["legacy_ms"] = round((time.perf_counter() - started) * 1000, 3)
+                row["legacy_found"] = legacy_found is not None
+            results.append(row)
+    return results
+
+
+def _print_report(report):
+    print("\n--- Per-stage timings (ms) ---")
+    for name, stages in report["stages"].items():
+        print(f"{name} ({stages['characters']} chars, prompt {stages['prompt_characters']} chars)")
+        for stage in ("read", "read_cached", "build_llm_prompt", "get_contract_data", "parse_llm_response"):
+            timing = stages[stage]
+            print(f"  {stage:<20} mean {timing['mean_ms']:>10.3f}  p50 {timing['p50_ms']:>10.3f}  "
+                  f"p95 {timing['p95_ms']:>10.3f}  (n={timing['n']})")
+
+    print("\n--- Throughput ---")
+    print(f"{'mode':<8}{'workers':>8}{'contracts':>11}{'errors':>8}{'seconds':>10}{'contracts/s':>13}{'peak MB':>10}")
+    for row in report["throughput"]:
+        print(f"{row['mode']:<8}{row['concurrency']:>8}{row['contracts']:>11}{row['errors']:>8}"
+              f"{row['seconds']:>10.3f}{row['contracts_per_second']:>13.2f}{row['peak_python_mb']:>10.2f}")
+    if report.get("streaming"):
+        print("\n--- Streaming (ms) ---")
+        for name, timings in report["streaming"].items():
+            print(f"{name}: first field p50 {timings['time_to_first_field']['p50_ms']:.1f}, "
+                  f"all fields p50 {timings['time_to_all_fields']['p50_ms']:.1f}")
+
+    if report.get("context_cache"):
+        print("\n--- Instruction prefix caching (estimated tokens) ---")
+        print(f"{'mode':<10}{'contracts':>10}{'caches':>8}{'input/contract':>16}{'cached/contract':>17}")
+        for row in report["context_cache"]:
+            print(f"{row['mode']:<10}{row['contracts']:>10}{row['caches_created']:>8}"
+                  f"{row['input_tokens_per_contract']:>16}{row['cached_tokens_per_contract']:>17}")
+
+    if report.get("rules"):
+        print("\n--- Rule-based pre-extraction ---")
+        print(f"{'field':<56}{'hit rate':>9}{'mean us':>10}")
+        for field, stats in report["rules"]["fields"].items():
+            print(f"{field:<56}{stats['hit_rate']:>9.2f}{stats['mean_us']:>10.1f}")
+        for name, fields in report["rules"]["resolved"].items():
+            print(f"{name}: {len(fields)} of {len(utils.CONTRACT_FIELDS)} fields resolved without the LLM")
+
+    if report.get("normalize"):
+        print("\n--- Text normalization ---")
+        print(f"{'fixture':<60}{'tokens before':>14}{'after':>8}{'saved':>8}{'sections':>10}{'p50 ms':>9}")
+        for name, row in report["normalize"].items():
+            saved = 1 - row["tokens_after"] / row["tokens_before"]
+            print(f"{name[:59]:<60}{row['tokens_before']:>14}{row['tokens_after']:>8}{saved:>8.0%}"
+                  f"{row['sections_dropped']:>10}{row['normalize']['p50_ms']:>9.2f}")
+
+    if report.get("incremental"):
+        print("\n--- Incremental re-extraction after a one-phrase amendment ---")
+        for row in report["incremental"]:
+            print(f"{row['fixture']}: '{row['amendment']}': {row['fields_reextracted']}/{len(utils.CONTRACT_FIELDS)} "
+                  f"fields, {row['incremental_input_characters']} vs {row['full_input_characters']} input chars")
+
+    if report.get("cascade"):
+        print("\n--- Fast-model cascade ---")
+        print(f"{'fixture':<40}{'mode':<15}{'p50 ms':>9}{'p95 ms':>9}{'escalated':>11}{'accuracy':>10}")
+        for row in report["cascade"]:
+            print(f"{row['fixture'][:39]:<40}{row['mode']:<15}{row['latency']['p50_ms']:>9.1f}"
+                  f"{row['latency']['p95_ms']:>9.1f}{row['escalated_per_contract']:>11.2f}{row['accuracy']:>10.3f}")
+
+    if report.get("fields"):
+        print("\n--- Field subsets ---")
+        print(f"{'fixture':<40}{'subset':<16}{'fields':>7}{'instructions':>14}{'input chars':>13}{'output chars':>14}")
+        for row in report["fields"]:
+            print(f"{row['fixture'][:39]:<40}{row['subset']:<16}{row['fields']:>7}{row['instruction_characters']:>14}"
+                  f"{row['input_characters']:>13}{row['output_characters']:>14}")
+
+    if report.get("repair"):
+        print("\n--- Recovery from bad responses ---")
+        print(f"{'fixture':<40}{'case':<31}{'outcome':<18}{'calls':>6}{'follow-up chars':>17}{'full chars':>12}")
+        for row in report["repair"]:
+            print(f"{row['fixture'][:39]:<40}{row['case']:<31}{row['outcome']:<18}{row['follow_up_calls']:>6}"
+                  f"{row['follow_up_input_characters']:>17}{row['full_input_characters']:>12}")
+
+    if report.get("packing"):
+        print("\n--- Small-contract packing ---")
+        print(f"{'mode':<8}{'contracts':>10}{'requests':>10}{'errors':>8}{'seconds':>10}{'contracts/s':>13}")
+        for row in report["packing"]:
+            print(f"{row['mode']:<8}{row['contracts']:>10}{row['requests']:>10}{row['errors']:>8}"
+                  f"{row['seconds']:>10.3f}{row['contracts_per_second']:>13.2f}")
+
+    print(f"\nPeak RSS: {report['peak_rss_mb']} MB")
+
+    if report.get("json_locator"):
+        print("\n--- JSON locator on adversarial responses ---")
+        print(f"{'case':<17}{'chars':>10}{'scanner ms':>12}{'found':>7}{'legacy ms':>12}{'found':>7}")
+        for row in report["json_locator"]:
+            legacy_ms = f"{row['legacy_ms']:>12.3f}" if "legacy_ms" in row else f"{'skipped':>12}"
+            legacy_found = f"{str(row['legacy_found']):>7}" if "legacy_found" in row else f"{'-':>7}"
+            print(f"{row['case']:<17}{row['characters']:>10}{row['scanner_ms']:>12.3f}"
+                  f"{str(row['scanner_found']):>7}{legacy_ms}{legacy_found}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the extraction pipeline against a local fake Gemini backend.")
+    parser.add_argument("--latency", type=float, default=0.5, help="Fake model latency per call, in seconds.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Uniform +/- jitter on the fake latency, in seconds.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of fake calls that fail with a quota error.")
+    parser.add_argument("--fast-latency-ratio", type=float, default=0.25,
+                        help="Fake fast-model latency as a fraction of --latency, for the cascade comparison.")
+    parser.add_argument("--iterations", type=int, default=50, help="Rounds per in-memory stage timing.")
+    parser.add_argument("--contracts", type=int, default=200, help="Contracts per throughput run.")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels.")
+    parser.add_argument("--mode", choices=("threads", "async", "both"), default="both",
+                        help="Run throughput with the thread pool, the asyncio API, or both.")
+    parser.add_argument("--fixtures", nargs="*", default=FIXTURE_FILES, help="Contract files to use as fixtures.")
+    parser.add_argument("--small-chars", type=int, default=4000,
+                        help="Size of the small contracts used by the packing benchmark, in characters.")
+    parser.add_argument("--json-sizes", default="10000,100000,1000000",
+                        help="Comma-separated response sizes for the JSON locator micro-benchmark ('' to skip).")
+    parser.add_argument("--json", metavar="FILE", help="Also write the full report as JSON to FILE.")
+    parser.add_argument("--verbose", action="store_true", help="Show utils logging (including injected errors).")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    # utils configures INFO logging on import; injected failures would flood the report
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.CRITICAL)
+    install_fake_backend(args.latency, args.jitter, args.error_rate)
+    concurrency_levels = [int(level) for level in args.concurrency.split(",") if level.strip()]
+    modes = ("threads", "async") if args.mode == "both" else (args.mode,)
+
+    report = {
+        "config": {
+            "latency_seconds": args.latency,
+            "jitter_seconds": args.jitter,
+            "error_rate": args.error_rate,
+            "fixtures": [os.path.basename(path) for path in args.fixtures],
+        },
+        "stages": bench_stages(args.fixtures, args.iterations),
+        "throughput": [],
+    }
+    report["streaming"] = bench_streaming(args.fixtures, max(1, args.iterations // 10))
+    report["context_cache"] = bench_context_cache(args.fixtures, min(args.contracts, 20))
+    report["rules"] = bench_rules(args.fixtures, args.iterations)
+    report["normalize"] = bench_normalize(args.fixtures, max(1, args.iterations // 10))
+    report["incremental"] = bench_incremental(args.fixtures)
+    report["fields"] = bench_fields(args.fixtures)
+    report["repair"] = bench_repair(args.fixtures)
+    report["cascade"] = bench_cascade(args.fixtures, min(args.contracts, 20), args.latency * args.fast_latency_ratio)
+    report["packing"] = bench_packing(args.fixtures, args.contracts, args.small_chars, max(concurrency_levels))
+    for mode in modes:
+        report["throughput"].extend(bench_throughput(args.fixtures, args.contracts, concurrency_levels, mode))
+    json_sizes = [int(size) for size in args.json_sizes.split(",") if size.strip()]
+    report["json_locator"] = bench_json_locator(json_sizes)
+    # ru_maxrss is reported in kilobytes on Linux
+    report["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    report["fake_calls"] = FakeGenerativeModel.calls
+
+    _print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f_json:
+            json.dump(report, f_json, indent=2)
+        print(f"Report saved to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
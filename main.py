@@ -2,11 +2,40 @@ import os
 import json
 import csv
 import io
+import glob
+import time
+import hashlib
+import tempfile
 import logging
+import uuid
+import queue
+import argparse
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError: # Parquet output is optional
+    pa = pq = None
 from utils import (
     read_text_file, 
+    read_contract_file,
     get_contract_data,
+    get_contract_data_mapreduce,
+    get_contract_data_packed,
+    get_contract_data_incremental,
+    estimate_tokens,
+    MAX_CONTRACT_CHARS,
+    MODEL_NAME,
+    FAST_MODEL_NAME,
+    ExtractionCache,
+    PdfTextCache,
+    RequestScheduler,
+    RuleExtractor,
+    DEFAULT_CACHE_DIR,
+    DEFAULT_TEXT_CACHE_DIR,
+    CONTRACT_FIELDS,
     PDFReadError, 
     JSONParsingError, 
     LLMConfigurationError, 
@@ -17,6 +46,12 @@ from utils import (
 CONTRACT_FILE_PATH = "Lore SaaS Agreement and Order Form April 2025.md"  # Hardcoded path to the test contract
 OUTPUT_JSON_FILE = "contract_output.json"
 OUTPUT_CSV_FILE = "contract_output.csv"
+BATCH_OUTPUT_FILE = "batch_output.json"
+DEFAULT_BATCH_WORKERS = 8 # Concurrent LLM calls in batch mode; keep below your API quota
+DEFAULT_PIPELINE_QUEUE_SIZE = 16 # Items buffered between pipeline stages (bounds memory)
+PIPELINE_POLL_SECONDS = 0.1 # How often blocked pipeline stages check whether the run is stopping
+DEFAULT_FLUSH_RECORDS = 100 # Bulk outputs are written in batches of this many records
+CONTRACT_EXTENSIONS = ('.pdf', '.md', '.txt')
 
 # Setup basic logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -24,7 +59,871 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 # Load environment variables from .env file
 load_dotenv()
 
+def collect_contract_files(source):
+    """
+    Resolves a batch source into an ordered list of contract file paths.
+
+    Args:
+        source: A directory (all contract files directly inside it), a glob
+                pattern (e.g., "contracts/**/*.pdf"), or a manifest file
+                listing one contract path per line. Blank lines and lines
+                starting with '#' in a manifest are ignored, and relative
+                paths are resolved against the manifest's directory.
+
+    Returns:
+        A list of file paths, de-duplicated, in a stable order.
+
+    Raises:
+        FileNotFoundError: If the source doesn't match any directory, file or glob.
+    """
+    if os.path.isdir(source):
+        paths = sorted(
+            os.path.join(source, name) for name in os.listdir(source)
+            if name.lower().endswith(CONTRACT_EXTENSIONS)
+        )
+    elif os.path.isfile(source):
+        base_dir = os.path.dirname(source)
+        paths = []
+        with open(source, 'r', encoding='utf-8') as f_manifest:
+            for line in f_manifest:
+                entry = line.strip()
+                if not entry or entry.startswith('#'):
+                    continue
+                paths.append(entry if os.path.isabs(entry) else os.path.join(base_dir, entry))
+    else:
+        paths = sorted(glob.glob(source, recursive=True))
+        if not paths:
+            raise FileNotFoundError(f"No contract files match '{source}'.")
+        paths = [path for path in paths if os.path.isfile(path)]
+
+    # Preserve order but drop duplicates (e.g., a manifest listing a file twice)
+    return list(dict.fromkeys(paths))
+
+
+def extract_contract_text(contract_text, api_key, **extract_options):
+    """Extracts one contract's text, switching to map-reduce when it is too large for one prompt."""
+    if len(contract_text) > MAX_CONTRACT_CHARS:
+        return get_contract_data_mapreduce(contract_text, api_key, **extract_options)
+    return get_contract_data(contract_text, api_key, **extract_options)
+
+
+def _new_record(path):
+    return {"file": path, "status": "ok", "data": None, "error_type": None, "error": None}
+
+
+def _record_error(record, e, journal=None):
+    # Keep going: one bad contract must not sink the rest of the batch
+    logging.error(f"Failed to process {record['file']}: {type(e).__name__}: {e}")
+    record.update(status="error", error_type=type(e).__name__, error=str(e))
+    _checkpoint(journal, record["file"], "failed", e)
+
+
+def _checkpoint(journal, path, status, error=None):
+    if journal is not None:
+        journal.record(path, status, error)
+
+
+def process_contract_file(path, api_key, journal=None, text_cache=None, **extract_options):
+    """
+    Reads and extracts a single contract, never raising.
+
+    Args:
+        path: Path to the contract file (PDF or text).
+        api_key: The Gemini API key.
+        journal: Optional `BatchJournal` to checkpoint progress in.
+        text_cache: Optional `PdfTextCache` so unchanged PDFs are not parsed again.
+        **extract_options: Passed through to `get_contract_data` (e.g., cache,
+                           retrieval_top_k).
+
+    Returns:
+        A result record dict with the keys 'file', 'status' ('ok' or 'error'),
+        'data' (the extracted fields, or None), 'error_type', 'error' and
+        'elapsed_seconds'.
+    """
+    record = _new_record(path)
+    started = time.perf_counter()
+    try:
+        contract_text = read_contract_file(path, text_cache)
+        if not contract_text:
+            raise ValueError("Contract text is empty.")
+        _checkpoint(journal, path, "read")
+        _checkpoint(journal, path, "prompted")
+        record["data"] = extract_contract_text(contract_text, api_key, **extract_options)
+        _checkpoint(journal, path, "extracted")
+    except Exception as e:
+        _record_error(record, e, journal)
+    record["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+    return record
+
+
+def run_batch(paths, api_key, max_workers=DEFAULT_BATCH_WORKERS, on_record=None, journal=None, text_cache=None,
+              **extract_options):
+    """
+    Processes many contracts concurrently on a bounded thread pool.
+
+    The work is dominated by waiting on the Gemini API, so threads give
+    near-linear speedups up to the provider's rate limit.
+
+    Args:
+        paths: The contract file paths to process.
+        api_key: The Gemini API key.
+        max_workers: Maximum number of contracts processed at the same time.
+        on_record: Optional callable given each record as it completes (on
+                   the calling thread, in completion order).
+        journal: Optional `BatchJournal` to checkpoint progress in.
+        text_cache: Optional `PdfTextCache` shared by all workers.
+        **extract_options: Passed through to `get_contract_data`; a cache
+                           given here is shared by all workers.
+
+    Returns:
+        A list of result records (see `process_contract_file`), in the same
+        order as `paths`.
+    """
+    if max_workers < 1:
+        raise ValueError("max_workers must be at least 1.")
+
+    records = [None] * len(paths)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(process_contract_file, path, api_key, journal, text_cache, **extract_options): i for i, path in enumerate(paths)}
+        for done, future in enumerate(as_completed(futures), start=1):
+            record = future.result()
+            records[futures[future]] = record
+            logging.info(f"[{done}/{len(paths)}] {record['status']}: {record['file']} ({record['elapsed_seconds']}s)")
+            if on_record is not None:
+                on_record(record)
+    return records
+
+
+def run_packed_batch(paths, api_key, pack_tokens, max_workers=DEFAULT_BATCH_WORKERS, journal=None, text_cache=None,
+                     **extract_options):
+    """
+    Like `run_batch`, but small contracts are packed several per request.
+
+    All contracts are read first. Those small enough for at least two to fit
+    in `pack_tokens` are extracted with `get_contract_data_packed`; the rest
+    go through the usual one-contract-per-request path. Packed contracts
+    report the duration of the whole packed phase in 'elapsed_seconds'.
+
+    Args:
+        paths: The contract file paths to process.
+        api_key: The Gemini API key.
+        pack_tokens: Estimated contract-text tokens per packed request.
+        max_workers: Maximum number of requests in flight at the same time.
+        journal: Optional `BatchJournal` to checkpoint progress in.
+        text_cache: Optional `PdfTextCache` shared by all readers.
+        **extract_options: As for `run_batch`. retrieval_top_k, rules and
+                           normalize only apply to contracts that are not packed;
+                           packed contracts are extracted in full and then cut
+                           down to `fields`.
+
+    Returns:
+        A list of result records (see `process_contract_file`), in the same
+        order as `paths`.
+    """
+    if max_workers < 1:
+        raise ValueError("max_workers must be at least 1.")
+
+    records = [_new_record(path) for path in paths]
+    texts = [None] * len(paths)
+    read_seconds = [0.0] * len(paths)
+
+    def read(i):
+        started = time.perf_counter()
+        try:
+            texts[i] = read_contract_file(paths[i], text_cache)
+            if not texts[i]:
+                raise ValueError("Contract text is empty.")
+            _checkpoint(journal, paths[i], "read")
+        except Exception as e:
+            texts[i] = None
+            _record_error(records[i], e, journal)
+        read_seconds[i] = time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(read, range(len(paths))))
+
+    small = [i for i, text in enumerate(texts) if text and estimate_tokens(text) * 2 <= pack_tokens]
+    small_set = set(small)
+    large = [i for i, text in enumerate(texts) if text and i not in small_set]
+    logging.info(f"Packing {len(small)} small contracts; {len(large)} are extracted individually.")
+
+    for i in small:
+        _checkpoint(journal, paths[i], "prompted")
+    started = time.perf_counter()
+    packed_options = {key: extract_options[key] for key in ("model_name", "cache", "scheduler", "context_cache")
+                      if key in extract_options}
+    outcomes = get_contract_data_packed([texts[i] for i in small], api_key, token_budget=pack_tokens,
+                                        max_workers=max_workers, **packed_options)
+    packed_seconds = time.perf_counter() - started
+    fields = extract_options.get("fields")
+    for i, outcome in zip(small, outcomes):
+        if isinstance(outcome, Exception):
+            _record_error(records[i], outcome, journal)
+        else:
+            records[i]["data"] = outcome if fields is None else {field: outcome.get(field) for field in fields}
+            _checkpoint(journal, paths[i], "extracted")
+        records[i]["elapsed_seconds"] = round(read_seconds[i] + packed_seconds, 3)
+
+    def extract(i):
+        started = time.perf_counter()
+        _checkpoint(journal, paths[i], "prompted")
+        try:
+            records[i]["data"] = extract_contract_text(texts[i], api_key, **extract_options)
+            _checkpoint(journal, paths[i], "extracted")
+        except Exception as e:
+            _record_error(records[i], e, journal)
+        records[i]["elapsed_seconds"] = round(read_seconds[i] + time.perf_counter() - started, 3)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(extract, large))
+    for i, text in enumerate(texts):
+        if text is None:
+            records[i]["elapsed_seconds"] = round(read_seconds[i], 3)
+    return records
+
+
+# --- Bulk Output ---
+
+class BulkResultWriter:
+    """
+    Appends result records to corpus-wide JSONL, wide CSV and/or Parquet outputs.
+
+    Records are buffered and written `flush_every` at a time through file
+    handles kept open for the whole run, so output cost grows linearly with
+    the number of contracts and never rewrites earlier results. JSONL and CSV
+    files are appended to across runs; Parquet files cannot be appended to,
+    so each run adds a new part file to the Parquet directory, which readers
+    such as pandas and pyarrow load as one dataset.
+
+    The CSV and Parquet tables have one row per contract: the record metadata
+    columns followed by one column per extracted field. Calls must come from
+    one thread at a time.
+    """
+
+    META_COLUMNS = ("file", "status", "error_type", "error", "elapsed_seconds")
+
+    def __init__(self, jsonl_path=None, csv_path=None, parquet_dir=None, flush_every=DEFAULT_FLUSH_RECORDS,
+                 fields=CONTRACT_FIELDS, on_flush=None):
+        if flush_every < 1:
+            raise ValueError("flush_every must be at least 1.")
+        self.on_flush = on_flush # Called with each batch of records once it is written
+        if parquet_dir and pq is None:
+            raise ValueError("Parquet output requires pyarrow (pip install pyarrow).")
+        self.flush_every = flush_every
+        self.columns = list(self.META_COLUMNS) + list(fields)
+        self.records_written = 0
+        self._buffer = []
+        self._jsonl = open(jsonl_path, 'a', encoding='utf-8') if jsonl_path else None
+        self._csv_file = None
+        self._csv = None
+        if csv_path:
+            self._csv_file = self._open_csv(csv_path)
+            self._csv = csv.DictWriter(self._csv_file, fieldnames=self.columns, extrasaction='ignore')
+            if self._csv_file.tell() == 0:
+                self._csv.writeheader()
+        self._parquet = None
+        if parquet_dir:
+            os.makedirs(parquet_dir, exist_ok=True)
+            self._parquet_schema = pa.schema(
+                [(column, pa.float64() if column == "elapsed_seconds" else pa.string()) for column in self.columns])
+            part = os.path.join(parquet_dir, f"part-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.parquet")
+            self._parquet = pq.ParquetWriter(part, self._parquet_schema)
+
+    def _open_csv(self, csv_path):
+        """Opens `csv_path` for appending, refusing files written with different columns."""
+        if os.path.exists(csv_path) and os.path.getsize(csv_path) > 0:
+            with open(csv_path, 'r', encoding='utf-8', newline='') as f_csv:
+                header = next(csv.reader(f_csv), [])
+            if header != self.columns:
+                raise ValueError(f"{csv_path} has different columns than the current field registry; "
+                                 f"write to a new file instead.")
+        return open(csv_path, 'a', encoding='utf-8', newline='')
+
+    def _row(self, record):
+        """Flattens a record into {column: value}, JSON-encoding non-scalar field values."""
+        row = {column: record.get(column) for column in self.META_COLUMNS}
+        for field, value in (record.get("data") or {}).items():
+            row[field] = json.dumps(value) if isinstance(value, (dict, list)) else value
+        return row
+
+    def write(self, record):
+        """Buffers one result record (see `process_contract_file`), flushing when the buffer is full."""
+        self._buffer.append(record)
+        if len(self._buffer) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        """Writes all buffered records to every configured output."""
+        if not self._buffer:
+            return
+        if self._jsonl:
+            self._jsonl.write("".join(json.dumps(record) + "\n" for record in self._buffer))
+            self._jsonl.flush()
+        rows = [self._row(record) for record in self._buffer] if self._csv or self._parquet else None
+        if self._csv:
+            self._csv.writerows(rows)
+            self._csv_file.flush()
+        if self._parquet:
+            columns = {
+                column: [row.get(column) if column == "elapsed_seconds" or row.get(column) is None
+                         else str(row[column]) for row in rows]
+                for column in self.columns
+            }
+            self._parquet.write_table(pa.table(columns, schema=self._parquet_schema)) # One row group per flush
+        self.records_written += len(self._buffer)
+        flushed, self._buffer = self._buffer, []
+        if self.on_flush is not None:
+            self.on_flush(flushed)
+
+    def close(self):
+        """Flushes remaining records and closes all outputs."""
+        try:
+            self.flush()
+        finally:
+            for handle in (self._jsonl, self._csv_file, self._parquet):
+                if handle is not None:
+                    handle.close()
+            self._jsonl = self._csv_file = self._csv = self._parquet = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+# --- Checkpoint Journal ---
+
+def _error_category(e):
+    """Coarse failure category recorded in the journal, e.g., to tell parse failures from API failures."""
+    if isinstance(e, JSONParsingError):
+        return "json_parsing"
+    if isinstance(e, LLMGenerationError):
+        return "llm_generation"
+    if isinstance(e, LLMConfigurationError):
+        return "llm_configuration"
+    if isinstance(e, (PDFReadError, OSError, ValueError)):
+        return "read"
+    return "other"
+
+
+class BatchJournal:
+    """
+    Append-only JSONL checkpoint journal that makes batch runs resumable.
+
+    Every step of every contract (read, prompted, extracted, written, or
+    failed with its error type and category) is appended as one line and
+    flushed immediately, together with the SHA-256 of the file's bytes. A
+    later run replays the journal and skips contracts whose latest entry is
+    'written' for unchanged content, so after a crash, quota exhaustion or
+    Ctrl-C only failed, interrupted and modified contracts are processed
+    again. The journal is compacted to one line per contract when opened.
+    Safe to use from multiple threads.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._hashes = {}
+        self._entries = self._load()
+        self._compact()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def _load(self):
+        """Returns the latest entry per file, ignoring lines torn by a crash."""
+        entries = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if isinstance(entry, dict) and "file" in entry:
+                        entries[entry["file"]] = entry
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def _compact(self):
+        """Rewrites the journal with only the latest entry per file."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        # Write to a temp file and rename so a crash never loses the journal
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write("".join(json.dumps(entry) + "\n" for entry in self._entries.values()))
+        os.replace(tmp_path, self.path)
+
+    def content_hash(self, path):
+        """Returns the SHA-256 of the file's bytes, computed once per run."""
+        if path not in self._hashes:
+            digest = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+            self._hashes[path] = digest.hexdigest()
+        return self._hashes[path]
+
+    def is_complete(self, path):
+        """True if `path` was written by an earlier run and its content has not changed since."""
+        try:
+            content_hash = self.content_hash(path)
+        except OSError:
+            return False
+        entry = self._entries.get(path)
+        return entry is not None and entry["status"] == "written" and entry.get("sha256") == content_hash
+
+    def record(self, path, status, error=None):
+        """Appends a status entry for `path`; `error` (for 'failed') adds its type and category."""
+        entry = {"file": path, "sha256": self._hashes.get(path), "status": status, "time": round(time.time(), 3)}
+        if error is not None:
+            entry.update(error_type=type(error).__name__, error_category=_error_category(error), error=str(error))
+        line = json.dumps(entry) + "\n"
+        with self._lock:
+            self._entries[path] = entry
+            self._file.write(line)
+            self._file.flush()
+
+    def mark_written(self, records):
+        """Marks successful result records as written; failed ones stay due for a retry."""
+        for record in records:
+            if record["status"] == "ok":
+                self.record(record["file"], "written")
+
+    def failure_categories(self):
+        """Returns {error_category: count} over files whose latest entry is a failure."""
+        with self._lock:
+            failed = [entry for entry in self._entries.values() if entry["status"] == "failed"]
+        counts = {}
+        for entry in failed:
+            counts[entry["error_category"]] = counts.get(entry["error_category"], 0) + 1
+        return counts
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+# --- Pipelined Batch Execution ---
+
+class PipelineStats:
+    """Thread-safe per-stage counters (items, busy time, queue depth) for `run_pipeline`."""
+
+    def __init__(self, stages):
+        self._lock = threading.Lock()
+        self._stages = {
+            stage: {"items": 0, "errors": 0, "busy_seconds": 0.0, "max_queue_depth": 0,
+                    "queue_depth_total": 0, "queue_samples": 0}
+            for stage in stages
+        }
+
+    def record(self, stage, seconds, error=False):
+        with self._lock:
+            stats = self._stages[stage]
+            stats["items"] += 1
+            stats["errors"] += bool(error)
+            stats["busy_seconds"] += seconds
+
+    def sample_queue(self, stage, depth):
+        """Records the depth of the queue feeding `stage`, sampled after each put."""
+        with self._lock:
+            stats = self._stages[stage]
+            stats["max_queue_depth"] = max(stats["max_queue_depth"], depth)
+            stats["queue_depth_total"] += depth
+            stats["queue_samples"] += 1
+
+    def report(self, elapsed_seconds):
+        """Returns {stage: {items, errors, busy_seconds, items_per_second, max_queue_depth, mean_queue_depth}}."""
+        with self._lock:
+            return {
+                stage: {
+                    "items": stats["items"],
+                    "errors": stats["errors"],
+                    "busy_seconds": round(stats["busy_seconds"], 3),
+                    "items_per_second": round(stats["items"] / elapsed_seconds, 2) if elapsed_seconds else 0.0,
+                    # None for a stage without an input queue (the first one)
+                    "max_queue_depth": stats["max_queue_depth"] if stats["queue_samples"] else None,
+                    "mean_queue_depth": round(stats["queue_depth_total"] / stats["queue_samples"], 2)
+                    if stats["queue_samples"] else None,
+                }
+                for stage, stats in self._stages.items()
+            }
+
+
+def _read_for_pipeline(path, text_cache=None):
+    """Process-pool task: reads one contract, returning (text, seconds, error) instead of raising."""
+    started = time.perf_counter()
+    try:
+        contract_text = read_contract_file(path, text_cache)
+        if not contract_text:
+            raise ValueError("Contract text is empty.")
+        return contract_text, time.perf_counter() - started, None
+    except Exception as e:
+        return None, time.perf_counter() - started, e
+
+
+def run_pipeline(paths, api_key, writer, read_workers=None, llm_workers=DEFAULT_BATCH_WORKERS,
+                 queue_size=DEFAULT_PIPELINE_QUEUE_SIZE, journal=None, text_cache=None, **extract_options):
+    """
+    Processes contracts through overlapping read -> extract -> write stages.
+
+    Text extraction runs on a process pool (PDF parsing is CPU-bound), LLM
+    calls on `llm_workers` threads (they mostly wait on the network) and
+    `writer` on the calling thread, so all three kinds of work proceed at
+    once. The stages are connected by queues of at most `queue_size` items:
+    when a later stage falls behind, earlier ones block instead of piling up
+    text in memory. If the run ends early (Ctrl-C, or an exception from
+    `writer` that isn't an `Exception`), every stage is stopped, queued work
+    is discarded and pending reads are cancelled before it propagates;
+    contracts in flight with the LLM finish first.
+
+    Args:
+        paths: The contract file paths to process.
+        api_key: The Gemini API key.
+        writer: Called with each result record (see `process_contract_file`)
+                as it completes, in completion order. Exceptions it raises
+                are logged and counted as write errors.
+        read_workers: Processes used to read contracts; defaults to the CPU count.
+        llm_workers: Maximum number of LLM calls in flight.
+        queue_size: Capacity of each inter-stage queue.
+        journal: Optional `BatchJournal` to checkpoint progress in.
+        text_cache: Optional `PdfTextCache`; reader processes use their own
+                    copy of it, so its stats here do not count their lookups.
+        **extract_options: Passed through to `get_contract_data`.
+
+    Returns:
+        Per-stage statistics (see `PipelineStats.report`) plus 'elapsed_seconds'.
+
+    Raises:
+        RuntimeError: If the read and extract stages stop without producing a
+                      record for every path (a bug, not a contract failure).
+    """
+    if llm_workers < 1 or queue_size < 1:
+        raise ValueError("llm_workers and queue_size must be at least 1.")
+
+    read_queue = queue.Queue(maxsize=queue_size)
+    write_queue = queue.Queue(maxsize=queue_size)
+    # Set when the run ends for any reason (including an interrupt), so no stage
+    # stays blocked on a queue nobody will service again
+    stop = threading.Event()
+    stats = PipelineStats(("read", "extract", "write"))
+    started = time.perf_counter()
+
+    def put(q, item):
+        """Puts `item` on `q`, waiting while it is full; returns False if the run stops first."""
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=PIPELINE_POLL_SECONDS)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def feed(read_pool):
+        try:
+            for path in paths:
+                try:
+                    future = read_pool.submit(_read_for_pipeline, path, text_cache)
+                except Exception as e: # e.g., BrokenProcessPool after a worker crash
+                    future = Future()
+                    future.set_exception(e)
+                # Blocks once queue_size reads are waiting for the extract stage
+                if not put(read_queue, (path, future)):
+                    return
+                stats.sample_queue("extract", read_queue.qsize())
+        finally:
+            for _ in range(llm_workers):
+                put(read_queue, None)
+
+    def extract():
+        while not stop.is_set():
+            try:
+                item = read_queue.get(timeout=PIPELINE_POLL_SECONDS)
+            except queue.Empty:
+                continue
+            if item is None:
+                return
+            path, future = item
+            record = _new_record(path)
+            read_seconds = 0.0
+            extract_started = time.perf_counter()
+            try:
+                try:
+                    contract_text, read_seconds, read_error = future.result()
+                except Exception as e: # e.g., a crashed worker process
+                    contract_text, read_error = None, e
+                stats.record("read", read_seconds, error=read_error is not None)
+                extract_started = time.perf_counter()
+                if read_error is not None:
+                    _record_error(record, read_error, journal)
+                else:
+                    _checkpoint(journal, path, "read")
+                    _checkpoint(journal, path, "prompted")
+                    try:
+                        record["data"] = extract_contract_text(contract_text, api_key, **extract_options)
+                        _checkpoint(journal, path, "extracted")
+                    except Exception as e:
+                        _record_error(record, e, journal)
+                    stats.record("extract", time.perf_counter() - extract_started, error=record["status"] != "ok")
+            except Exception as e: # Anything else (e.g., a journal write) still yields a record
+                _record_error(record, e)
+            record["elapsed_seconds"] = round(read_seconds + time.perf_counter() - extract_started, 3)
+            if not put(write_queue, record):
+                return
+            stats.sample_queue("write", write_queue.qsize())
+
+    read_pool = ProcessPoolExecutor(max_workers=read_workers)
+    threads = ThreadPoolExecutor(max_workers=llm_workers + 1)
+    try:
+        stages = [threads.submit(feed, read_pool)] + [threads.submit(extract) for _ in range(llm_workers)]
+        done = 0
+        while done < len(paths):
+            try:
+                record = write_queue.get(timeout=PIPELINE_POLL_SECONDS)
+            except queue.Empty:
+                if all(stage.done() for stage in stages) and write_queue.empty():
+                    errors = [stage.exception() for stage in stages if stage.exception() is not None]
+                    raise RuntimeError(f"Pipeline stages stopped after {done}/{len(paths)} records"
+                                       + (f": {errors[0]}" if errors else "."))
+                continue
+            done += 1
+            write_started = time.perf_counter()
+            write_failed = False
+            try:
+                writer(record)
+            except Exception as e:
+                logging.error(f"Failed to write result for {record['file']}: {e}")
+                write_failed = True
+            stats.record("write", time.perf_counter() - write_started, error=write_failed)
+            logging.info(f"[{done}/{len(paths)}] {record['status']}: {record['file']} ({record['elapsed_seconds']}s)")
+    finally:
+        stop.set()
+        # Unblock and discard whatever is still queued, and don't start reads nobody will consume
+        for q in (read_queue, write_queue):
+            while True:
+                try:
+                    item = q.get_nowait()
+                except queue.Empty:
+                    break
+                if isinstance(item, tuple):
+                    item[1].cancel()
+        read_pool.shutdown(wait=False, cancel_futures=True)
+        # Extract threads notice `stop` within PIPELINE_POLL_SECONDS (after any LLM call in flight)
+        threads.shutdown(wait=True, cancel_futures=True)
+        read_pool.shutdown(wait=True)
+
+    elapsed = time.perf_counter() - started
+    report = stats.report(elapsed)
+    report["elapsed_seconds"] = round(elapsed, 3)
+    return report
+
+
+def _merge_previous_results(output_file, records):
+    """
+    Combines `records` with the result array an earlier run saved to
+    `output_file`: a file's new record replaces its old one, and files new to
+    this run are appended.
+    """
+    try:
+        with open(output_file, 'r', encoding='utf-8') as f_in:
+            previous = json.load(f_in)
+    except FileNotFoundError:
+        return records
+    except (IOError, ValueError) as e:
+        raise IOError(f"Cannot merge with the existing results in {output_file}: {e}") from e
+    if not isinstance(previous, list):
+        raise IOError(f"Cannot merge with the existing results in {output_file}: not a JSON array")
+    latest = {record["file"]: record for record in records}
+    merged = [latest.pop(record.get("file"), record) for record in previous]
+    merged.extend(latest.values())
+    logging.info(f"Merged {len(records)} records into the {len(previous)} saved in {output_file}.")
+    return merged
+
+
+def main_batch(source, api_key, max_workers=DEFAULT_BATCH_WORKERS, output_file=None, pack_tokens=None,
+               pipeline=False, read_workers=None, queue_size=DEFAULT_PIPELINE_QUEUE_SIZE, bulk_writer=None,
+               journal=None, text_cache=None, **extract_options):
+    """
+    Runs batch mode: extracts every contract in `source` and saves the result records.
+
+    With `pack_tokens`, small contracts are packed several per request (see
+    `run_packed_batch`). Otherwise, with `pipeline`, reading, extraction and
+    writing overlap (see `run_pipeline`) and per-stage statistics are printed.
+
+    Records are streamed to `bulk_writer` (a `BulkResultWriter`) as they
+    complete. `output_file` additionally saves them all as one JSON array,
+    which means holding every record in memory until the end.
+
+    With a `journal` (a `BatchJournal`), contracts completed by an earlier
+    run are skipped and progress is checkpointed. Pass `journal.mark_written`
+    as the bulk writer's `on_flush` so contracts count as written once their
+    bulk output is; otherwise they are marked after `output_file` is saved.
+    A resumed run merges its records into the existing `output_file` instead
+    of replacing the earlier runs' results.
+    """
+    try:
+        paths = collect_contract_files(source)
+    except (FileNotFoundError, IOError) as e:
+        logging.error(f"Could not resolve batch source '{source}': {e}")
+        print(f"Error: {e}")
+        return
+    if not paths:
+        logging.warning(f"No contract files found in '{source}'.")
+        print(f"No contract files found in '{source}'.")
+        return
+    if journal is not None:
+        pending = [path for path in paths if not journal.is_complete(path)]
+        if len(pending) < len(paths):
+            logging.info(f"Skipping {len(paths) - len(pending)} contracts already completed in {journal.path}.")
+            print(f"Skipping {len(paths) - len(pending)} contracts already completed in {journal.path}.")
+        paths = pending
+        if not paths:
+            return
+
+    records_by_file = {}
+    failed = []
+
+    def collect(record):
+        if record["status"] != "ok":
+            failed.append(record)
+        if output_file:
+            records_by_file[record["file"]] = record
+        if bulk_writer is not None:
+            bulk_writer.write(record)
+
+    logging.info(f"Processing {len(paths)} contracts with up to {max_workers} workers...")
+    started = time.perf_counter()
+    pipeline_report = None
+    if pack_tokens:
+        if pipeline:
+            logging.warning("--pack-tokens needs every contract read up front; ignoring --pipeline.")
+        for record in run_packed_batch(paths, api_key, pack_tokens, max_workers=max_workers, journal=journal,
+                                       text_cache=text_cache, **extract_options):
+            collect(record)
+    elif pipeline:
+        pipeline_report = run_pipeline(paths, api_key, collect, read_workers=read_workers, llm_workers=max_workers,
+                                       queue_size=queue_size, journal=journal, text_cache=text_cache,
+                                       **extract_options)
+    else:
+        run_batch(paths, api_key, max_workers=max_workers, on_record=collect, journal=journal, text_cache=text_cache,
+                  **extract_options)
+    if bulk_writer is not None:
+        bulk_writer.flush()
+    elapsed = time.perf_counter() - started
+
+    if output_file:
+        try:
+            results = [records_by_file[path] for path in paths]
+            if journal is not None:
+                results = _merge_previous_results(output_file, results)
+            # Written to a temporary file first, so an interrupted save can't truncate earlier results
+            output_dir = os.path.dirname(os.path.abspath(output_file))
+            with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=output_dir, suffix=".tmp",
+                                             delete=False) as f_out:
+                json.dump(results, f_out, indent=2)
+            os.replace(f_out.name, output_file)
+            logging.info(f"Batch results saved to {output_file}")
+            if journal is not None and bulk_writer is None:
+                journal.mark_written(records_by_file.values())
+        except IOError as e:
+            logging.error(f"Error writing batch results to {output_file}: {e}")
+            print(f"Error saving batch results: {e}")
+
+    print(f"\nProcessed {len(paths)} contracts in {elapsed:.1f}s: "
+          f"{len(paths) - len(failed)} succeeded, {len(failed)} failed.")
+    for record in failed:
+        print(f"  {record['file']}: {record['error_type']}: {record['error']}")
+    if journal is not None and failed:
+        categories = ", ".join(f"{category}={count}" for category, count in sorted(journal.failure_categories().items()))
+        print(f"Failures by category: {categories}. Re-run with the same --journal to retry them.")
+    if pipeline_report is not None:
+        print(f"\n{'stage':<9}{'items':>7}{'errors':>8}{'busy s':>9}{'items/s':>9}{'max queue':>11}{'mean queue':>12}")
+        for stage in ("read", "extract", "write"):
+            row = pipeline_report[stage]
+            max_depth = "-" if row["max_queue_depth"] is None else row["max_queue_depth"]
+            mean_depth = "-" if row["mean_queue_depth"] is None else f"{row['mean_queue_depth']:.2f}"
+            print(f"{stage:<9}{row['items']:>7}{row['errors']:>8}{row['busy_seconds']:>9.2f}{row['items_per_second']:>9.2f}"
+                  f"{max_depth:>11}{mean_depth:>12}")
+    if extract_options.get("cache") is not None:
+        logging.info(f"Extraction cache stats: {extract_options['cache'].stats()}")
+    if text_cache is not None and not pipeline:
+        logging.info(f"PDF text cache stats: {text_cache.stats()}")
+    if extract_options.get("scheduler") is not None:
+        logging.info(f"Request scheduler stats: {extract_options['scheduler'].stats()}")
+    if extract_options.get("rules") is not None:
+        logging.info(f"Rule pre-extraction stats: {extract_options['rules'].stats()}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Extract structured data from contracts with Gemini.")
+    parser.add_argument("--batch", metavar="SOURCE",
+                        help="Directory, glob pattern or manifest file of contracts to process concurrently.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_BATCH_WORKERS,
+                        help=f"Maximum concurrent extractions in batch mode (default: {DEFAULT_BATCH_WORKERS}).")
+    parser.add_argument("--output", default=None,
+                        help=f"Where to save batch result records as one JSON array (default: {BATCH_OUTPUT_FILE} "
+                             f"unless --jsonl, --csv or --parquet is given).")
+    parser.add_argument("--jsonl", metavar="FILE",
+                        help="Append one JSON result record per contract to FILE.")
+    parser.add_argument("--csv", metavar="FILE",
+                        help="Append one row per contract, one column per field, to FILE.")
+    parser.add_argument("--parquet", metavar="DIR",
+                        help="Write one row per contract to a new Parquet part file in DIR (requires pyarrow).")
+    parser.add_argument("--flush-every", type=int, default=DEFAULT_FLUSH_RECORDS, metavar="N",
+                        help=f"Write --jsonl/--csv/--parquet output in batches of N records "
+                             f"(default: {DEFAULT_FLUSH_RECORDS}).")
+    parser.add_argument("--journal", metavar="FILE",
+                        help="Checkpoint batch progress in FILE; re-running with it skips completed contracts "
+                             "and retries failed or interrupted ones.")
+    parser.add_argument("--quiet", action="store_true",
+                        help="Skip echoing results and per-contract progress to the console.")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                        help="Directory of the persistent extraction cache.")
+    parser.add_argument("--text-cache-dir", default=DEFAULT_TEXT_CACHE_DIR,
+                        help="Directory of the persistent cache of text extracted from PDFs.")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Always parse PDFs and call the LLM, ignoring and not updating the caches.")
+    parser.add_argument("--rpm", type=int, default=None,
+                        help="Requests-per-minute quota to pace LLM calls against (enables retries with backoff).")
+    parser.add_argument("--tpm", type=int, default=None,
+                        help="Input-tokens-per-minute quota to pace LLM calls against.")
+    parser.add_argument("--retrieval-top-k", type=int, default=None, metavar="K",
+                        help="Send only the K most relevant sections per field group to the model.")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="In batch mode, overlap PDF reading (process pool), LLM calls and output writing.")
+    parser.add_argument("--read-workers", type=int, default=None,
+                        help="Processes reading contracts in --pipeline mode (default: CPU count).")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_PIPELINE_QUEUE_SIZE,
+                        help="Items buffered between --pipeline stages; bounds memory use.")
+    parser.add_argument("--normalize", action="store_true",
+                        help="Strip page headers/footers, markup, broken lines and boilerplate sections from "
+                             "contract text before prompting, to save input tokens.")
+    parser.add_argument("--pack-tokens", type=int, default=None, metavar="N",
+                        help="In batch mode, pack small contracts several per request, up to N estimated tokens each.")
+    parser.add_argument("--rules", action="store_true",
+                        help="Resolve standard-form fields with local rules first and only ask the model for the rest.")
+    parser.add_argument("--previous", metavar="FILE",
+                        help="Previous version of the contract: re-extract only the fields whose sections changed, "
+                             "carrying the rest forward from its cached extraction.")
+    parser.add_argument("--cascade", nargs="?", const=FAST_MODEL_NAME, default=None, metavar="FAST_MODEL",
+                        help=f"Extract with a fast model first (default {FAST_MODEL_NAME}) and re-ask {MODEL_NAME} "
+                             "only for fields that fail validation or disagree with --rules. Packed contracts "
+                             "are not cascaded.")
+    parser.add_argument("--repair", action="store_true",
+                        help="Patch up malformed model responses and re-ask, in one small follow-up request, "
+                             "for fields that are missing or fail validation.")
+    parser.add_argument("--fields", metavar="NAMES",
+                        help="Comma-separated field names to extract instead of all of them (e.g. "
+                             "\"Termination date,Trial period\"); outputs contain only these fields.")
+    parser.add_argument("--context-cache", action="store_true",
+                        help="Cache the static instruction prefix with the provider so it is billed once per run.")
+    return parser.parse_args()
+
+
 def main():
+    args = parse_args()
+    if args.quiet:
+        logging.getLogger().setLevel(logging.WARNING)
     logging.info("Starting contract processing...")
 
     # --- API Key Configuration ---
@@ -34,6 +933,66 @@ def main():
         print("Error: GOOGLE_API_KEY environment variable not set.")
         return
 
+    fields = None
+    if args.fields:
+        fields = [name.strip() for name in args.fields.split(",") if name.strip()]
+        unknown = [name for name in fields if name not in CONTRACT_FIELDS]
+        if unknown or not fields:
+            print(f"Error: unknown field(s) {unknown} in --fields. Valid fields: {', '.join(CONTRACT_FIELDS)}")
+            return
+        fields = [name for name in CONTRACT_FIELDS if name in fields]
+
+    extract_options = {
+        "cache": None if args.no_cache else ExtractionCache(args.cache_dir),
+        "retrieval_top_k": args.retrieval_top_k,
+        "scheduler": None,
+        "context_cache": args.context_cache,
+        "rules": RuleExtractor() if args.rules else None,
+        "normalize": args.normalize,
+        "fast_model_name": args.cascade,
+        "repair": args.repair,
+        "fields": fields,
+    }
+    text_cache = None if args.no_cache else PdfTextCache(args.text_cache_dir)
+    if args.rpm or args.tpm:
+        extract_options["scheduler"] = RequestScheduler(requests_per_minute=args.rpm, tokens_per_minute=args.tpm)
+
+    journal = None
+    if args.journal and args.batch:
+        try:
+            journal = BatchJournal(args.journal)
+        except IOError as e:
+            logging.error(f"Could not open journal {args.journal}: {e}")
+            print(f"Error: {e}")
+            return
+
+    bulk_writer = None
+    if args.jsonl or args.csv or args.parquet:
+        try:
+            bulk_writer = BulkResultWriter(args.jsonl, args.csv, args.parquet, flush_every=args.flush_every,
+                                           fields=fields or CONTRACT_FIELDS,
+                                           on_flush=journal.mark_written if journal else None)
+        except (ValueError, IOError) as e:
+            logging.error(f"Could not open bulk outputs: {e}")
+            print(f"Error: {e}")
+            return
+
+    if args.batch:
+        output_file = args.output or (None if bulk_writer else BATCH_OUTPUT_FILE)
+        try:
+            main_batch(args.batch, api_key, max_workers=args.workers, output_file=output_file,
+                       pack_tokens=args.pack_tokens, pipeline=args.pipeline, read_workers=args.read_workers,
+                       queue_size=args.queue_size, bulk_writer=bulk_writer, journal=journal, text_cache=text_cache,
+                       **extract_options)
+        finally:
+            if bulk_writer is not None:
+                bulk_writer.close()
+                logging.info(f"{bulk_writer.records_written} records appended to bulk outputs.")
+            if journal is not None:
+                journal.close()
+        logging.info("Contract processing finished.")
+        return
+
     # --- Read Contract File ---
     contract_text = None
     try:
@@ -67,14 +1026,21 @@ def main():
     extracted_data = None
     try:
         logging.info("Extracting data from contract using LLM...")
-        extracted_data = get_contract_data(contract_text, api_key)
+        if args.previous:
+            previous_text = read_contract_file(args.previous, text_cache)
+            extracted_data = get_contract_data_incremental(previous_text, contract_text, api_key, **extract_options)
+        elif len(contract_text) > MAX_CONTRACT_CHARS:
+            extracted_data = get_contract_data_mapreduce(contract_text, api_key, **extract_options)
+        else:
+            extracted_data = get_contract_data(contract_text, api_key, **extract_options)
         logging.info("Successfully extracted data from contract.")
 
         # --- Output JSON --- 
-        print("\n--- Extracted Contract Data (JSON) ---")
         formatted_json = json.dumps(extracted_data, indent=2)
-        print(formatted_json)
-        print("--- End JSON Data ---")
+        if not args.quiet:
+            print("\n--- Extracted Contract Data (JSON) ---")
+            print(formatted_json)
+            print("--- End JSON Data ---")
 
         # Save JSON to file
         try:
@@ -88,25 +1054,23 @@ def main():
         # --- Convert and Output CSV (Transposed) --- 
         if extracted_data:
             try:
-                # In-memory string for printing to console
+                # Serialize once; the same text is printed and saved
                 output_csv_string = io.StringIO()
                 writer = csv.writer(output_csv_string)
                 # Write key-value pairs, one per row
                 for key, value in extracted_data.items():
                     writer.writerow([key, value])
-                
                 csv_content = output_csv_string.getvalue()
                 output_csv_string.close()
-                
-                print("\n--- Extracted Contract Data (CSV) ---")
-                print(csv_content.strip())
-                print("--- End CSV Data ---")
+
+                if not args.quiet:
+                    print("\n--- Extracted Contract Data (CSV) ---")
+                    print(csv_content.strip())
+                    print("--- End CSV Data ---")
 
                 # Save transposed CSV to file
                 with open(OUTPUT_CSV_FILE, 'w', encoding='utf-8', newline='') as f_csv:
-                    file_writer = csv.writer(f_csv)
-                    for key, value in extracted_data.items():
-                        file_writer.writerow([key, value])
+                    f_csv.write(csv_content)
                 logging.info(f"Transposed CSV output saved to {OUTPUT_CSV_FILE}")
 
             except (IOError, TypeError) as e:
@@ -115,6 +1079,11 @@ def main():
         else:
             logging.info("No data extracted, skipping CSV generation.")
 
+        if bulk_writer is not None:
+            record = _new_record(CONTRACT_FILE_PATH)
+            record["data"] = extracted_data
+            bulk_writer.write(record)
+
     except LLMConfigurationError as e:
         logging.error(f"LLM Configuration Error: {e}")
         print(f"LLM Configuration Error: {e}")
@@ -124,12 +1093,18 @@ def main():
     except JSONParsingError as e:
         logging.error(f"JSON Parsing Error: {e}")
         print(f"JSON Parsing Error: {e}")
+    except (FileNotFoundError, IOError, PDFReadError) as e: # Reading the --previous version
+        logging.error(f"Error reading previous contract version {args.previous}: {e}")
+        print(f"Error reading previous contract version: {e}")
     except ValueError as e: # Catch ValueErrors from get_contract_data (empty text/key)
         logging.error(f"ValueError during processing: {e}")
         print(f"Error: {e}")
     except Exception as e:
         logging.error(f"An unexpected error occurred during contract processing: {e}", exc_info=True)
         print(f"An unexpected error occurred: {e}")
+    finally:
+        if bulk_writer is not None:
+            bulk_writer.close()
 
     logging.info("Contract processing finished.")
 
@@ -0,0 +1,26 @@
+import os
+import sys
+
+# The modules live at the repository root, not in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+
+@pytest.fixture
+def fake_backend():
+    """Routes every Gemini call to benchmark.py's local fake model (no network, no API key)."""
+    import benchmark
+    uninstall = benchmark.install_fake_backend(latency_seconds=0.0)
+    yield benchmark.FakeGenerativeModel
+    uninstall()
+
+
+@pytest.fixture
+def contract_dir(tmp_path):
+    """A directory of 12 small, distinct Markdown contracts."""
+    for i in range(12):
+        (tmp_path / f"contract{i:02d}.md").write_text(
+            f"# Agreement {i}\n\nSubscriber: Partner {i}\n\nThe term of this agreement is {i + 1} years.\n",
+            encoding="utf-8")
+    return tmp_path
@@ -0,0 +1,39 @@
+import asyncio
+import json
+
+import utils
+
+CONTRACT = "This agreement has a term of two years. Licensor will deliver monthly reports."
+
+
+def test_async_and_sync_share_cache_only_with_matching_options(fake_backend, tmp_path):
+    cache = utils.ExtractionCache(str(tmp_path / "cache"))
+    rules = utils.RuleExtractor()
+    sync_data = utils.get_contract_data(CONTRACT, "fake-key", cache=cache, rules=rules)
+    assert fake_backend.calls == 1
+
+    # Same options: served from the sync result
+    assert asyncio.run(utils.aget_contract_data(CONTRACT, "fake-key", cache=cache, rules=rules)) == sync_data
+    assert fake_backend.calls == 1
+    # Different options: extracted again, not handed the rule-based result
+    plain = asyncio.run(utils.aget_contract_data(CONTRACT, "fake-key", cache=cache))
+    assert fake_backend.calls == 2
+    assert plain == json.loads(fake_backend.response_text)
+
+
+def test_async_applies_rules_and_fields(fake_backend):
+    fields = ["Term length (days)", "Trial period"]
+    provenance = {}
+    data = asyncio.run(utils.aget_contract_data(CONTRACT, "fake-key", rules=utils.RuleExtractor(), fields=fields,
+                                                provenance=provenance))
+    assert list(data) == fields
+    assert data["Term length (days)"] == 730
+    assert provenance["Term length (days)"]["source"] == "rule"
+    assert provenance["Trial period"] == {"source": "llm"}
+
+
+def test_async_repair_re_asks_invalid_fields(fake_backend):
+    fake_backend.corrupt_next = [lambda text: json.dumps({**json.loads(text), "Eligibility": "everyone"})]
+    data = asyncio.run(utils.aget_contract_data(CONTRACT, "fake-key", repair=True))
+    assert data["Eligibility"] != "everyone"
+    assert fake_backend.calls == 2
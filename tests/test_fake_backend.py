@@ -0,0 +1,13 @@
+import benchmark
+import utils
+
+
+def test_uninstall_restores_the_real_backend():
+    real_model, real_cached_content = utils.genai.GenerativeModel, utils.genai.caching.CachedContent
+    uninstall = benchmark.install_fake_backend(latency_seconds=0.0)
+    assert utils.genai.GenerativeModel is benchmark.FakeGenerativeModel
+    assert isinstance(utils.get_model("fake-key"), benchmark.FakeGenerativeModel)
+    uninstall()
+    assert utils.genai.GenerativeModel is real_model
+    assert utils.genai.caching.CachedContent is real_cached_content
+    assert not utils._model_pool # No pooled fake model is handed out later
@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+import utils
+
+CONTRACT = "This agreement has a term of two years. Licensor will deliver monthly reports."
+SUBSET = ["Term length (days)", "Trial period", "Performance Reports Frequency"]
+
+
+def test_requested_fields_accepts_any_iterable():
+    assert utils._requested_fields(field for field in reversed(SUBSET)) == [
+        field for field in utils.CONTRACT_FIELDS if field in SUBSET]
+    assert utils._requested_fields("Trial period") == ["Trial period"]
+
+
+@pytest.mark.parametrize("fields, message", [([], "at least one"), (["Nope"], "Unknown field")])
+def test_requested_fields_rejects_bad_names(fields, message):
+    with pytest.raises(ValueError, match=message):
+        utils._requested_fields(fields)
+
+
+def test_subset_extraction_is_cached_apart_from_full(fake_backend, tmp_path):
+    cache = utils.ExtractionCache(str(tmp_path / "cache"))
+    subset = utils.get_contract_data(CONTRACT, "fake-key", cache=cache, fields=SUBSET)
+    assert list(subset) == [field for field in utils.CONTRACT_FIELDS if field in SUBSET]
+    assert fake_backend.calls == 1
+
+    full = utils.get_contract_data(CONTRACT, "fake-key", cache=cache)
+    assert set(full) == set(utils.CONTRACT_FIELDS)
+    assert fake_backend.calls == 2
+    # Each is served from its own entry; another subset gets its own too
+    assert utils.get_contract_data(CONTRACT, "fake-key", cache=cache, fields=iter(SUBSET)) == subset
+    assert fake_backend.calls == 2
+    utils.get_contract_data(CONTRACT, "fake-key", cache=cache, fields=SUBSET[:1])
+    assert fake_backend.calls == 3
+
+
+def test_subset_merges_rule_values_and_asks_the_model_for_the_rest(fake_backend):
+    provenance = {}
+    data = utils.get_contract_data(CONTRACT, "fake-key", rules=utils.RuleExtractor(), fields=SUBSET,
+                                   provenance=provenance)
+    canned = json.loads(fake_backend.response_text)
+    assert list(data) == [field for field in utils.CONTRACT_FIELDS if field in SUBSET]
+    assert data["Term length (days)"] == 730
+    assert data["Performance Reports Frequency"] == "monthly"
+    assert data["Trial period"] == canned["Trial period"]
+    assert provenance["Term length (days)"]["source"] == "rule"
+    assert provenance["Trial period"] == {"source": "llm"}
+    assert fake_backend.calls == 1
+
+
+def test_subset_fully_resolved_by_rules_skips_the_model(fake_backend):
+    data = utils.get_contract_data(CONTRACT, "fake-key", rules=utils.RuleExtractor(), fields=SUBSET[:1])
+    assert data == {"Term length (days)": 730}
+    assert fake_backend.calls == 0
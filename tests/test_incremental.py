@@ -0,0 +1,52 @@
+import logging
+
+import utils
+
+SECTIONS = [
+    "# Master Services Agreement\n\nThis agreement is between Acme Corp and Partner LLC, effective 2024-01-01.\n",
+    "## 1. Term\n\nThe term of this agreement is three years.\n",
+    "## 2. Reporting\n\nPartner shall deliver monthly reports to Acme.\n",
+    "## 3. Payment\n\nFees are payable within 30 days of invoice.\n",
+    "## 4. Governing Law\n\nThis agreement is governed by the laws of Delaware.\n",
+]
+PREVIOUS = "\n".join(SECTIONS)
+AMENDED = PREVIOUS.replace("monthly reports", "quarterly reports")
+FULL_FALLBACK = "extracting the new version in full"
+
+
+def test_reuses_previous_extraction_cached_with_same_options(fake_backend, tmp_path, caplog):
+    cache = utils.ExtractionCache(str(tmp_path / "cache"))
+    options = {"cache": cache, "normalize": True, "rules": utils.RuleExtractor()}
+    previous = utils.get_contract_data(PREVIOUS, "fake-key", **options)
+
+    calls = fake_backend.calls
+    with caplog.at_level(logging.INFO):
+        amended = utils.get_contract_data_incremental(PREVIOUS, AMENDED, "fake-key", **options)
+    assert FULL_FALLBACK not in caplog.text
+    assert fake_backend.calls - calls <= 1
+    assert set(amended) == set(previous)
+    # Stored under the same options, so a plain lookup finds it
+    assert utils.get_contract_data(AMENDED, "fake-key", **options) == amended
+    assert fake_backend.calls - calls <= 1
+
+
+def test_falls_back_when_previous_extraction_used_other_options(fake_backend, tmp_path, caplog):
+    cache = utils.ExtractionCache(str(tmp_path / "cache"))
+    utils.get_contract_data(PREVIOUS, "fake-key", cache=cache)
+
+    with caplog.at_level(logging.WARNING):
+        amended = utils.get_contract_data_incremental(PREVIOUS, AMENDED, "fake-key", cache=cache, normalize=True)
+    assert FULL_FALLBACK in caplog.text
+    assert set(amended) == set(utils.CONTRACT_FIELDS)
+
+
+def test_fields_subset_applies_to_re_extraction(fake_backend, tmp_path):
+    cache = utils.ExtractionCache(str(tmp_path / "cache"))
+    fields = utils.CONTRACT_FIELDS[:3]
+    utils.get_contract_data(PREVIOUS, "fake-key", cache=cache, fields=fields)
+
+    provenance = {}
+    amended = utils.get_contract_data_incremental(PREVIOUS, AMENDED, "fake-key", cache=cache, fields=fields,
+                                                  provenance=provenance)
+    assert list(amended) == list(fields)
+    assert set(provenance) == set(fields)
@@ -0,0 +1,24 @@
+from utils import find_json_object
+
+
+def test_unbalanced_brace_in_prose_before_payload():
+    assert find_json_object('Use {placeholder text then {"a": 1}') == ({"a": 1}, None)
+
+
+def test_unbalanced_brace_and_trailing_chatter():
+    parsed, _ = find_json_object('Fill in {name and {date. Result: {"a": {"b": 2}} Hope that helps!')
+    assert parsed == {"a": {"b": 2}}
+
+
+def test_fenced_block_preferred():
+    text = 'Example: {"a": 0}\n```json\n{"a": 1}\n```'
+    assert find_json_object(text) == ({"a": 1}, None)
+
+
+def test_braces_in_prose_are_skipped():
+    assert find_json_object('See {clause 4} and {"a": 1} then {"b": 2}') == ({"a": 1}, None)
+
+
+def test_nothing_found():
+    parsed, error = find_json_object("No JSON {here")
+    assert parsed is None and error is None
@@ -0,0 +1,57 @@
+import pytest
+
+import utils
+
+
+def _order_form(number, effective, body=""):
+    return (f"## Order Form No. {number}\n\nThis Order Form is effective as of {effective} (\"Effective Date\").\n\n"
+            f"{body}")
+
+
+def test_order_form_dated_by_its_effective_date_not_other_dates():
+    # The older Order Form mentions a later date in its body (e.g., a renewal deadline)
+    older = _order_form(1, "January 5, 2024", "Subscriber may renew by giving notice before December 31, 2026.\n")
+    newer = _order_form(2, "March 1, 2025")
+    merged = utils.reduce_window_results([
+        (older, {"Trial period": 30}),
+        (newer, {"Trial period": 90}),
+    ])
+    assert merged["Trial period"] == 90
+
+
+def test_effective_date_label_after_heading():
+    window = "## Order Form No. 3\n\nEffective Date: 04/22/2024\n\nPayment is due by June 1, 2030.\n"
+    assert utils._window_precedence(window) == (1, utils.datetime(2024, 4, 22).date())
+
+
+def test_undated_order_form_still_beats_agreement():
+    agreement = "This Agreement is entered into as of May 1, 2025 (\"Effective Date\").\n"
+    merged = utils.reduce_window_results([
+        (agreement, {"Trial period": 30}),
+        ("## Order Form No. 1\n\nThe trial period is 90 days.\n", {"Trial period": 90}),
+    ])
+    assert merged["Trial period"] == 90
+
+
+def _sections(count, chars):
+    return "".join(f"## Section {i}\n\n" + "word " * (chars // 5) + "\n\n" for i in range(count))
+
+
+@pytest.mark.parametrize("count, chars, window_chars, overlap_chars", [
+    (7, 3500, 4000, 800),
+    (3, 9000, 4000, 800), # Sections longer than a window
+    (40, 300, 2000, 500),
+    (7, 3500, 4000, 0),
+])
+def test_windows_never_exceed_window_chars(count, chars, window_chars, overlap_chars):
+    text = _sections(count, chars)
+    windows = utils.split_contract_windows(text, window_chars, overlap_chars)
+    assert len(windows) > 1
+    assert max(len(window) for window in windows) <= window_chars
+    # Every window after the first starts with the end of the previous one
+    for previous, window in zip(windows, windows[1:]):
+        if overlap_chars:
+            assert window.startswith(previous[-overlap_chars:])
+    # Nothing is lost: dropping each overlap gives back the text
+    rebuilt = windows[0] + "".join(window[overlap_chars:] for window in windows[1:])
+    assert rebuilt == text
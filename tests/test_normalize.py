@@ -0,0 +1,29 @@
+from utils import normalize_contract_text
+
+
+def _paged(pages, lines_per_page=15):
+    """A document of `pages` pages, each ending with its page number on its own line."""
+    body = "\n".join(f"The parties agree to clause {k} of this agreement." for k in range(lines_per_page))
+    return "\n".join(f"{body}\n{page}" for page in range(1, pages + 1))
+
+
+def test_table_values_survive():
+    text = "Eligible Users\n1500\nFee per user per month ($)\n5\nTerm (years)\n3"
+    normalized = normalize_contract_text(text)
+    assert normalized.split("\n")[:6] == ["Eligible Users", "1500", "Fee per user per month ($)", "5",
+                                          "Term (years)", "3"]
+
+
+def test_numbered_rows_survive():
+    text = "Item\n1\nItem\n2\nItem\n3\nItem\n4"
+    assert [line for line in normalize_contract_text(text).split("\n") if line.isdigit()] == ["1", "2", "3", "4"]
+
+
+def test_page_number_sequence_is_removed():
+    normalized = normalize_contract_text(_paged(4))
+    assert not [line for line in normalized.split("\n") if line.strip().isdigit()]
+
+
+def test_short_page_sequence_is_kept():
+    normalized = normalize_contract_text(_paged(2))
+    assert [line for line in normalized.split("\n") if line.strip().isdigit()] == ["1", "2"]
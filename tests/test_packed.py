@@ -0,0 +1,30 @@
+import utils
+
+
+def test_packed_requests_use_their_own_instruction_and_model(fake_backend):
+    contracts = [f"Order form {i}. Subscriber: Partner {i}. Term: {i + 1} years." for i in range(4)]
+    results = utils.get_contract_data_packed(contracts, "fake-key", token_budget=10000)
+    assert all(set(result) == set(utils.CONTRACT_FIELDS) for result in results)
+    assert fake_backend.calls == 1
+
+    packed_model = utils.get_model("fake-key", packed=True)
+    single_model = utils.get_model("fake-key")
+    assert packed_model is not single_model
+    assert packed_model.system_instruction == utils.PACKED_SYSTEM_INSTRUCTION
+    assert single_model.system_instruction == utils.SYSTEM_INSTRUCTION
+    assert '"contracts" array' in utils.PACKED_SYSTEM_INSTRUCTION
+    assert "single flat JSON object" not in utils.PACKED_SYSTEM_INSTRUCTION
+
+
+def test_packed_results_are_cached_apart_from_single_extractions(fake_backend, tmp_path):
+    cache = utils.ExtractionCache(str(tmp_path / "cache"))
+    contracts = [f"Order form {i}. Subscriber: Partner {i}." for i in range(3)]
+    utils.get_contract_data_packed(contracts, "fake-key", cache=cache)
+    assert fake_backend.calls == 1
+
+    # A single-contract caller is not served the unvalidated packed result
+    utils.get_contract_data(contracts[0], "fake-key", cache=cache)
+    assert fake_backend.calls == 2
+    # The packed path reuses both its own results and single-contract ones
+    utils.get_contract_data_packed(contracts + ["Order form 3."], "fake-key", cache=cache)
+    assert fake_backend.calls == 3
@@ -0,0 +1,60 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import main
+
+
+def _run_in_thread(fn, timeout=30):
+    """Runs fn() on a helper thread; returns (finished, exception)."""
+    outcome = {}
+
+    def target():
+        try:
+            fn()
+        except BaseException as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    return not thread.is_alive(), outcome.get("error")
+
+
+def _paths(contract_dir):
+    return sorted(str(path) for path in contract_dir.iterdir())
+
+
+def test_interrupted_pipeline_exits(fake_backend, contract_dir):
+    written = []
+
+    def writer(record):
+        written.append(record)
+        if len(written) == 2:
+            raise KeyboardInterrupt
+
+    finished, error = _run_in_thread(lambda: main.run_pipeline(
+        _paths(contract_dir), "fake-key", writer, read_workers=1, llm_workers=2, queue_size=1))
+    assert finished, "run_pipeline hung after the writer was interrupted"
+    assert isinstance(error, KeyboardInterrupt)
+    assert len(written) == 2
+
+
+def test_broken_read_pool_still_yields_every_record(fake_backend, contract_dir, monkeypatch):
+    class BreakingPool(ProcessPoolExecutor):
+        submitted = 0
+
+        def submit(self, *args, **kwargs):
+            BreakingPool.submitted += 1
+            if BreakingPool.submitted > 3:
+                raise BrokenProcessPool("worker died")
+            return super().submit(*args, **kwargs)
+
+    monkeypatch.setattr(main, "ProcessPoolExecutor", BreakingPool)
+    records = []
+    finished, error = _run_in_thread(lambda: main.run_pipeline(
+        _paths(contract_dir), "fake-key", records.append, read_workers=1, llm_workers=2, queue_size=1))
+    assert finished and error is None
+    assert len(records) == 12
+    assert sum(record["status"] == "ok" for record in records) == 3
+    assert {record["error_type"] for record in records if record["status"] != "ok"} == {"BrokenProcessPool"}
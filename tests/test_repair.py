@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from utils import JSONParsingError, parse_llm_response, repair_json_text
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"a": 1, "b": "x",}', {"a": 1, "b": "x"}),
+    ('{"a": [1, 2,], "b": {"c": 3,},}', {"a": [1, 2], "b": {"c": 3}}),
+    ("{'a': 'it\\'s', 'b': 'say \"hi\"'}", {"a": "it's", "b": 'say "hi"'}),
+    ("{'a': True, 'b': False, 'c': None}", {"a": True, "b": False, "c": None}),
+    ('{"a": all, "b": é, "c": Ångström}', {"a": "all", "b": "é", "c": "Ångström"}),
+    ('{"a": 1e5, "b": -2.5E-3}', {"a": 1e5, "b": -2.5e-3}),
+    ('{"a": "multi\nline"}', {"a": "multi\nline"}),
+    ('{"a": [1, 2}', {"a": [1, 2]}),
+    ('Here you go: ```json\n{"a": 1,}\n```', {"a": 1}),
+])
+def test_repairs(text, expected):
+    assert json.loads(repair_json_text(text)) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"a": 1, "b": "trunc', {"a": 1}),
+    ('{"a": 1, "b": 36', {"a": 1}), # The last value may be cut short, so it is dropped
+    ('{"a": 1, "b": 2,', {"a": 1, "b": 2}),
+    ('{"a": {"value": 3, "x": [1,', {}),
+    ('{"a', {}),
+])
+def test_truncation_keeps_complete_members(text, expected):
+    assert json.loads(repair_json_text(text)) == expected
+
+
+def test_no_object():
+    assert repair_json_text("I'm sorry, I can't help with that.") is None
+
+
+def test_parse_llm_response_repairs_non_ascii_bare_word():
+    assert parse_llm_response('{"a": é}', repair=True) == {"a": "é"}
+
+
+def test_parse_llm_response_without_repair_still_raises():
+    with pytest.raises(JSONParsingError):
+        parse_llm_response('{"a": 1,', repair=False)
+
+
+def _invalid_values(text):
+    return json.dumps({**json.loads(text), "Eligibility": "everyone"})
+
+
+def test_repair_is_opt_in_and_cached_separately(fake_backend, tmp_path):
+    import utils
+    cache = utils.ExtractionCache(str(tmp_path / "cache"))
+    contract = "Subscriber: Partner LLC. Eligibility: all members."
+
+    fake_backend.corrupt_next = [_invalid_values]
+    plain = utils.get_contract_data(contract, "fake-key", cache=cache)
+    assert plain["Eligibility"] == "everyone"
+    assert fake_backend.calls == 1 # No follow-up request without repair
+
+    # The unrepaired result in the cache is not served to a caller that asked for repair
+    fake_backend.corrupt_next = [_invalid_values]
+    repaired = utils.get_contract_data(contract, "fake-key", cache=cache, repair=True)
+    assert repaired["Eligibility"] != "everyone"
+    assert fake_backend.calls == 3
+    assert utils.get_contract_data(contract, "fake-key", cache=cache) == plain
+    assert fake_backend.calls == 3
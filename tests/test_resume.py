@@ -0,0 +1,83 @@
+import json
+
+import main
+
+
+class InterruptingWriter(main.BulkResultWriter):
+    """A BulkResultWriter that raises KeyboardInterrupt (like Ctrl-C) on its Nth write."""
+
+    def __init__(self, *args, interrupt_on, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.interrupt_on = interrupt_on
+        self.writes = 0
+
+    def write(self, record):
+        self.writes += 1
+        if self.writes == self.interrupt_on:
+            raise KeyboardInterrupt
+        super().write(record)
+
+
+def _jsonl_records(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def test_interrupted_pipeline_run_resumes(fake_backend, contract_dir, tmp_path):
+    results = tmp_path / "results.jsonl"
+    journal_path = tmp_path / "batch.journal"
+
+    journal = main.BatchJournal(str(journal_path))
+    writer = InterruptingWriter(str(results), None, None, flush_every=1, on_flush=journal.mark_written,
+                                interrupt_on=4)
+    try:
+        main.main_batch(str(contract_dir), "fake-key", max_workers=2, pipeline=True, read_workers=1, queue_size=1,
+                        bulk_writer=writer, journal=journal, cache=None)
+    except KeyboardInterrupt:
+        pass
+    else:
+        raise AssertionError("the first run was not interrupted")
+    finally:
+        writer.close()
+        journal.close()
+    first_run = {record["file"] for record in _jsonl_records(results)}
+    assert len(first_run) == 3
+
+    fake_backend.calls = 0
+    journal = main.BatchJournal(str(journal_path))
+    writer = main.BulkResultWriter(str(results), None, None, flush_every=1, on_flush=journal.mark_written)
+    try:
+        main.main_batch(str(contract_dir), "fake-key", max_workers=2, pipeline=True, read_workers=1, queue_size=1,
+                        bulk_writer=writer, journal=journal, cache=None)
+    finally:
+        writer.close()
+        journal.close()
+
+    records = _jsonl_records(results)
+    assert fake_backend.calls == 9 # Only the contracts the first run didn't write
+    assert sorted(record["file"] for record in records) == sorted(str(path) for path in contract_dir.glob("*.md"))
+    assert all(record["status"] == "ok" for record in records)
+
+
+def test_resumed_run_keeps_earlier_json_results(fake_backend, contract_dir, tmp_path):
+    output = tmp_path / "batch_output.json"
+    late = sorted(contract_dir.glob("*.md"))[6:]
+    for path in late:
+        path.rename(path.with_suffix(".later"))
+
+    def run():
+        journal = main.BatchJournal(str(tmp_path / "batch.journal"))
+        try:
+            main.main_batch(str(contract_dir), "fake-key", max_workers=2, output_file=str(output), journal=journal,
+                            cache=None)
+        finally:
+            journal.close()
+
+    run()
+    for path in late:
+        path.with_suffix(".later").rename(path)
+    run() # Skips the first six contracts, which are already written
+
+    with open(output, encoding="utf-8") as f:
+        saved = json.load(f)
+    assert sorted(record["file"] for record in saved) == sorted(str(path) for path in contract_dir.glob("*.md"))
@@ -0,0 +1,67 @@
+import pytest
+
+import utils
+
+AGREEMENT_FIELD = "Data sharing agreement or business associate agreement"
+
+
+def _extract(text):
+    values, provenance = utils.RuleExtractor().extract(text)
+    return values, provenance
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("The parties agree to execute a business associate agreement and/or a data use agreement.",
+     "Business associate agreement"),
+    ("Customer shall enter into the Business Associate Agreement attached as Exhibit B.",
+     "Business associate agreement"),
+    ("The parties will sign a mutually agreed data sharing agreement before launch.", "Data sharing agreement"),
+    ("Subscriber is required to execute a Data Sharing Agreement. The Data Sharing Agreement governs all exports.",
+     None), # The second mention is not an obligation
+])
+def test_agreement_type_needs_an_obligation(text, expected):
+    values, provenance = _extract(text)
+    assert values.get(AGREEMENT_FIELD) == expected
+    if expected:
+        assert provenance[AGREEMENT_FIELD]["source"] == "rule"
+
+
+@pytest.mark.parametrize("text", [
+    "Customer is not required to sign a business associate agreement.",
+    "The parties shall not enter into a business associate agreement.",
+    "No business associate agreement will be executed under this Agreement.",
+    "Customer shall execute a business associate agreement unless it is not a covered entity.",
+    "Customer won't sign a business associate agreement.",
+    "A business associate agreement may be provided on request.",
+    "The parties shall execute a business associate agreement and a data sharing agreement.",
+])
+def test_agreement_type_leaves_unclear_mentions_to_the_llm(text):
+    values, _ = _extract(text)
+    assert AGREEMENT_FIELD not in values
+
+
+def test_unresolved_agreement_field_stays_in_the_prompt(fake_backend):
+    text = "Customer is not required to sign a business associate agreement. This agreement has a term of two years."
+    provenance = {}
+    utils.get_contract_data(text, "fake-key", rules=utils.RuleExtractor(), provenance=provenance)
+    assert provenance[AGREEMENT_FIELD] == {"source": "llm"}
+    assert provenance["Term length (days)"]["source"] == "rule"
+
+
+@pytest.mark.parametrize("text, field, expected", [
+    ('This Agreement is entered into as of April 22, 2024 ("Effective Date").', "Effective date", "04/22/2024"),
+    ("Effective Date: 05/01/2025", "Effective date", "05/01/2025"),
+    ("The initial term of three (3) years starts today.", "Term length (days)", 1095),
+    ("Licensor shall delete all data within forty-five (45) hours.", "Timeframe (hours)", 45),
+    ("Licensor will deliver monthly performance reports.", "Performance Reports Frequency", "monthly"),
+    ("Users get a trial period of 90 calendar days.", "Trial period", 90),
+])
+def test_standard_phrasings(text, field, expected):
+    values, provenance = _extract(text)
+    assert values.get(field) == expected
+    assert provenance[field]["source"] == "rule"
+
+
+def test_conflicting_statements_are_left_to_the_llm():
+    values, _ = _extract("Licensor will deliver monthly reports. Licensor will deliver quarterly reports.")
+    assert "Performance Reports Frequency" not in values
@@ -0,0 +1,121 @@
+import asyncio
+import random
+
+import pytest
+from google.api_core import exceptions as google_exceptions
+
+import utils
+
+
+class FakeClock:
+    """A clock that only moves when the scheduler sleeps."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def _scheduler(clock, **kwargs):
+    return utils.RequestScheduler(clock=clock, sleep=clock.sleep, rng=random.Random(0), **kwargs)
+
+
+def _failing(errors, result="ok"):
+    """A call that raises each of `errors` in turn, then returns `result`."""
+    errors = list(errors)
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if errors:
+            raise errors.pop(0)
+        return result
+    return fn, calls
+
+
+def test_request_bucket_starts_full_then_refills_at_the_rate():
+    clock = FakeClock()
+    scheduler = _scheduler(clock, requests_per_minute=2, tokens_per_minute=None)
+    scheduler.call(lambda: None)
+    scheduler.call(lambda: None)
+    assert clock.sleeps == [] # The burst fits the full bucket
+    scheduler.call(lambda: None)
+    assert clock.sleeps == [pytest.approx(30.0)] # One request refills every 60/2 seconds
+    assert scheduler.stats()["requests"] == 3
+    assert scheduler.stats()["max_wait_seconds"] == pytest.approx(30.0)
+
+
+def test_token_bucket_waits_for_enough_tokens():
+    clock = FakeClock()
+    scheduler = _scheduler(clock, requests_per_minute=None, tokens_per_minute=600)
+    scheduler.call(lambda: None, tokens=500)
+    scheduler.call(lambda: None, tokens=400) # 100 left, 300 more needed at 10 tokens/second
+    assert clock.sleeps == [pytest.approx(30.0)]
+    # A request larger than the whole budget waits only for a full bucket
+    clock.now += 60
+    scheduler.call(lambda: None, tokens=10000)
+    assert len(clock.sleeps) == 1
+
+
+@pytest.mark.parametrize("error", [google_exceptions.ResourceExhausted("quota"),
+                                   google_exceptions.ServiceUnavailable("down"),
+                                   google_exceptions.DeadlineExceeded("slow")])
+def test_transient_errors_are_retried_with_jittered_backoff(error):
+    clock = FakeClock()
+    scheduler = _scheduler(clock, requests_per_minute=None, tokens_per_minute=None, base_delay=1.0, max_delay=3.0)
+    fn, calls = _failing([error, error, error])
+    assert scheduler.call(fn) == "ok"
+    assert len(calls) == 4
+    assert scheduler.stats()["retries"] == 3
+    expected = random.Random(0)
+    assert clock.sleeps == [pytest.approx(expected.uniform(0, cap)) for cap in (1.0, 2.0, 3.0)]
+
+
+def test_gives_up_after_max_retries():
+    clock = FakeClock()
+    scheduler = _scheduler(clock, requests_per_minute=None, tokens_per_minute=None, max_retries=2)
+    fn, calls = _failing([google_exceptions.TooManyRequests("slow down")] * 5)
+    with pytest.raises(google_exceptions.TooManyRequests):
+        scheduler.call(fn)
+    assert len(calls) == 3
+    assert scheduler.stats()["retries"] == 2
+
+
+def test_non_transient_errors_are_not_retried():
+    clock = FakeClock()
+    scheduler = _scheduler(clock, requests_per_minute=None, tokens_per_minute=None)
+    fn, calls = _failing([google_exceptions.InvalidArgument("bad request")])
+    with pytest.raises(google_exceptions.InvalidArgument):
+        scheduler.call(fn)
+    assert len(calls) == 1
+    assert clock.sleeps == []
+    assert scheduler.stats()["retries"] == 0
+
+
+def test_acall_retries_transient_errors():
+    scheduler = utils.RequestScheduler(requests_per_minute=None, tokens_per_minute=None, base_delay=0.0,
+                                       rng=random.Random(0))
+    fn, calls = _failing([google_exceptions.InternalServerError("oops")])
+
+    async def coro():
+        return fn()
+    assert asyncio.run(scheduler.acall(coro)) == "ok"
+    assert len(calls) == 2
+
+
+def test_token_estimate_uses_the_instruction_sent():
+    prompt = "Contract text"
+    full = utils._request_tokens(prompt)
+    subset = utils._request_tokens(prompt, ["Trial period"])
+    assert full == utils.estimate_tokens(utils.SYSTEM_INSTRUCTION) + utils.estimate_tokens(prompt)
+    assert subset == (utils.estimate_tokens(utils.build_system_instruction(utils._select_fields(["Trial period"])))
+                      + utils.estimate_tokens(prompt))
+    assert subset < full
+    assert utils._request_tokens(prompt, packed=True) == (utils.estimate_tokens(utils.PACKED_SYSTEM_INSTRUCTION)
+                                                          + utils.estimate_tokens(prompt))
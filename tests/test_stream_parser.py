@@ -0,0 +1,44 @@
+import json
+import random
+
+import pytest
+
+import utils
+
+RESPONSE = '```json\n' + json.dumps({
+    "Subscriber": 'Partner "East" LLC, {Inc.}',
+    "Trial period": 90,
+    "Legacy": {"description": "old format", "type": "string", "value": "kept"},
+    "Tags": ["a", "b, c"],
+    "Missing": None,
+}) + '\n```'
+EXPECTED = [("Subscriber", 'Partner "East" LLC, {Inc.}'), ("Trial period", 90), ("Legacy", "kept"),
+            ("Tags", ["a", "b, c"]), ("Missing", None)]
+
+
+def _feed(chunks):
+    parser = utils.IncrementalFieldParser()
+    fields = []
+    for chunk in chunks:
+        fields.extend(parser.feed(chunk))
+    return parser, fields
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_any_chunking_yields_the_same_fields(seed):
+    rng = random.Random(seed)
+    chunks, pos = [], 0
+    while pos < len(RESPONSE):
+        size = rng.randint(1, 12)
+        chunks.append(RESPONSE[pos:pos + size])
+        pos += size
+    parser, fields = _feed(chunks)
+    assert fields == EXPECTED
+    # Chunks after the one that closes the object are ignored
+    assert RESPONSE.startswith(parser.text)
+    assert RESPONSE.index("null}") + len("null}") <= len(parser.text)
+
+
+def test_one_character_chunks():
+    _, fields = _feed(list(RESPONSE))
+    assert fields == EXPECTED
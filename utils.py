@@ -1,17 +1,123 @@
 import google.generativeai as genai
+from google.generativeai import client as genai_client
+from google.api_core import exceptions as google_exceptions
 import PyPDF2
 import os
 import json
 from datetime import datetime
 import re
+import math
+import random
 import io
+import mmap
+import time
+import gzip
+import hashlib
+import tempfile
+import asyncio
+import threading
 import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 # --- Configuration ---
 MODEL_NAME = "models/gemini-2.5-pro-preview-03-25"
+# First-pass model for get_contract_data_cascade. Only the fields whose
+# answers fail validate_contract_data (or disagree with the rules) are
+# re-asked of MODEL_NAME.
+FAST_MODEL_NAME = "models/gemini-2.0-flash"
+# Bump whenever build_llm_prompt() or parse_llm_response() changes what gets
+# extracted, so cached extractions from the old prompt are not reused.
+PROMPT_VERSION = "3"
+# The single definition of every extracted field, in prompt order. Both the
+# prompt text and the response schema are generated from this. Types:
+# "string", "date" (an MM/DD/YYYY string), "integer" and "boolean"; every
+# field may be null. "null_as" replaces a null value after parsing, for
+# fields whose legacy output used something other than null.
+FIELD_REGISTRY = (
+    {"name": "Partner Name", "type": "string", "accepted_values": None,
+     "description": "The name of the partner per the contract, denoted as 'Subscriber'."},
+    {"name": "Effective date", "type": "date", "accepted_values": None,
+     "description": "The effective date of the contract."},
+    {"name": "Term length (days)", "type": "integer", "accepted_values": None,
+     "description": "The length of the contract in days, calculated or extracted."},
+    {"name": "Termination date", "type": "date", "accepted_values": None,
+     "description": "The end date of the contract."},
+    {"name": "Active Lore User Pricing/month", "type": "integer", "accepted_values": None,
+     "description": "The price in dollars Lore is charging per user, per month."},
+    {"name": "Eligible users", "type": "integer", "accepted_values": None,
+     "description": "Number of eligible users. Use 0 if not specified."},
+    {"name": "Lore users", "type": "integer", "accepted_values": None,
+     "description": "Number of Lore users. Use 0 if not specified."},
+    {"name": "Total Monthly Active Users", "type": "integer", "accepted_values": None,
+     "description": "Total monthly active users (MAU). Use 0 if not specified."},
+    {"name": "Community Access", "type": "boolean", "accepted_values": None,
+     "description": "Whether the signing Partner will provide access to the Lore community."},
+    {"name": "Data deletion policy (lorebot)", "type": "boolean", "accepted_values": None,
+     "description": "True only if the contract explicitly requires Lore to routinely delete user personal data "
+                    "upon request or after a certain period; otherwise false."},
+    {"name": "Timeframe (hours)", "type": "integer", "accepted_values": None,
+     "description": "If 'Data deletion policy (lorebot)' is true, the timeframe in hours within which data must be "
+                    "deleted."},
+    {"name": "Dependents allowed", "type": "boolean", "accepted_values": None,
+     "description": "Whether dependents are included in the list of eligible users."},
+    {"name": "Eligibility", "type": "string", "accepted_values": ["all", "only_insured"],
+     "description": "Whether all employees are included or only those on insurance."},
+    {"name": "Reconciliation Start Date", "type": "string", "accepted_values": None,
+     "description": "The estimated start date for financial reconciliation as MM/DD/YYYY, calculated from other "
+                    "contract dates and terms (e.g., 'Effective date' + 'Term length'), or the condition if it is "
+                    "one (e.g., 'After 12 months of Phase 2')."},
+    {"name": "Reconciliation entity and cost", "type": "string", "accepted_values": None,
+     "description": "The entity responsible for reconciliation and any associated costs, if specified "
+                    "(may be TBD)."},
+    {"name": "Population of eligible users", "type": "string",
+     "accepted_values": ["Employees Only", "Employees and Dependents", "Medicare", "Medicare Advantage", "Other"],
+     "description": "The category of the eligible user population described in the contract."},
+    {"name": "Limit on number of users", "type": "integer", "accepted_values": None,
+     "description": "The maximum number of users for the main contract term, ignoring limits specific to a trial "
+                    "period. Use 0 if no limit is stated for the full agreement."},
+    {"name": "Data sharing agreement or business associate agreement", "type": "string",
+     "accepted_values": ["Data sharing agreement", "Business associate agreement"],
+     "description": "Which one of these agreements is mentioned, if either."},
+    {"name": "Performance Reports Frequency", "type": "string", "accepted_values": None,
+     "description": "The frequency of performance reports provided to the partner (e.g., monthly, quarterly)."},
+    {"name": "Users permitted to convert Lore points to money", "type": "boolean", "accepted_values": None,
+     "description": "Whether users can convert points to money (e.g., gift cards)."},
+    {"name": "Trial period", "type": "integer", "accepted_values": None, "null_as": False,
+     "description": "The duration of the trial period in days, if one is offered."},
+)
+# The fields build_llm_prompt() asks for, in prompt order
+CONTRACT_FIELDS = tuple(field["name"] for field in FIELD_REGISTRY)
+# Rough prompt-size estimate used for tokens-per-minute budgeting
+CHARS_PER_TOKEN = 4
+# Contracts longer than this are extracted window-by-window (see get_contract_data_mapreduce)
+MAX_CONTRACT_CHARS = 200000
+WINDOW_OVERLAP_CHARS = 2000
+# When a response has missing or invalid fields, get_contract_data re-asks for
+# just those, sending the top sections per field group they belong to
+REPAIR_TOP_K = 3
+# Bump whenever the rules in FIELD_RULES change what they extract, so cached
+# extractions that used the old rules are not reused
+RULES_VERSION = "2"
+# Bump whenever normalize_contract_text changes the text it produces, for the same reason
+NORMALIZER_VERSION = "2"
+# get_contract_data_packed: contract-text tokens per packed request, and a cap on
+# contracts per pack (each one adds a full set of fields to the response)
+PACK_TOKEN_BUDGET = 30000
+PACK_MAX_CONTRACTS = 16
+# read_pdf(workers=N) only fans out documents with more pages than this per worker
+PDF_PAGES_PER_WORKER = 32
+# Lifetime of provider-side cached instruction prefixes (get_model(context_cache=True)).
+# Pooled models recreate their cache this long before it expires.
+CONTEXT_CACHE_TTL_SECONDS = 3600
+CONTEXT_CACHE_REFRESH_MARGIN_SECONDS = 300
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".contract_cache")
+# Text extracted from PDFs (see PdfTextCache). Bump the suffix of the version
+# whenever read_pdf changes how page texts are joined, so old entries are not reused.
+DEFAULT_TEXT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".pdf_text_cache")
+PDF_EXTRACTOR_VERSION = f"PyPDF2-{PyPDF2.__version__}/1"
 
 # --- Custom Exceptions ---
 class PDFReadError(Exception):
@@ -33,83 +139,264 @@ class LLMGenerationError(Exception):
 
 # --- Helper Functions (Standalone) ---
 
-def read_pdf(file_input):
+class _BufferStream(io.RawIOBase):
+    """
+    Read-only, seekable stream over any buffer-protocol object (bytes,
+    bytearray, memoryview, mmap, ...). Unlike io.BytesIO(data), it never copies
+    the whole buffer; each read copies only the bytes requested.
+    """
+
+    def __init__(self, buffer):
+        self._view = memoryview(buffer).cast('B')
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._pos + offset
+        elif whence == io.SEEK_END:
+            position = len(self._view) + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if position < 0:
+            raise ValueError(f"Negative seek position {position}")
+        self._pos = position
+        return position
+
+    def read(self, size=-1):
+        end = len(self._view) if size is None or size < 0 else min(self._pos + size, len(self._view))
+        data = self._view[self._pos:end].tobytes() if end > self._pos else b""
+        self._pos = max(self._pos, end)
+        return data
+
+    def readall(self):
+        return self.read()
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self._view.release()
+        super().close()
+
+
+def _mmap_file(file_obj):
+    """Maps an open binary file read-only, or returns None if it can't be mapped (e.g., empty file, pipe)."""
+    try:
+        return mmap.mmap(file_obj.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        return None
+
+
+def _open_pdf_stream(file_input):
+    """
+    Turns a read_pdf input into a seekable byte stream without copying the document.
+
+    Paths and real files are memory-mapped, buffers are read in place, and
+    BytesIO objects (including Streamlit uploads) are used directly.
+
+    Returns:
+        A (stream, close) tuple; `close` releases anything opened here and
+        is None when the caller's object was used directly.
+    """
+    if isinstance(file_input, (str, os.PathLike)):
+        if not os.path.exists(file_input):
+            raise FileNotFoundError(f"Error: PDF file not found at '{file_input}'.")
+        file_obj = open(file_input, 'rb')
+        mapped = _mmap_file(file_obj)
+        if mapped is None:
+            return file_obj, file_obj.close
+
+        def close():
+            mapped.close()
+            file_obj.close()
+        return mapped, close
+
+    if isinstance(file_input, (bytes, bytearray, memoryview, mmap.mmap)):
+        stream = _BufferStream(file_input)
+        return stream, stream.close
+
+    if not hasattr(file_input, 'read'):
+        raise TypeError("Invalid input type. Expected file path, bytes-like object or bytes file-like object.")
+
+    # Assume it's a file-like object (e.g., uploaded file bytes)
+    # Ensure it's treated as bytes
+    if isinstance(file_input, io.TextIOBase):
+         # If it's TextIO, try to get the underlying buffer if possible,
+         # otherwise, it might be problematic. Best if BytesIO is passed.
+         logging.warning("Received TextIOBase, attempting to use buffer. Pass BytesIO for reliability.")
+         if hasattr(file_input, 'buffer'):
+             return file_input.buffer, None
+         raise TypeError("Cannot process TextIOBase without a byte buffer.")
+    if isinstance(file_input, io.BytesIO):
+         file_input.seek(0) # Reset position
+         return file_input, None # Use it directly
+
+    # A real file on disk: map it rather than reading it into memory
+    mapped = _mmap_file(file_input)
+    if mapped is not None:
+        return mapped, mapped.close
+
+    # Last resort for other readers (sockets, custom wrappers): read it all once
+    try:
+        file_input.seek(0)
+        content_bytes = file_input.read()
+        if not isinstance(content_bytes, bytes):
+             raise TypeError("File-like object did not read bytes.")
+        return io.BytesIO(content_bytes), None
+    except Exception as e:
+        raise TypeError(f"Unsupported file-like object type: {type(file_input)}. Error: {e}")
+
+
+def _wrap_pdf_error(e):
+    """Logs a PDF failure and returns the exception to raise (known errors pass through)."""
+    if isinstance(e, PyPDF2.errors.PdfReadError):
+        logging.error(f"PyPDF2 error reading PDF: {e}")
+        return PDFReadError(f"Error reading PDF: Invalid PDF file or structure. Original error: {e}")
+    logging.error(f"Unexpected error reading PDF: {e}", exc_info=True)
+    # Re-raise specific known errors or a general one
+    if isinstance(e, (FileNotFoundError, TypeError, PDFReadError)):
+         return e
+    return PDFReadError(f"An unexpected error occurred reading the PDF: {e}")
+
+
+def iter_pdf_pages(file_input, start=0, stop=None):
+    """
+    Lazily yields the extracted text of each PDF page, one page at a time.
+
+    Args:
+        file_input: A file path, bytes-like object or binary file-like object, as for `read_pdf`.
+        start: Index of the first page to extract.
+        stop: Index one past the last page to extract (default: the last page).
+
+    Yields:
+        The text of each page in order ("" for pages without extractable text).
+
+    Raises:
+        FileNotFoundError, TypeError, PDFReadError: As for `read_pdf`.
+    """
+    close = None
+    try:
+        file_stream, close = _open_pdf_stream(file_input)
+        reader = PyPDF2.PdfReader(file_stream)
+        for page in reader.pages[start:stop]:
+            yield page.extract_text() or ""
+    except Exception as e:
+        raise _wrap_pdf_error(e)
+    finally:
+        # Close the stream only if it was opened here (not the caller's object)
+        if close is not None:
+            close()
+
+
+def _extract_pdf_page_range(source, start, stop):
+    """Process-pool worker: returns the page texts for pages [start, stop) of `source` (a path or bytes)."""
+    return list(iter_pdf_pages(source, start, stop))
+
+
+def _join_pdf_pages(page_texts):
+    """Joins page texts in one pass, with a newline after every page that has text."""
+    return "".join(f"{page_text}\n" for page_text in page_texts if page_text)
+
+
+def _pdf_digest(file_input):
+    """Returns the hex SHA-256 of a read_pdf input's bytes, hashing streams in chunks."""
+    close = None
+    try:
+        file_stream, close = _open_pdf_stream(file_input)
+        file_stream.seek(0)
+        digest = hashlib.sha256()
+        for chunk in iter(lambda: file_stream.read(1024 * 1024), b""):
+            digest.update(chunk)
+        file_stream.seek(0)
+        return digest.hexdigest()
+    except Exception as e:
+        raise _wrap_pdf_error(e)
+    finally:
+        if close is not None:
+            close()
+
+
+def read_pdf(file_input, workers=None, pages_per_worker=PDF_PAGES_PER_WORKER, text_cache=None):
     """
     Reads text content from a PDF file.
 
     Args:
-        file_input: Either a string representing the file path or a file-like
-                    object (e.g., io.BytesIO) containing the PDF data.
+        file_input: A file path (str or os.PathLike), a bytes-like object
+                    (bytes, bytearray, memoryview, mmap) or a binary file-like
+                    object (e.g., io.BytesIO) containing the PDF data. Paths
+                    and real files are memory-mapped and buffers are read in
+                    place, so the document is never copied into a second
+                    in-memory buffer.
+        workers: If greater than 1, documents with more than `pages_per_worker`
+                 pages are split into page ranges that are extracted in that
+                 many worker processes. By default pages are read sequentially,
+                 which is faster for short documents because worker processes
+                 are expensive to start.
+        pages_per_worker: Minimum number of pages handed to each worker process.
+        text_cache: Optional `PdfTextCache`. The document's bytes are hashed
+                    and, if the same bytes were read before, the cached text
+                    is returned without parsing the PDF.
 
     Returns:
         A string containing the extracted text from the PDF.
 
     Raises:
         FileNotFoundError: If file_input is a path and the file doesn't exist.
-        TypeError: If file_input is not a string path or a file-like object.
+        TypeError: If file_input is not a path, bytes-like or binary file-like object.
         PDFReadError: If there's an error reading or parsing the PDF content.
     """
-    text = "" # Initialize as empty string
-    file_stream = None
-    is_path = isinstance(file_input, str)
+    if text_cache is not None:
+        key = text_cache.make_key(_pdf_digest(file_input))
+        contract_text = text_cache.get(key)
+        if contract_text is None:
+            contract_text = read_pdf(file_input, workers, pages_per_worker)
+            text_cache.set(key, contract_text)
+        return contract_text
+
+    if not workers or workers <= 1:
+        return _join_pdf_pages(iter_pdf_pages(file_input))
 
+    close = None
     try:
-        if is_path:
-            if not os.path.exists(file_input):
-                raise FileNotFoundError(f"Error: PDF file not found at '{file_input}'.")
-            file_stream = open(file_input, 'rb')
-        elif hasattr(file_input, 'read'):
-            # Assume it's a file-like object (e.g., uploaded file bytes)
-            # Ensure it's treated as bytes
-            if isinstance(file_input, io.TextIOBase):
-                 # If it's TextIO, try to get the underlying buffer if possible,
-                 # otherwise, it might be problematic. Best if BytesIO is passed.
-                 logging.warning("Received TextIOBase, attempting to use buffer. Pass BytesIO for reliability.")
-                 if hasattr(file_input, 'buffer'):
-                     file_stream = file_input.buffer
-                 else:
-                      raise TypeError("Cannot process TextIOBase without a byte buffer.")
-            elif isinstance(file_input, io.BytesIO):
-                 file_input.seek(0) # Reset position
-                 file_stream = file_input # Use it directly
-            else:
-                 # Attempt to read bytes if it has a read method but isn't recognized BytesIO
-                 try:
-                     file_input.seek(0)
-                     content_bytes = file_input.read()
-                     if not isinstance(content_bytes, bytes):
-                          raise TypeError("File-like object did not read bytes.")
-                     file_stream = io.BytesIO(content_bytes)
-                 except Exception as e:
-                     raise TypeError(f"Unsupported file-like object type: {type(file_input)}. Error: {e}")
+        file_stream, close = _open_pdf_stream(file_input)
+        page_count = len(PyPDF2.PdfReader(file_stream).pages)
+        if page_count <= pages_per_worker:
+            file_stream.seek(0)
+            return _join_pdf_pages(iter_pdf_pages(file_stream))
 
+        # Workers re-open (and re-map) the document themselves: hand them the
+        # path, or the raw bytes when there is no path to share
+        if isinstance(file_input, (str, os.PathLike)):
+            source = file_input
         else:
-            raise TypeError("Invalid input type. Expected file path string or bytes file-like object.")
-
-        if file_stream is None:
-             raise ValueError("Could not obtain a valid byte stream from the input.")
+            file_stream.seek(0)
+            source = file_stream.read()
 
-        reader = PyPDF2.PdfReader(file_stream)
-        for page in reader.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n" # Add newline between pages
-
-        return text
-
-    except PyPDF2.errors.PdfReadError as e:
-        logging.error(f"PyPDF2 error reading PDF: {e}")
-        raise PDFReadError(f"Error reading PDF: Invalid PDF file or structure. Original error: {e}")
+        range_size = max(pages_per_worker, -(-page_count // workers))
+        ranges = [(start, min(start + range_size, page_count)) for start in range(0, page_count, range_size)]
+        logging.info(f"Extracting {page_count} PDF pages in {len(ranges)} ranges across up to {workers} processes.")
+        with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as executor:
+            chunks = executor.map(_extract_pdf_page_range, *zip(*[(source, start, stop) for start, stop in ranges]))
+            return _join_pdf_pages(page_text for chunk in chunks for page_text in chunk)
     except Exception as e:
-        logging.error(f"Unexpected error reading PDF: {e}", exc_info=True)
-        # Re-raise specific known errors or a general one
-        if isinstance(e, (FileNotFoundError, TypeError)):
-             raise e
-        raise PDFReadError(f"An unexpected error occurred reading the PDF: {e}")
+        raise _wrap_pdf_error(e)
     finally:
-        # Close the stream only if it was opened from a file path
-        if is_path and file_stream and not file_stream.closed:
-            file_stream.close()
+        if close is not None:
+            close()
 
 
 def read_text_file(filepath):
@@ -137,129 +424,98 @@ def read_text_file(filepath):
         raise
 
 
-def build_llm_prompt(contract_text):
-    """
-    Builds the LLM prompt with contract text and JSON instructions.
-    This prompt is used to extract structured data from a contract.
-    """
-    prompt = f"""
-Parse the following contract text into a JSON object. Adhere strictly to the specified fields, data types, formats, and accepted categorical values. If information for a field is not found, use null where allowed, or follow the specific instructions for that field.
-
-Return ONLY the JSON object, without any introductory text, explanations, or markdown formatting.
-
-JSON Structure and Instructions:
-
-{{
-  "Partner Name": {{
-    "description": "The name of the partner per the contract denoted as 'Subscriber'",
-    "type": "String",
-    "value": "Extract from contract"
-  }},
-  "Effective date": {{
-    "description": "The effective date of the contract",
-    "type": "MM/DD/YYYY",
-    "value": "Find the date in the contract (e.g., 'Month DD, YYYY', 'MM/DD/YYYY', etc.) and convert it to MM/DD/YYYY format. Use null if not found."
-  }},
-  "Term length (days)": {{
-    "description": "The length of the contract in days",
-    "type": "Integer",
-    "value": "Calculate or extract integer, null if not specified"
-  }},
-  "Termination date": {{
-    "description": "The end date of the contract",
-    "type": "MM/DD/YYYY",
-    "value": "Find the date in the contract (e.g., 'Month DD, YYYY', 'MM/DD/YYYY', etc.) and convert it to MM/DD/YYYY format. Use null if not found."
-  }},
-  "Active Lore User Pricing/month": {{
-    "description": "The price Lore is charging per user, per month",
-    "type": "$ Integer",
-    "value": "Extract integer value, null if not specified"
-  }},
-  "Eligible users": {{
-    "description": "Number of eligible users",
-    "type": "Integer",
-    "value": 0
-  }},
-  "Lore users": {{
-    "description": "Number of Lore users",
-    "type": "Integer",
-    "value": 0
-  }},
-  "Total Monthly Active Users": {{
-    "description": "Total MAU",
-    "type": "Integer",
-    "value": 0
-  }},
-  "Community Access": {{
-    "description": "Whether the signing Partner will provide access to the Lore community",
-    "type": "Boolean",
-    "value": "Extract True/False, null if not specified"
-  }},
-  "Data deletion policy (lorebot)": {{
-    "description": "Does the contract explicitly stipulate a requirement for Lore to routinely delete user personal data upon request or after a certain period? This must be a specific term. Set to True only if this specific policy is mentioned, otherwise False.",
-    "type": "Boolean",
-    "value": "Extract True/False"
-  }},
-  "Timeframe (hours)": {{
-    "description": "If 'Data deletion policy (lorebot)' is True, extract the timeframe (in hours) within which data must be deleted. Use null if no timeframe is specified.",
-    "type": "Integer",
-    "value": "Extract integer, null if no policy or not specified"
-  }},
-  "Dependents allowed": {{
-    "description": "Are dependents included in the list of eligible users?",
-    "type": "Boolean",
-    "value": "Extract True/False, null if not specified"
-  }},
-  "Eligibility": {{
-    "description": "Whether all employees are included or only those on insurance ('all' or 'only_insured')",
-    "type": "String",
-    "accepted_values": ["all", "only_insured"],
-    "value": "Extract value or null"
-  }},
-  "Reconciliation Start Date": {{
-    "description": "Calculate and provide the estimated start date for financial reconciliation based on other contract dates and terms (e.g., 'Effective Date' + 'Term Length'). If it's a condition, state the condition (e.g., 'After 12 months of Phase 2'). Use null if not mentioned.",
-    "type": "MM/DD/YYYY or String",
-    "value": "Calculate or extract condition, null if not applicable"
-  }},
-  "Reconciliation entity and cost": {{
-    "description": "The entity responsible for reconciliation and any associated costs, if specified. This may be TBD. Use null if not mentioned or if no reconciliation.",
-    "type": "String",
-    "value": "Extract entity and cost details or TBD, null if not applicable"
-  }},
-  "Population of eligible users": {{
-    "description": "Categorize the eligible user population based on the contract description.",
-    "type": "String",
-    "accepted_values": ["Employees Only", "Employees and Dependents", "Medicare", "Medicare Advantage", "Other"],
-    "value": "Categorize and select one value from accepted_values"
-  }},
-  "Limit on number of users": {{
-    "description": "The maximum number of users for the main contract term (ignore any limits specific only to a trial period). Use 0 if no limit is explicitly stated for the full agreement.",
-    "type": "Integer",
-    "value": "Extract number, or 0 if unlimited/not specified"
-  }},
-  "Data sharing agreement or business associate agreement": {{
-    "description": "Specify if a 'Data sharing agreement' or 'Business associate agreement' (BAA) is mentioned. Should be one or the other if applicable, not both. Use null if neither is mentioned.",
-    "type": "String",
-    "accepted_values": ["Data sharing agreement", "Business associate agreement", null],
-    "value": "Extract agreement type, or null"
-  }},
-  "Performance Reports Frequency": {{
-    "description": "The frequency of performance reports provided to the partner (e.g., monthly, quarterly).",
-    "type": "String",
-    "value": "Extract frequency (e.g., monthly), null if not specified"
-  }},
-  "Users permitted to convert Lore points to money": {{
-    "description": "Can users convert points to money (e.g., gift cards)? Set to True or False.",
-    "type": "Boolean",
-    "value": "Extract True/False, null if not specified"
-  }},
-  "Trial period": {{
-    "description": "If a trial period is offered, extract its duration in days as an integer (e.g., 90). If no trial period is mentioned, use the boolean value false.",
-    "type": "Integer or Boolean",
-    "value": "Extract integer days, or the boolean value false if not specified"
-  }}
-}}
+def read_contract_file(filepath, text_cache=None):
+    """
+    Reads a contract file, choosing the reader based on the file extension.
+
+    PDFs are read with `read_pdf`; everything else (e.g., .md, .txt) is read
+    with `read_text_file`.
+
+    Args:
+        filepath: The path to the contract file.
+        text_cache: Optional `PdfTextCache` for PDFs (see `read_pdf`).
+
+    Returns:
+        A string containing the text of the contract.
+
+    Raises:
+        FileNotFoundError: If the file doesn't exist.
+        PDFReadError: If the file is a PDF that cannot be parsed.
+        IOError: If there's an error reading a text file.
+    """
+    if os.path.splitext(filepath)[1].lower() == '.pdf':
+        return read_pdf(filepath, text_cache=text_cache)
+    return read_text_file(filepath)
+
+
+# Registry type -> Gemini response-schema type, and how each type is described in the prompt
+_SCHEMA_TYPES = {"string": "STRING", "date": "STRING", "integer": "INTEGER", "boolean": "BOOLEAN"}
+_PROMPT_TYPES = {"string": "string", "date": "date, MM/DD/YYYY", "integer": "integer", "boolean": "true/false"}
+
+
+def build_response_schema(fields=FIELD_REGISTRY):
+    """
+    Builds the Gemini response schema for a flat {field: value} object.
+
+    Args:
+        fields: Field registry entries (see FIELD_REGISTRY).
+
+    Returns:
+        A response_schema dict: an OBJECT with one nullable, required property
+        per field, restricted to the field's accepted_values when it has them.
+    """
+    properties = {}
+    for field in fields:
+        prop = {"type": _SCHEMA_TYPES[field["type"]], "nullable": True}
+        if field.get("accepted_values"):
+            prop["enum"] = list(field["accepted_values"])
+        properties[field["name"]] = prop
+    return {"type": "OBJECT", "properties": properties, "required": [field["name"] for field in fields]}
+
+
+# Passed to every pooled model, so Gemini returns bare JSON matching the registry
+GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": build_response_schema(),
+}
+
+
+def _format_field_instructions(fields=FIELD_REGISTRY):
+    """Renders one instruction line per registry field for the prompt."""
+    lines = []
+    for field in fields:
+        kind = _PROMPT_TYPES[field["type"]]
+        if field.get("accepted_values"):
+            kind += ", one of: " + ", ".join(json.dumps(v) for v in field["accepted_values"])
+        lines.append(f'- "{field["name"]}" ({kind}): {field["description"]}')
+    return "\n".join(lines)
+
+
+def build_system_instruction(fields=FIELD_REGISTRY):
+    """
+    Builds the static instruction prefix shared by every extraction.
+
+    It depends only on the field registry, so it is identical across contracts
+    and can be sent as the model's system instruction (or cached
+    provider-side) instead of being repeated in every prompt.
+
+    Args:
+        fields: Field registry entries to ask for. Defaults to all of FIELD_REGISTRY.
+    """
+    return f"""
+Extract the fields below from the contract text you are given and return a single flat JSON object that maps each field name to its value. Adhere strictly to each field's type and accepted values. Convert dates written in any format (e.g., 'Month DD, YYYY') to MM/DD/YYYY. If information for a field is not found, use null unless the field says otherwise.
+
+Fields:
+{_format_field_instructions(fields)}
+"""
+
+
+SYSTEM_INSTRUCTION = build_system_instruction()
+
 
+def build_contract_prompt(contract_text):
+    """Builds the per-contract part of the prompt, sent after SYSTEM_INSTRUCTION."""
+    return f"""
 Contract Text:
 --- START CONTRACT ---
 {contract_text}
@@ -267,133 +523,2852 @@ Contract Text:
 
 JSON Output:
 """
-    return prompt
 
-def parse_llm_response(response_text):
+
+def _requested_fields(fields):
+    """
+    Checks a `fields=` argument and returns its field names in CONTRACT_FIELDS
+    order (None means every field).
+
+    Raises:
+        ValueError: If it is empty or names a field not in FIELD_REGISTRY.
+    """
+    if fields is None:
+        return list(CONTRACT_FIELDS)
+    # A generator would be used up by the first pass below
+    fields = [fields] if isinstance(fields, str) else list(fields)
+    unknown = [field for field in fields if field not in _FIELDS_BY_NAME]
+    if unknown:
+        raise ValueError(f"Unknown field(s) {unknown}; valid names are listed in CONTRACT_FIELDS.")
+    wanted = set(fields)
+    if not wanted:
+        raise ValueError("fields must name at least one field.")
+    return [field for field in CONTRACT_FIELDS if field in wanted]
+
+
+def build_llm_prompt(contract_text, fields=None):
+    """
+    Builds the complete single-string prompt: the static instructions followed
+    by the contract text.
+
+    The extraction functions send the two parts separately (see
+    `get_model`); this is for callers that need the whole prompt as one string.
+
+    Args:
+        contract_text: The string content of the contract.
+        fields: Optional field names to ask for; defaults to every field.
+
+    Raises:
+        ValueError: If `fields` is empty or names an unknown field.
+    """
+    if fields is None:
+        return SYSTEM_INSTRUCTION + build_contract_prompt(contract_text)
+    return build_system_instruction(_select_fields(_requested_fields(fields))) + build_contract_prompt(contract_text)
+
+# Replacement values for fields whose null is reported differently (see FIELD_REGISTRY)
+_NULL_AS = {field["name"]: field["null_as"] for field in FIELD_REGISTRY if "null_as" in field}
+_FIELDS_BY_NAME = {field["name"]: field for field in FIELD_REGISTRY}
+
+# Characters that can change the brace/string state of a JSON scan
+_JSON_STRUCTURE_RE = re.compile(r'[{}"\\]')
+# A JSON object opens with a key or closes immediately; anything else is prose
+_JSON_OBJECT_START_RE = re.compile(r'\{\s*["}]')
+# find_json_object's fallback decodes from at most this many candidate offsets,
+# which bounds its cost on long responses with no valid object
+_RAW_DECODE_MAX_CANDIDATES = 200
+
+
+def _scan_json_objects(text, start=0):
+    """
+    Yields (start, end) spans of balanced top-level {...} blocks in one pass.
+
+    The scan is string-aware (braces inside JSON strings, and escaped quotes,
+    don't count) and jumps between structural characters with a compiled
+    regex, so it is linear in the length of `text`. A block that never closes
+    (e.g., a truncated response) yields nothing.
+    """
+    depth = 0
+    in_string = False
+    escaped_until = -1
+    block_start = None
+    for match in _JSON_STRUCTURE_RE.finditer(text, start):
+        pos = match.start()
+        if pos < escaped_until:
+            continue # Character escaped by the preceding backslash
+        char = text[pos]
+        if in_string:
+            if char == '\\':
+                escaped_until = pos + 2
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            # Quotes only open strings inside an object; in prose they are just text
+            in_string = depth > 0
+        elif char == '{':
+            if depth == 0:
+                block_start = pos
+            depth += 1
+        elif char == '}' and depth > 0:
+            depth -= 1
+            if depth == 0:
+                yield block_start, pos + 1
+
+
+def find_json_object(text):
+    """
+    Finds and decodes the first valid top-level JSON object in `text`.
+
+    A ```json fenced block is preferred when present. Otherwise, and if the
+    fenced block doesn't decode, the first balanced {...} block that decodes
+    wins. Prose containing braces before the JSON, a second object after it,
+    and trailing chatter are all skipped. Runs in linear time, with no regex
+    backtracking.
+
+    If no balanced block decodes (e.g., an unbalanced '{' in prose swallows
+    the real object), `json.JSONDecoder.raw_decode` is tried from each
+    offset that looks like the start of an object, so a bad candidate is
+    skipped instead of ending the search.
+
+    Args:
+        text: The raw text to search (e.g., an LLM response).
+
+    Returns:
+        A (parsed_object, error) tuple: the decoded dict and None on success,
+        or None and the last json.JSONDecodeError (None if no balanced block
+        was found at all).
+    """
+    offsets = [0]
+    fence = text.find("```json")
+    if fence == -1:
+        fence = text.lower().find("```json")
+    if fence > 0:
+        offsets.insert(0, fence)
+
+    last_error = None
+    for i, offset in enumerate(offsets):
+        for start, end in _scan_json_objects(text, offset):
+            if i > 0 and start >= fence:
+                break # Everything from the fence on was already tried
+            if not _JSON_OBJECT_START_RE.match(text, start):
+                continue
+            try:
+                return json.loads(text[start:end]), None
+            except json.JSONDecodeError as e:
+                last_error = e
+
+    decoder = json.JSONDecoder()
+    for attempt, match in enumerate(_JSON_OBJECT_START_RE.finditer(text)):
+        if attempt == _RAW_DECODE_MAX_CANDIDATES:
+            break
+        try:
+            parsed, _ = decoder.raw_decode(text, match.start())
+        except json.JSONDecodeError as e:
+            last_error = e
+            continue
+        return parsed, None
+    return None, last_error
+
+
+_PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_JSON_WORDS = {"true", "false", "null", "NaN", "Infinity"}
+# Any run of word characters starting with a letter or underscore, in any script
+_BARE_WORD_RE = re.compile(r"[^\W\d]\w*")
+
+
+def _strip_trailing_comma(out):
+    """Removes a comma (and the whitespace after it) from the end of the pieces in `out`."""
+    end = len(out)
+    while end and out[end - 1].isspace():
+        end -= 1
+    if end and out[end - 1] == ",":
+        del out[end - 1:]
+
+
+def repair_json_text(text):
+    """
+    Applies cheap local fixes to the first JSON object in a malformed response.
+
+    Fixes single-quoted strings, raw newlines inside strings, trailing
+    commas, Python literals (True/False/None), unquoted words (quoted as
+    strings) and mismatched closing brackets. A truncated object is cut back to its last complete top-level
+    member and closed; the member cut off (possibly partial) is dropped
+    rather than guessed at.
+
+    Args:
+        text: The raw response text.
+
+    Returns:
+        The repaired object text (which may still fail to decode), or None
+        if the text contains no '{'.
+    """
+    start = text.find("{")
+    if start == -1:
+        return None
+    out, closers = [], []
+    quote, escaped = None, False
+    last_member_end = None # len(out) at the last comma between top-level members
+    pos = start
+    while pos < len(text):
+        ch = text[pos]
+        if quote:
+            if escaped:
+                escaped = False
+                if ch == "'":
+                    out[-1] = "'" # \' is not a JSON escape
+                else:
+                    out.append(ch)
+            elif ch == "\\":
+                escaped = True
+                out.append(ch)
+            elif ch == quote:
+                quote = None
+                out.append('"')
+            else:
+                out.append({'"': '\\"', "\n": "\\n", "\r": "\\r", "\t": "\\t"}.get(ch, ch))
+        elif ch in "\"'":
+            quote = ch
+            out.append('"')
+        elif ch in "{[":
+            closers.append("}" if ch == "{" else "]")
+            out.append(ch)
+        elif ch in "}]":
+            if ch in closers: # Otherwise a stray closer, which is dropped
+                while True:
+                    _strip_trailing_comma(out)
+                    out.append(closers.pop())
+                    if out[-1] == ch:
+                        break
+            if not closers:
+                return "".join(out)
+        elif ch == ",":
+            if len(closers) == 1:
+                last_member_end = len(out)
+            out.append(ch)
+        elif ch.isalpha() or ch == "_":
+            word = _BARE_WORD_RE.match(text, pos).group()
+            if out and (out[-1][-1:].isdigit() or out[-1] == "."):
+                out.append(word) # The exponent of a number, e.g. 1e5
+            elif word in _PYTHON_LITERALS or word in _JSON_WORDS:
+                out.append(_PYTHON_LITERALS.get(word, word))
+            else:
+                out.append(json.dumps(word)) # An unquoted string
+            pos += len(word)
+            continue
+        else:
+            out.append(ch)
+        pos += 1
+
+    # Truncated: keep only the members that were followed by a comma
+    if last_member_end is None:
+        return "{}"
+    return "".join(out[:last_member_end]) + "}"
+
+
+def _extract_field_values(parsed_json):
+    """Maps each field of a decoded response object to its plain value."""
+    # Responses are flat {field: value} objects; older prompts (and cached
+    # responses from them) wrapped each value as {"description", "type", "value"}
+    extracted_data = {}
+    for k, v in parsed_json.items():
+        if isinstance(v, dict):
+            v = v.get('value', None) # Use None if 'value' key is missing
+        if v is None and k in _NULL_AS:
+            v = _NULL_AS[k]
+        extracted_data[k] = v
+    return extracted_data
+
+
+def parse_llm_response(response_text, repair=False, fields=None):
     """
     Parses the LLM response string to extract the JSON object.
 
     Args:
         response_text: The raw string response from the LLM.
+        repair: If True, a response with no valid JSON object is patched up
+                with `repair_json_text` before giving up. Fields dropped from
+                a truncated response are then simply absent from the result.
+        fields: Optional field names that were asked for. Anything else in
+                the response is dropped; requested fields the response lacks
+                stay absent rather than being filled with null.
 
     Returns:
-        A dictionary containing the extracted 'value' for each field defined
-        in the expected JSON structure.
+        A dictionary mapping each field in the response to its value.
 
     Raises:
-        JSONParsingError: If valid JSON cannot be found or decoded, or if the
-                          structure doesn't match expectations (e.g., missing 'value').
+        JSONParsingError: If valid JSON cannot be found or decoded.
     """
+    wanted = set(_requested_fields(fields)) if fields is not None else None
     if not response_text or not isinstance(response_text, str):
         raise JSONParsingError("Invalid or empty response text received.")
 
-    json_str = None
-    # Attempt to extract JSON, handling markdown fences or raw JSON
-    match = re.search(r"```json\s*({.*?})\s*```", response_text, re.DOTALL | re.IGNORECASE)
-    if match:
-        json_str = match.group(1).strip()
-    else:
-        # If no markdown fences, find the outermost curly braces
-        start = response_text.find('{')
-        end = response_text.rfind('}')
-        if start != -1 and end != -1 and end > start:
-            json_str = response_text[start:end+1].strip()
+    # Attempt to extract JSON, handling markdown fences, raw JSON and surrounding prose
+    parsed_json, decode_error = find_json_object(response_text)
 
-    if not json_str:
+    if parsed_json is None and repair:
+        repaired = repair_json_text(response_text)
+        try:
+            parsed_json = json.loads(repaired) if repaired is not None else None
+        except json.JSONDecodeError:
+            parsed_json = None
+        if isinstance(parsed_json, dict):
+            logging.warning(f"Repaired malformed JSON locally ({len(parsed_json)} fields recovered).")
+        else:
+            parsed_json = None
+
+    if parsed_json is None:
+        if decode_error is not None:
+            logging.error(f"JSONDecodeError: {decode_error}. Raw response: {response_text[:500]}...")
+            raise JSONParsingError(f"Error decoding JSON from LLM response: {decode_error}. Check response format.")
         logging.error(f"Could not find JSON block in response. Raw response: {response_text[:500]}...")
         raise JSONParsingError("Could not find valid JSON structure in the LLM response.")
 
     try:
-        # Load the JSON string into a Python dictionary
-        parsed_json = json.loads(json_str)
-
-        # Basic validation: Check if it's a dictionary
-        if not isinstance(parsed_json, dict):
-             raise JSONParsingError(f"Parsed JSON is not a dictionary. Found type: {type(parsed_json)}")
-
-        # Extract the 'value' from each field, be robust to missing 'value' key
-        extracted_data = {}
-        for k, v in parsed_json.items():
-             if isinstance(v, dict):
-                 extracted_data[k] = v.get('value', None) # Use None if 'value' key is missing
-             else:
-                  # Handle cases where the value might not be a dict as expected by the prompt
-                  logging.warning(f"Unexpected structure for key '{k}' in parsed JSON. Expected dict, got {type(v)}. Using raw value: {v}")
-                  extracted_data[k] = v # Assign the value directly, might need downstream handling
-
+        extracted_data = _extract_field_values(parsed_json)
+        if wanted is not None:
+            extracted_data = {field: value for field, value in extracted_data.items() if field in wanted}
         return extracted_data
 
-    except json.JSONDecodeError as e:
-        logging.error(f"JSONDecodeError: {e}. Raw string: {json_str[:500]}...")
-        raise JSONParsingError(f"Error decoding JSON from LLM response: {e}. Check response format.")
     except Exception as e:
         logging.error(f"Unexpected error during JSON parsing: {e}", exc_info=True)
         raise JSONParsingError(f"An unexpected error occurred during JSON parsing: {e}")
 
 
-def get_contract_data(contract_text, api_key):
+def validate_field_value(field, value):
     """
-    Sends the contract text to the Gemini LLM and parses the structured data response.
+    Checks one extracted value against its registry entry.
+
+    Args:
+        field: A FIELD_REGISTRY entry.
+        value: The parsed value (null is always allowed, as is the field's null_as).
+
+    Returns:
+        None if the value is valid, otherwise a short reason.
+    """
+    if value is None or ("null_as" in field and value is field["null_as"]):
+        return None
+    field_type = field["type"]
+    if field_type == "boolean":
+        return None if isinstance(value, bool) else f"expected true/false, got {value!r}"
+    if field_type == "integer":
+        if isinstance(value, bool) or not isinstance(value, int):
+            return f"expected an integer, got {value!r}"
+        return None if value >= 0 else f"expected a non-negative integer, got {value}"
+    if not isinstance(value, str):
+        return f"expected a string, got {value!r}"
+    if field_type == "date":
+        try:
+            datetime.strptime(value.strip(), "%m/%d/%Y")
+        except ValueError:
+            return f"expected a MM/DD/YYYY date, got {value!r}"
+    if field["accepted_values"] is not None and value not in field["accepted_values"]:
+        return f"{value!r} is not one of {field['accepted_values']}"
+    return None
+
+
+def validate_contract_data(extracted_data, field_names=None):
+    """
+    Checks an extraction against FIELD_REGISTRY.
+
+    Args:
+        extracted_data: Parsed field values, as returned by `parse_llm_response`.
+        field_names: The fields that were asked for; None means every field.
+
+    Returns:
+        {field: reason} for each requested field that is missing from
+        `extracted_data` or whose value fails `validate_field_value`. Empty
+        when the extraction is valid.
+    """
+    problems = {}
+    for field in _select_fields(field_names):
+        name = field["name"]
+        if name not in extracted_data:
+            problems[name] = "missing from the response"
+            continue
+        reason = validate_field_value(field, extracted_data[name])
+        if reason is not None:
+            problems[name] = reason
+    return problems
+
+
+# --- Section Chunking and Retrieval ---
+
+# Markdown headings, e.g. "### 1. Licensor's Services", "#### 1.5 Order Form", "## ORDER Form No. 1"
+_MARKDOWN_HEADING_RE = re.compile(r"^#{1,6}\s+\S.*$", re.MULTILINE)
+# PDF clause starts, e.g. "1.1  Services.", "10. Ownership; ...", and short ALL-CAPS title lines
+_PDF_HEADING_RE = re.compile(
+    r"^[ \t]*(?:\d{1,2}(?:\.\d{1,2}){0,3}\.?[ \t]+[A-Z][^\n]*"
+    r"|[A-Z][A-Z0-9 ,.&'\-]{4,80})[ \t]*$",
+    re.MULTILINE,
+)
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Which sections each group of fields is likely to live in. Queries are plain
+# keyword lists scored with BM25 against every section of the contract.
+FIELD_GROUPS = {
+    "parties_and_term": {
+        "fields": ["Partner Name", "Effective date", "Term length (days)", "Termination date"],
+        "query": "subscriber agreement entered effective date term initial renewal years months expire termination terminate",
+    },
+    "pricing_and_users": {
+        "fields": ["Active Lore User Pricing/month", "Eligible users", "Lore users", "Total Monthly Active Users",
+                   "Limit on number of users"],
+        "query": "fee fees price pricing per user per month monthly active users eligible users lore users limit maximum number invoice",
+    },
+    "eligibility": {
+        "fields": ["Eligibility", "Population of eligible users", "Dependents allowed", "Community Access"],
+        "query": "eligible eligibility employees dependents spouses insured health plan medicare population community access enrollment roster",
+    },
+    "data_handling": {
+        "fields": ["Data deletion policy (lorebot)", "Timeframe (hours)",
+                   "Data sharing agreement or business associate agreement"],
+        "query": "data deletion delete personal data hours lorebot business associate agreement data sharing agreement protected health information hipaa",
+    },
+    "reconciliation_and_incentives": {
+        "fields": ["Reconciliation Start Date", "Reconciliation entity and cost",
+                   "Users permitted to convert Lore points to money"],
+        "query": "reconciliation financial annual cost entity third party incentives points gift cards rewards convert money",
+    },
+    "reporting_and_trial": {
+        "fields": ["Performance Reports Frequency", "Trial period"],
+        "query": "report reports reporting performance monthly quarterly trial period phase days free",
+    },
+}
+
+
+def split_contract_sections(contract_text):
+    """
+    Splits a contract into sections on its numbered headings.
+
+    Markdown contracts are split on heading lines ("### 1.", "#### 1.5", ...).
+    Text extracted from PDFs has no markup, so numbered clause starts
+    ("1.1  Services.") and short ALL-CAPS title lines are used instead. Any
+    text before the first heading (parties, effective date) becomes the first
+    section.
 
     Args:
         contract_text: The string content of the contract.
-        api_key: The Gemini API key.
 
     Returns:
-        A dictionary containing the parsed contract data.
+        A list of section dicts in document order, each with 'index',
+        'heading' (the first line), 'text' and 'start' (character offset).
+        Concatenating the 'text' values reproduces the input exactly.
+    """
+    heading_re = _MARKDOWN_HEADING_RE if _MARKDOWN_HEADING_RE.search(contract_text) else _PDF_HEADING_RE
+    starts = [match.start() for match in heading_re.finditer(contract_text)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    starts.append(len(contract_text))
 
-    Raises:
-        ValueError: If contract_text or api_key is empty.
-        LLMConfigurationError: If the API key is invalid or the model cannot be initialized.
-        LLMGenerationError: If the API call fails or returns an error (e.g., blocked prompt).
-        JSONParsingError: If the LLM response cannot be parsed into the expected JSON structure.
+    sections = []
+    for start, end in zip(starts, starts[1:]):
+        if end <= start:
+            continue
+        text = contract_text[start:end]
+        sections.append({
+            "index": len(sections),
+            "heading": text.strip().split("\n", 1)[0][:120],
+            "text": text,
+            "start": start,
+        })
+    return sections
+
+
+def _tokenize(text):
+    return _TOKEN_RE.findall(text.lower())
+
+
+class SectionIndex:
     """
-    if not contract_text:
-        raise ValueError("Contract text cannot be empty.")
-    if not api_key:
-        raise ValueError("API key must be provided.")
+    Lightweight BM25 index over contract sections (pure Python).
 
-    try:
-        # Configure the API key (important to do before initializing model)
-        genai.configure(api_key=api_key)
-        # Initialize the model
-        model = genai.GenerativeModel(MODEL_NAME)
-    except Exception as e:
-        logging.error(f"Error initializing Gemini model ({MODEL_NAME}): {e}", exc_info=True)
-        raise LLMConfigurationError(f"Error initializing Gemini model ({MODEL_NAME}): {e}. Check API key and model name.")
+    Args:
+        sections: Section dicts as returned by `split_contract_sections`.
+        k1, b: Standard BM25 term-frequency saturation and length normalization.
+    """
 
-    prompt = build_llm_prompt(contract_text)
+    def __init__(self, sections, k1=1.5, b=0.75):
+        self.sections = sections
+        self.k1 = k1
+        self.b = b
+        self._term_counts = []
+        self._lengths = []
+        document_frequency = {}
+        for section in sections:
+            counts = {}
+            tokens = _tokenize(section["text"])
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token in counts:
+                document_frequency[token] = document_frequency.get(token, 0) + 1
+            self._term_counts.append(counts)
+            self._lengths.append(len(tokens))
+        self._average_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+        count = len(sections)
+        self._idf = {
+            token: math.log(1 + (count - freq + 0.5) / (freq + 0.5))
+            for token, freq in document_frequency.items()
+        }
 
-    try:
-        response = model.generate_content(prompt)
-        response_text = None
-
-        # Safely access response text, handling different potential structures/errors
-        if hasattr(response, 'text'):
-            response_text = response.text
-        elif hasattr(response, 'prompt_feedback') and response.prompt_feedback.block_reason:
-            block_reason = response.prompt_feedback.block_reason
-            safety_ratings = response.prompt_feedback.safety_ratings
-            logging.error(f"LLM content generation blocked. Reason: {block_reason}. Ratings: {safety_ratings}")
-            raise LLMGenerationError(f"Content generation blocked due to safety settings. Reason: {block_reason}")
-        elif isinstance(response, str): # Some APIs might return string directly
-             response_text = response
+    def scores(self, query):
+        """Returns the BM25 score of every section for `query`, in section order."""
+        query_tokens = set(_tokenize(query))
+        results = []
+        for counts, length in zip(self._term_counts, self._lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / self._average_length) if self._average_length else self.k1
+            score = 0.0
+            for token in query_tokens:
+                tf = counts.get(token)
+                if tf:
+                    score += self._idf[token] * tf * (self.k1 + 1) / (tf + norm)
+            results.append(score)
+        return results
+
+    def top(self, query, k):
+        """Returns the indexes of the `k` best-scoring sections for `query` (zero scores excluded)."""
+        ranked = sorted(enumerate(self.scores(query)), key=lambda item: (-item[1], item[0]))
+        return [index for index, score in ranked[:k] if score > 0]
+
+
+def select_relevant_sections(contract_text, top_k=3, field_groups=None):
+    """
+    Shrinks a contract to the sections most relevant to the extracted fields.
+
+    Each field group's query picks its `top_k` sections by BM25; the union of
+    those, plus the opening section (parties and effective date), is returned
+    in original document order.
+
+    Args:
+        contract_text: The string content of the contract.
+        top_k: Sections kept per field group.
+        field_groups: Mapping of group name to {'fields', 'query'}; defaults to FIELD_GROUPS.
+
+    Returns:
+        The reduced contract text. The full text is returned unchanged when
+        the contract has too few sections for retrieval to help.
+    """
+    sections = split_contract_sections(contract_text)
+    field_groups = FIELD_GROUPS if field_groups is None else field_groups
+    if len(sections) <= top_k * len(field_groups):
+        return contract_text
+
+    index = SectionIndex(sections)
+    keep = {0}
+    for group in field_groups.values():
+        keep.update(index.top(group["query"], top_k))
+
+    reduced = "".join(sections[i]["text"] for i in sorted(keep))
+    logging.info(f"Section retrieval kept {len(keep)}/{len(sections)} sections "
+                 f"({len(reduced)}/{len(contract_text)} characters).")
+    return reduced
+
+
+# --- Contract Text Normalization ---
+
+# Lines repeated at least this often (ignoring digits) are page headers/footers,
+# unless they are short enough to be legitimate repeated labels or placeholders
+_REPEATED_LINE_MIN_COUNT = 3
+_REPEATED_LINE_MIN_CHARS = 20
+_PAGE_NUMBER_RE = re.compile(r"^(?:page\s*)?-?\s*(\d{1,4})\s*-?(?:\s*(?:of|/)\s*\d{1,4})?$", re.IGNORECASE)
+# A page-number-like line is only removed as part of a run n, n+1, n+2, ... of at
+# least _REPEATED_LINE_MIN_COUNT such lines, each at least this many lines after
+# the previous one (a page's worth), so table values and numbered rows survive
+_PAGE_NUMBER_MIN_GAP_LINES = 10
+# Sections no field depends on, matched against the start of a section heading
+_BOILERPLATE_HEADING_RE = re.compile(
+    r"^[#*\s]*(?:\d{1,2}(?:\.\d{1,2}){0,3}\.?\s*)?(?:"
+    r"governing law|severability|counterparts|entire agreement|waiver|notices|assignment|force majeure"
+    r"|headings|relationship of the parties|independent contractors?|(?:no )?third[- ]party beneficiaries"
+    r"|limitation of liability|indemnification|disclaimer|warrant(?:y|ies)|publicity|dispute resolution"
+    r"|arbitration|intellectual property|restrictions|feedback|export|survival|interpretation)\b",
+    re.IGNORECASE,
+)
+# A boilerplate-titled section is kept anyway if it mentions a date or a duration
+_FIELD_VALUE_HINT_RE = re.compile(
+    r"\b(?:january|february|march|april|may|june|july|august|september|october|november|december)\s+\d{1,2}\b"
+    r"|\b\d{1,2}/\d{1,2}/\d{4}\b|\b\d+\s*(?:\(\d+\)\s*)?(?:hours?|days?|weeks?|months?|years?)\b", re.IGNORECASE)
+# A wrapped sentence continues on a line starting with a lowercase word (table
+# rows, clauses, list items and "Label:" lines start otherwise), though not a
+# list item such as "(a) " or "iv. "
+_CONTINUATION_RE = re.compile(r"^[(\"'“‘]?[a-z]")
+_LIST_ITEM_RE = re.compile(r"^(?:\(?[a-z0-9]{1,3}\)|[ivx]{1,5}\.|[a-z]\.)\s")
+
+
+def _drop_boilerplate_sections(contract_text):
+    """Returns (text, dropped headings) with boilerplate sections removed; the opening section is always kept."""
+    kept, dropped = [], []
+    for section in split_contract_sections(contract_text):
+        if (section["index"] > 0 and _BOILERPLATE_HEADING_RE.match(section["heading"])
+                and not _FIELD_VALUE_HINT_RE.search(section["text"])):
+            dropped.append(section["heading"])
         else:
-            # Log unexpected structure and raise error
-            response_type = type(response)
-            logging.error(f"Unexpected response structure from LLM: {response_type}. Response: {response}")
-            raise LLMGenerationError(f"Could not extract text from LLM response. Unexpected type: {response_type}")
+            kept.append(section["text"])
+    return "".join(kept), dropped
 
-        if response_text is None:
-             raise LLMGenerationError("Extracted response text is None after generation.")
 
-        return parse_llm_response(response_text)
+def _page_number_lines(lines):
+    """
+    Returns the indexes of the lines that are page numbers.
 
-    except Exception as e:
-        # Catch-all for other potential API errors during generate_content
-        logging.error(f"Error calling Gemini API or parsing response: {e}", exc_info=True)
-        # Re-raise specific errors if they are already the correct type
-        if isinstance(e, (LLMGenerationError, JSONParsingError)):
-            raise e
-        # Wrap other exceptions
-        raise LLMGenerationError(f"An unexpected error occurred during LLM interaction: {e}") 
\ No newline at end of file
+    Page boundaries aren't marked in extracted text, so a page number is
+    recognized the way repeated headers and footers are: across pages. A
+    candidate line counts only when it continues a sequence (n, n+1, ...)
+    of candidates spaced at least _PAGE_NUMBER_MIN_GAP_LINES apart, and the
+    sequence reaches _REPEATED_LINE_MIN_COUNT pages.
+    """
+    runs = [] # [last line index, last number, [line indexes]]
+    for i, line in enumerate(lines):
+        match = _PAGE_NUMBER_RE.match(line)
+        if not match:
+            continue
+        number = int(match.group(1))
+        for run in runs:
+            if run[1] + 1 == number and i - run[0] >= _PAGE_NUMBER_MIN_GAP_LINES:
+                run[0], run[1] = i, number
+                run[2].append(i)
+                break
+        else:
+            runs.append([i, number, [i]])
+    return {i for run in runs if len(run[2]) >= _REPEATED_LINE_MIN_COUNT for i in run[2]}
+
+
+def _clean_line(line):
+    """Collapses whitespace and markup noise within one line."""
+    line = " ".join(line.split()) # Also collapses non-breaking spaces and tabs
+    line = re.sub(r"_{4,}", "___", line)
+    line = re.sub(r"\*\*|(?<!_)__(?!_)", "", line)
+    line = re.sub(r"\.{4,}", "...", line)
+    line = re.sub(r"-{4,}", "---", line)
+    line = re.sub(r" (?=[,.;:)\]])", "", line) # "April 22 , 2024" -> "April 22, 2024"
+    return re.sub(r"(?<=[(\[]) ", "", line)
+
+
+def _should_join(line, next_line, markdown):
+    """True if `next_line` continues a sentence that was wrapped at the end of `line`."""
+    if not line or not next_line or line[-1] in ".!?:;|" or line.startswith("|"):
+        return False
+    if markdown and line.startswith("#"):
+        return False
+    return bool(_CONTINUATION_RE.match(next_line)) and not _LIST_ITEM_RE.match(next_line)
+
+
+def normalize_contract_text(contract_text, drop_boilerplate=True, stats=None):
+    """
+    Strips layout noise from contract text so prompts spend fewer tokens on it.
+
+    In order: boilerplate sections no field depends on (governing law,
+    notices, counterparts, ...) are dropped unless they mention a date or a
+    duration; page numbers (numbered in sequence across three or more pages,
+    see `_page_number_lines`) and long lines repeated on three or more pages
+    (headers, footers, envelope IDs) are removed; whitespace runs, `**`/`__`
+    emphasis, form blanks and stray spaces before punctuation are collapsed;
+    lines wrapped mid-sentence are re-joined (removing hyphenation breaks);
+    markdown heading markers are removed; and blank-line runs are collapsed.
+
+    Args:
+        contract_text: The string content of the contract.
+        drop_boilerplate: If False, every section is kept.
+        stats: Optional dict, filled in place with 'characters_before',
+               'characters_after', 'tokens_before', 'tokens_after',
+               'lines_removed', 'lines_joined' and 'sections_dropped' (the
+               dropped section headings).
+
+    Returns:
+        The normalized text.
+    """
+    text, dropped = _drop_boilerplate_sections(contract_text) if drop_boilerplate else (contract_text, [])
+    # Decided on the raw text, like split_contract_sections: PDF lines such as " # of Participants" are not headings
+    markdown = bool(_MARKDOWN_HEADING_RE.search(contract_text))
+
+    lines = [_clean_line(line) for line in text.split("\n")]
+    counts = {}
+    for line in lines:
+        if len(line) >= _REPEATED_LINE_MIN_CHARS and not line.startswith("|"):
+            masked = re.sub(r"\d+", "#", line)
+            counts[masked] = counts.get(masked, 0) + 1
+    repeated = {masked for masked, count in counts.items()
+                if count >= _REPEATED_LINE_MIN_COUNT and re.search(r"[A-Za-z]{3}", masked)}
+
+    page_numbers = _page_number_lines(lines)
+    kept = []
+    lines_removed = 0
+    for i, line in enumerate(lines):
+        if i in page_numbers or (repeated and re.sub(r"\d+", "#", line) in repeated):
+            lines_removed += 1
+        else:
+            kept.append(line)
+
+    joined = []
+    lines_joined = 0
+    for line in kept:
+        previous = joined[-1] if joined else ""
+        if _should_join(previous, line, markdown):
+            if previous.endswith("-"):
+                # "agree-" + "ment"; PDF spacing artifacts like "solution -" + "focused" keep the hyphen
+                joined[-1] = (previous[:-1] if previous[-2:-1].isalpha() else previous) + line
+            else:
+                joined[-1] = f"{previous} {line}"
+            lines_joined += 1
+        else:
+            joined.append(line)
+
+    normalized = "\n".join(re.sub(r"^#{1,6} ", "", line) for line in joined) if markdown else "\n".join(joined)
+    normalized = re.sub(r"\n{3,}", "\n\n", normalized).strip() + "\n"
+
+    if stats is not None:
+        stats.update({
+            "characters_before": len(contract_text),
+            "characters_after": len(normalized),
+            "tokens_before": estimate_tokens(contract_text),
+            "tokens_after": estimate_tokens(normalized),
+            "lines_removed": lines_removed,
+            "lines_joined": lines_joined,
+            "sections_dropped": dropped,
+        })
+    logging.info(f"Normalization reduced the contract from {len(contract_text)} to {len(normalized)} characters "
+                 f"({lines_removed} lines removed, {lines_joined} joined, {len(dropped)} sections dropped).")
+    return normalized
+
+
+# --- Extraction Cache ---
+
+def _normalize_text_for_key(text):
+    """Collapses whitespace so re-exports of the same contract map to the same cache key."""
+    return " ".join(text.split())
+
+
+class _DiskCache:
+    """
+    Base for the disk-backed, content-addressed caches below.
+
+    Each entry is one small file under `cache_dir`, written atomically, so a
+    cache survives restarts and can be shared by main.py, the Streamlit app
+    and the notebook. Entries older than `max_age_seconds` are treated as
+    misses, and the oldest entries are evicted once the cache holds more than
+    `max_entries` files or `max_bytes` bytes. Safe to use from multiple threads
+    and processes. Subclasses set SUFFIX and implement `_load` and `_dump`.
+    """
+
+    EVICT_EVERY_N_WRITES = 100
+    SUFFIX = None
+    # When True, hits refresh an entry's mtime so eviction is least-recently-used
+    TOUCH_ON_HIT = False
+
+    def __init__(self, cache_dir, max_entries, max_bytes, max_age_seconds):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def __getstate__(self):
+        # Picklable for process pools; each process counts its own hits and misses
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _load(self, f):
+        """Returns the entry stored in the binary file `f`."""
+        raise NotImplementedError
+
+    def _dump(self, data, f):
+        """Writes `data` to the binary file `f`."""
+        raise NotImplementedError
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}{self.SUFFIX}")
+
+    def _count(self, counter):
+        with self._lock:
+            value = getattr(self, counter) + 1
+            setattr(self, counter, value)
+            return value
+
+    def get(self, key):
+        """Returns the cached data for `key`, or None on a miss or expired entry."""
+        path = self._path(key)
+        try:
+            if self.max_age_seconds is not None and time.time() - os.path.getmtime(path) > self.max_age_seconds:
+                self._remove(path)
+                self._count('misses')
+                return None
+            with open(path, 'rb') as f:
+                data = self._load(f)
+            if self.TOUCH_ON_HIT:
+                os.utime(path)
+        except (OSError, EOFError, ValueError):
+            # Missing, unreadable or half-written entries are all just misses
+            self._count('misses')
+            return None
+        self._count('hits')
+        return data
+
+    def set(self, key, data):
+        """Stores `data` under `key`."""
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temp file and rename so readers never see a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                self._dump(data, f)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError) as e:
+            logging.warning(f"Could not write {type(self).__name__} entry {key}: {e}")
+            return
+        # Scanning the directory is O(entries), so only enforce limits periodically
+        if (self._count('writes') - 1) % self.EVICT_EVERY_N_WRITES == 0:
+            self.evict()
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            return
+        self._count('evictions')
+
+    def _entries(self):
+        """Returns (mtime, size, path) for every entry, oldest first."""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(self.SUFFIX):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        return entries
+
+    def evict(self):
+        """Removes expired entries, then the oldest ones until the size limits are met."""
+        entries = self._entries()
+        now = time.time()
+        total_bytes = sum(size for _, size, _ in entries)
+        count = len(entries)
+        for mtime, size, path in entries:
+            expired = self.max_age_seconds is not None and now - mtime > self.max_age_seconds
+            too_many = self.max_entries is not None and count > self.max_entries
+            too_big = self.max_bytes is not None and total_bytes > self.max_bytes
+            if not (expired or too_many or too_big):
+                break
+            self._remove(path)
+            count -= 1
+            total_bytes -= size
+
+    def clear(self):
+        """Removes every entry from the cache."""
+        for _, _, path in self._entries():
+            self._remove(path)
+
+    def stats(self):
+        """Returns the hit/miss/write/eviction counters for this cache instance."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class ExtractionCache(_DiskCache):
+    """
+    Disk-backed, content-addressed cache of extraction results.
+
+    Entries are keyed on a hash of the normalized contract text, the prompt
+    version and the model name, and stored as one small JSON file each (see
+    `_DiskCache` for expiry, eviction and sharing).
+    """
+
+    SUFFIX = '.json'
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_entries=50000, max_bytes=512 * 1024 * 1024,
+                 max_age_seconds=30 * 24 * 3600):
+        super().__init__(cache_dir, max_entries, max_bytes, max_age_seconds)
+
+    @staticmethod
+    def make_key(contract_text, model_name=MODEL_NAME, prompt_version=PROMPT_VERSION):
+        """Returns the cache key for a contract extracted with the given model and prompt version."""
+        digest = hashlib.sha256()
+        for part in (prompt_version, model_name, _normalize_text_for_key(contract_text)):
+            digest.update(part.encode('utf-8'))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _load(self, f):
+        return json.loads(f.read())
+
+    def _dump(self, data, f):
+        f.write(json.dumps(data).encode('utf-8'))
+
+
+class PdfTextCache(_DiskCache):
+    """
+    Disk-backed cache of text extracted from PDFs, so each document is parsed at most once.
+
+    Entries are keyed on the SHA-256 of the raw PDF bytes and the extractor
+    version, and stored gzip-compressed. Extracted text never goes stale for
+    the same bytes and extractor, so entries do not expire; hits refresh an
+    entry, and the least recently used are evicted past the size limits.
+    """
+
+    SUFFIX = '.txt.gz'
+    TOUCH_ON_HIT = True
+
+    def __init__(self, cache_dir=DEFAULT_TEXT_CACHE_DIR, max_entries=20000, max_bytes=256 * 1024 * 1024):
+        super().__init__(cache_dir, max_entries, max_bytes, max_age_seconds=None)
+
+    @staticmethod
+    def make_key(pdf_digest, extractor_version=PDF_EXTRACTOR_VERSION):
+        """Returns the cache key for a PDF (given as the hex SHA-256 of its bytes) read with `extractor_version`."""
+        return hashlib.sha256(f"{extractor_version}\0{pdf_digest}".encode('utf-8')).hexdigest()
+
+    def _load(self, f):
+        return gzip.decompress(f.read()).decode('utf-8')
+
+    def _dump(self, data, f):
+        f.write(gzip.compress(data.encode('utf-8'), compresslevel=6))
+
+
+# --- Rate-Limited Request Scheduling ---
+
+# Provider errors worth retrying: quota/rate limits and transient server trouble
+_TRANSIENT_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+)
+
+
+def estimate_tokens(text):
+    """Cheap token estimate for budgeting (about CHARS_PER_TOKEN characters per token)."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _request_tokens(prompt, field_names=None, packed=False):
+    """
+    Token estimate for one extraction request, including the system
+    instruction the model for `field_names` (and `packed`) actually sends.
+    """
+    if packed:
+        system_instruction = (PACKED_SYSTEM_INSTRUCTION if field_names is None
+                              else build_packed_system_instruction(_select_fields(field_names)))
+    else:
+        system_instruction = (SYSTEM_INSTRUCTION if field_names is None
+                              else build_system_instruction(_select_fields(field_names)))
+    return estimate_tokens(system_instruction) + estimate_tokens(prompt)
+
+
+class RequestScheduler:
+    """
+    Paces Gemini calls to stay under requests-per-minute and tokens-per-minute
+    quotas, and retries transient failures.
+
+    Both budgets are token buckets that refill continuously and start full,
+    so short bursts go through immediately and sustained load settles at the
+    configured rates. Callers that would exceed a budget wait their turn.
+    Rate-limit (429) and transient server errors are retried with jittered
+    exponential backoff instead of failing the contract. One scheduler should
+    be shared by every thread (and event loop) calling the same quota.
+
+    Args:
+        requests_per_minute: Request budget; None disables the limit.
+        tokens_per_minute: Input-token budget, charged with `estimate_tokens`
+                           of each prompt; None disables the limit.
+        max_retries: Retries per call after the first attempt.
+        base_delay: Backoff before the first retry, in seconds; doubles per retry.
+        max_delay: Upper bound on a single backoff, in seconds.
+        clock: Monotonic clock in seconds; defaults to time.monotonic.
+        sleep: Blocking sleep used by `call`; defaults to time.sleep.
+               (`acall` always awaits asyncio.sleep.)
+        rng: random.Random for the backoff jitter; defaults to the `random` module.
+    """
+
+    def __init__(self, requests_per_minute=60, tokens_per_minute=1000000, max_retries=5,
+                 base_delay=1.0, max_delay=60.0, clock=time.monotonic, sleep=time.sleep, rng=None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._clock = clock
+        self._sleep = sleep
+        self._rng = random if rng is None else rng
+        self._lock = threading.Lock()
+        self._request_allowance = float(requests_per_minute or 0)
+        self._token_allowance = float(tokens_per_minute or 0)
+        self._last_refill = clock()
+        self.queue_depth = 0
+        self.requests = 0
+        self.retries = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _refill(self, now):
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        if self.requests_per_minute:
+            self._request_allowance = min(float(self.requests_per_minute),
+                                          self._request_allowance + elapsed * self.requests_per_minute / 60.0)
+        if self.tokens_per_minute:
+            self._token_allowance = min(float(self.tokens_per_minute),
+                                        self._token_allowance + elapsed * self.tokens_per_minute / 60.0)
+
+    def _try_reserve(self, tokens):
+        """Takes budget for one request if available; otherwise returns the seconds to wait first."""
+        with self._lock:
+            self._refill(self._clock())
+            waits = [0.0]
+            if self.requests_per_minute and self._request_allowance < 1:
+                waits.append((1 - self._request_allowance) * 60.0 / self.requests_per_minute)
+            if self.tokens_per_minute:
+                # A prompt bigger than the whole budget only has to wait for a full bucket
+                needed = min(tokens, self.tokens_per_minute)
+                if self._token_allowance < needed:
+                    waits.append((needed - self._token_allowance) * 60.0 / self.tokens_per_minute)
+            wait = max(waits)
+            if wait > 0:
+                return wait
+            if self.requests_per_minute:
+                self._request_allowance -= 1
+            if self.tokens_per_minute:
+                self._token_allowance -= min(tokens, self.tokens_per_minute)
+            self.requests += 1
+            return 0.0
+
+    def _record_wait(self, waited):
+        with self._lock:
+            self.total_wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+    def _adjust_queue(self, delta):
+        with self._lock:
+            self.queue_depth += delta
+
+    def _backoff(self, attempt):
+        # "Full jitter": spreads retries from many workers instead of synchronizing them
+        return self._rng.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _should_retry(self, e, attempt):
+        if attempt >= self.max_retries or not isinstance(e, _TRANSIENT_ERRORS):
+            return False
+        with self._lock:
+            self.retries += 1
+        return True
+
+    def call(self, fn, tokens=0):
+        """
+        Runs `fn()` once budget allows, retrying transient provider errors.
+
+        Args:
+            fn: Zero-argument callable making one API request.
+            tokens: Estimated input tokens of the request.
+
+        Returns:
+            Whatever `fn` returns.
+
+        Raises:
+            The last exception from `fn` once retries are exhausted, or any
+            non-transient exception immediately.
+        """
+        attempt = 0
+        while True:
+            self._adjust_queue(1)
+            started = self._clock()
+            try:
+                wait = self._try_reserve(tokens)
+                while wait > 0:
+                    self._sleep(wait)
+                    wait = self._try_reserve(tokens)
+            finally:
+                self._adjust_queue(-1)
+            self._record_wait(self._clock() - started)
+            try:
+                return fn()
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                delay = self._backoff(attempt)
+                logging.warning(f"Transient API error ({type(e).__name__}); retry {attempt + 1}/{self.max_retries} in {delay:.1f}s.")
+                attempt += 1
+                self._sleep(delay)
+
+    async def acall(self, coro_fn, tokens=0):
+        """Async version of `call`: awaits `coro_fn()` without blocking the event loop while waiting."""
+        attempt = 0
+        while True:
+            self._adjust_queue(1)
+            started = self._clock()
+            try:
+                wait = self._try_reserve(tokens)
+                while wait > 0:
+                    await asyncio.sleep(wait)
+                    wait = self._try_reserve(tokens)
+            finally:
+                self._adjust_queue(-1)
+            self._record_wait(self._clock() - started)
+            try:
+                return await coro_fn()
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                delay = self._backoff(attempt)
+                logging.warning(f"Transient API error ({type(e).__name__}); retry {attempt + 1}/{self.max_retries} in {delay:.1f}s.")
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    def stats(self):
+        """Returns queue depth, request/retry counts and wait times."""
+        with self._lock:
+            return {
+                "queue_depth": self.queue_depth,
+                "requests": self.requests,
+                "retries": self.retries,
+                "total_wait_seconds": round(self.total_wait_seconds, 3),
+                "average_wait_seconds": round(self.total_wait_seconds / self.requests, 3) if self.requests else 0.0,
+                "max_wait_seconds": round(self.max_wait_seconds, 3),
+            }
+
+
+# --- Shared Model Pool ---
+# genai.configure() is process-global and throws away the cached API clients
+# (and their open connections) every time it is called, so models are built
+# once per (api_key, model_name, context_cache, field subset) and each one is
+# pinned to its own client.
+_model_pool = {}
+_model_pool_lock = threading.Lock()
+_configured_api_key = None
+
+
+def _ensure_configured(api_key):
+    """Points the global genai config at `api_key`. Caller must hold _model_pool_lock."""
+    global _configured_api_key
+    if _configured_api_key != api_key:
+        genai.configure(api_key=api_key)
+        _configured_api_key = api_key
+
+
+def _select_fields(field_names):
+    """Returns the registry entries for `field_names` (None means every field), in registry order."""
+    if field_names is None:
+        return FIELD_REGISTRY
+    wanted = set(field_names)
+    return tuple(field for field in FIELD_REGISTRY if field["name"] in wanted)
+
+
+def _create_model(model_name, context_cache, field_names=None, packed=False):
+    """
+    Builds a model that carries SYSTEM_INSTRUCTION and GENERATION_CONFIG (or,
+    if `packed`, PACKED_SYSTEM_INSTRUCTION and PACKED_GENERATION_CONFIG), or
+    their equivalents for a subset of fields.
+
+    With `context_cache`, the instructions are uploaded once as provider-side
+    cached content and every request references it. If that fails (e.g., the
+    prefix is below the model's minimum cacheable size, or the model doesn't
+    support caching), the instructions are sent as a regular system
+    instruction instead.
+    """
+    if packed:
+        if field_names is None:
+            system_instruction, generation_config = PACKED_SYSTEM_INSTRUCTION, PACKED_GENERATION_CONFIG
+        else:
+            fields = _select_fields(field_names)
+            system_instruction = build_packed_system_instruction(fields)
+            generation_config = {**PACKED_GENERATION_CONFIG, "response_schema": build_packed_response_schema(fields)}
+    elif field_names is None:
+        system_instruction, generation_config = SYSTEM_INSTRUCTION, GENERATION_CONFIG
+    else:
+        fields = _select_fields(field_names)
+        system_instruction = build_system_instruction(fields)
+        generation_config = {**GENERATION_CONFIG, "response_schema": build_response_schema(fields)}
+
+    if context_cache:
+        try:
+            cached_content = genai.caching.CachedContent.create(
+                model=model_name,
+                display_name=f"contract-extraction{'-packed' if packed else ''}-v{PROMPT_VERSION}",
+                system_instruction=system_instruction,
+                ttl=CONTEXT_CACHE_TTL_SECONDS,
+            )
+            model = genai.GenerativeModel.from_cached_content(cached_content, generation_config=generation_config)
+            model._context_cache_refresh_at = (time.monotonic() + CONTEXT_CACHE_TTL_SECONDS
+                                               - CONTEXT_CACHE_REFRESH_MARGIN_SECONDS)
+            logging.info(f"Cached the instruction prefix for {model_name} as {cached_content.name}.")
+            return model
+        except Exception as e:
+            logging.warning(f"Context caching unavailable for {model_name} ({e}); "
+                            f"sending the instructions as a system instruction instead.")
+    return genai.GenerativeModel(model_name, generation_config=generation_config,
+                                 system_instruction=system_instruction)
+
+
+def _is_stale(model):
+    """True once a model's cached instruction prefix is about to expire."""
+    refresh_at = getattr(model, '_context_cache_refresh_at', None)
+    return refresh_at is not None and time.monotonic() >= refresh_at
+
+
+def get_model(api_key, model_name=MODEL_NAME, context_cache=False, field_names=None, packed=False):
+    """
+    Returns the shared Gemini model for (api_key, model_name), creating it on first use.
+
+    The model is bound to a dedicated API client, so every call in the process
+    reuses the same connection pool, and later calls with a different key
+    can't redirect it. Safe to call from multiple threads.
+
+    Args:
+        api_key: The Gemini API key.
+        model_name: The Gemini model to use. Defaults to MODEL_NAME.
+        context_cache: If True, the static instruction prefix is stored with
+                       the provider's context caching (falling back to a plain
+                       system instruction if that fails), so batch runs pay
+                       for it once rather than per contract. The cache is
+                       renewed shortly before CONTEXT_CACHE_TTL_SECONDS runs out.
+        field_names: Optional subset of CONTRACT_FIELDS to ask for; the
+                     instructions and response schema cover only these.
+                     Each distinct subset gets its own pooled model.
+        packed: If True, the model carries the packed (several contracts per
+                request) instructions and response schema instead; it is
+                pooled, and context-cached, separately.
+
+    Returns:
+        A genai.GenerativeModel instance.
+
+    Raises:
+        LLMConfigurationError: If the API key is invalid or the model cannot be initialized.
+    """
+    if field_names is not None:
+        field_names = tuple(field["name"] for field in _select_fields(field_names))
+    pool_key = (api_key, model_name, bool(context_cache), field_names, bool(packed))
+    model = _model_pool.get(pool_key)
+    if model is not None and not _is_stale(model):
+        return model
+
+    with _model_pool_lock:
+        model = _model_pool.get(pool_key)
+        if model is None or _is_stale(model):
+            try:
+                _ensure_configured(api_key)
+                model = _create_model(model_name, context_cache, field_names, packed)
+                # Pin the sync client now, while the global config matches this key
+                model._client = genai_client.get_default_generative_client()
+            except Exception as e:
+                logging.error(f"Error initializing Gemini model ({model_name}): {e}", exc_info=True)
+                raise LLMConfigurationError(f"Error initializing Gemini model ({model_name}): {e}. Check API key and model name.")
+            _model_pool[pool_key] = model
+    return model
+
+
+def _get_async_model(api_key, model_name=MODEL_NAME, context_cache=False, field_names=None):
+    """Like `get_model`, but also binds the model's async client to `api_key`."""
+    model = get_model(api_key, model_name, context_cache, field_names)
+    if getattr(model, '_async_client', None) is None:
+        with _model_pool_lock:
+            if getattr(model, '_async_client', None) is None:
+                try:
+                    _ensure_configured(api_key)
+                    model._async_client = genai_client.get_default_generative_async_client()
+                except Exception as e:
+                    logging.error(f"Error initializing async Gemini client ({model_name}): {e}", exc_info=True)
+                    raise LLMConfigurationError(f"Error initializing async Gemini client ({model_name}): {e}. Check API key.")
+    return model
+
+
+def clear_model_pool():
+    """Drops all pooled models, e.g. after rotating API keys."""
+    global _configured_api_key
+    with _model_pool_lock:
+        _model_pool.clear()
+        _configured_api_key = None
+
+
+def _extract_response_text(response):
+    """
+    Safely pulls the text out of a Gemini response.
+
+    Raises:
+        LLMGenerationError: If the prompt was blocked or no text can be found.
+    """
+    response_text = None
+
+    # Safely access response text, handling different potential structures/errors
+    if hasattr(response, 'text'):
+        response_text = response.text
+    elif hasattr(response, 'prompt_feedback') and response.prompt_feedback.block_reason:
+        block_reason = response.prompt_feedback.block_reason
+        safety_ratings = response.prompt_feedback.safety_ratings
+        logging.error(f"LLM content generation blocked. Reason: {block_reason}. Ratings: {safety_ratings}")
+        raise LLMGenerationError(f"Content generation blocked due to safety settings. Reason: {block_reason}")
+    elif isinstance(response, str): # Some APIs might return string directly
+         response_text = response
+    else:
+        # Log unexpected structure and raise error
+        response_type = type(response)
+        logging.error(f"Unexpected response structure from LLM: {response_type}. Response: {response}")
+        raise LLMGenerationError(f"Could not extract text from LLM response. Unexpected type: {response_type}")
+
+    if response_text is None:
+         raise LLMGenerationError("Extracted response text is None after generation.")
+    return response_text
+
+
+def _wrap_llm_error(e):
+    """Logs an LLM-call failure and returns it as an LLMGenerationError (known errors pass through)."""
+    # Catch-all for other potential API errors during generate_content
+    logging.error(f"Error calling Gemini API or parsing response: {e}", exc_info=True)
+    # Re-raise specific errors if they are already the correct type
+    if isinstance(e, (LLMGenerationError, JSONParsingError)):
+        return e
+    # Wrap other exceptions
+    return LLMGenerationError(f"An unexpected error occurred during LLM interaction: {e}")
+
+
+def _cache_prompt_version(retrieval_top_k=None, rules=None, normalize=False, fields=None, repair=False):
+    """The prompt_version part of a cache key, covering options that change what gets extracted."""
+    prompt_version = PROMPT_VERSION
+    if fields is not None and len(fields) < len(CONTRACT_FIELDS):
+        # Each subset of fields is cached on its own
+        prompt_version += "+fields" + hashlib.sha256("\n".join(fields).encode('utf-8')).hexdigest()[:12]
+    if retrieval_top_k is not None:
+        prompt_version += f"+top{retrieval_top_k}"
+    if rules is not None:
+        prompt_version += f"+rules{RULES_VERSION}"
+    if normalize:
+        prompt_version += f"+norm{NORMALIZER_VERSION}"
+    if repair:
+        prompt_version += "+repair"
+    return prompt_version
+
+
+def _extraction_cache_key(cache, contract_text, model_name, fast_model_name=None, retrieval_top_k=None, rules=None,
+                          normalize=False, fields=None, repair=False):
+    """The key `get_contract_data` stores an extraction of `contract_text` under, with these options."""
+    if fast_model_name is not None:
+        model_name = f"{fast_model_name}>{model_name}"
+    return cache.make_key(contract_text, model_name,
+                          _cache_prompt_version(retrieval_top_k, rules, normalize, fields, repair))
+
+
+def _merge_resolved_fields(extracted_data, resolved):
+    """Combines LLM output with rule-resolved values (rules win), in CONTRACT_FIELDS order."""
+    merged = {**extracted_data, **resolved}
+    ordered = {field: merged.pop(field) for field in CONTRACT_FIELDS if field in merged}
+    ordered.update(merged)
+    return ordered
+
+
+def _generate_fields(contract_text, api_key, model_name, field_names, scheduler, context_cache, repair=False):
+    """
+    Sends one extraction request for `field_names` (None means every field)
+    and returns the parsed response (see `parse_llm_response` for `repair`).
+    """
+    model = get_model(api_key, model_name, context_cache, field_names)
+    prompt = build_contract_prompt(contract_text)
+    try:
+        if scheduler is None:
+            response = model.generate_content(prompt)
+        else:
+            response = scheduler.call(lambda: model.generate_content(prompt), _request_tokens(prompt, field_names))
+        return parse_llm_response(_extract_response_text(response), repair=repair, fields=field_names)
+    except Exception as e:
+        raise _wrap_llm_error(e)
+
+
+def _reprompt_fields(contract_text, api_key, model_name, field_names, scheduler, context_cache, top_k=None):
+    """
+    Asks `model_name` again for just `field_names`, with a prompt and
+    response schema cut down to those fields.
+
+    With `top_k`, only the top sections of the field groups those fields
+    belong to are sent (see `select_relevant_sections`), unless some field
+    is in no group.
+
+    Returns:
+        {field: value} for every requested field, in CONTRACT_FIELDS order
+        (fields the response still omits come back as null).
+    """
+    wanted = set(field_names)
+    requested = [field for field in CONTRACT_FIELDS if field in wanted]
+    if top_k is not None:
+        groups = {name: group for name, group in FIELD_GROUPS.items() if wanted & set(group["fields"])}
+        if wanted <= {field for group in groups.values() for field in group["fields"]}:
+            contract_text = select_relevant_sections(contract_text, top_k, groups)
+    logging.info(f"Re-asking {model_name} for {len(requested)} field(s): {', '.join(requested)}")
+    answer = _generate_fields(contract_text, api_key, model_name, requested, scheduler, context_cache, repair=True)
+    return {field: answer.get(field, _NULL_AS.get(field)) for field in requested}
+
+
+def _repair_invalid_fields(extracted_data, contract_text, api_key, model_name, field_names, scheduler,
+                           context_cache):
+    """
+    Re-prompts for the fields of `extracted_data` that are missing or fail
+    validation, and merges the valid answers in.
+
+    Only those fields and their supporting sections are sent (see
+    `_reprompt_fields`). An answer that is still invalid leaves the original
+    value in place. A failed follow-up call is logged and the extraction
+    returned as it was.
+    """
+    problems = validate_contract_data(extracted_data, field_names)
+    if not problems:
+        return extracted_data
+    logging.warning(f"{len(problems)} field(s) missing or invalid; re-prompting for those only: {problems}")
+    try:
+        answers = _reprompt_fields(contract_text, api_key, model_name, problems, scheduler, context_cache,
+                                   top_k=REPAIR_TOP_K)
+    except (JSONParsingError, LLMGenerationError) as e:
+        logging.warning(f"Follow-up request for {len(problems)} field(s) failed: {e}")
+        return extracted_data
+    still_invalid = validate_contract_data(answers, list(problems))
+    if still_invalid:
+        logging.warning(f"Follow-up answers still invalid, keeping the original values: {still_invalid}")
+    repaired = {field: value for field, value in answers.items() if field not in still_invalid}
+    for field in still_invalid:
+        if field not in extracted_data:
+            repaired[field] = answers[field]
+    return _merge_resolved_fields(extracted_data, repaired)
+
+
+def get_contract_data(contract_text, api_key, model_name=MODEL_NAME, cache=None, retrieval_top_k=None,
+                      scheduler=None, context_cache=False, rules=None, provenance=None, normalize=False,
+                      fast_model_name=None, repair=False, fields=None):
+    """
+    Sends the contract text to the Gemini LLM and parses the structured data response.
+
+    Args:
+        contract_text: The string content of the contract.
+        api_key: The Gemini API key.
+        model_name: The Gemini model to use. Defaults to MODEL_NAME.
+        cache: Optional ExtractionCache. On a hit the LLM is not called at all;
+               successful extractions are written back to it.
+        retrieval_top_k: If set, only the sections that rank in the top
+                         `retrieval_top_k` for some field group are sent to the
+                         model (see `select_relevant_sections`), which cuts
+                         input tokens for long contracts.
+        scheduler: Optional RequestScheduler that paces the call against
+                   rate limits and retries transient API errors.
+        context_cache: If True, the static instructions are served from the
+                       provider's context cache (see `get_model`).
+        rules: Optional RuleExtractor run on the full text first. The fields
+               it resolves are dropped from the prompt and response schema,
+               and when it resolves every field the LLM is not called.
+        provenance: Optional dict, filled in place with where each field's
+                    value came from: the rule match (see
+                    `RuleExtractor.extract`), {"source": "llm"} or
+                    {"source": "cache"}.
+        normalize: If True, the text sent to the model (after retrieval) is
+                   cleaned up with `normalize_contract_text` to save input tokens.
+        fast_model_name: If set, every field is first extracted with this
+                         model and only the ones that fail validation go to
+                         `model_name` (see `get_contract_data_cascade`; rules
+                         then check the fast model instead of replacing it).
+        repair: If True, a malformed response is first patched up locally
+                (see `repair_json_text`), and any fields still missing or
+                failing `validate_contract_data` are re-asked in one small
+                follow-up request covering just those fields and their
+                supporting sections, instead of failing the whole
+                extraction. Repaired results are cached apart from
+                unrepaired ones.
+        fields: Optional field names (see CONTRACT_FIELDS) to extract instead
+                of all of them. The instructions, response schema and result
+                cover only those fields, and each subset is cached separately.
+
+    Returns:
+        A dictionary containing the parsed contract data.
+
+    Raises:
+        ValueError: If contract_text or api_key is empty, or `fields` names an unknown field.
+        LLMConfigurationError: If the API key is invalid or the model cannot be initialized.
+        LLMGenerationError: If the API call fails or returns an error (e.g., blocked prompt).
+        JSONParsingError: If the LLM response cannot be parsed into the expected JSON structure.
+    """
+    if not contract_text:
+        raise ValueError("Contract text cannot be empty.")
+    if not api_key:
+        raise ValueError("API key must be provided.")
+    if fast_model_name is not None:
+        return get_contract_data_cascade(contract_text, api_key, fast_model_name, model_name, cache=cache,
+                                         retrieval_top_k=retrieval_top_k, scheduler=scheduler,
+                                         context_cache=context_cache, rules=rules, provenance=provenance,
+                                         normalize=normalize, repair=repair, fields=fields)
+    requested = _requested_fields(fields)
+
+    cache_key = None
+    if cache is not None:
+        cache_key = _extraction_cache_key(cache, contract_text, model_name, None, retrieval_top_k, rules, normalize,
+                                          requested, repair)
+        cached_data = cache.get(cache_key)
+        if cached_data is not None:
+            logging.info("Extraction cache hit; skipping LLM call.")
+            if provenance is not None:
+                provenance.update((field, {"source": "cache"}) for field in cached_data)
+            return cached_data
+
+    resolved, rule_provenance = rules.extract(contract_text) if rules is not None else ({}, {})
+    resolved = {field: value for field, value in resolved.items() if field in requested}
+    remaining = [field for field in requested if field not in resolved]
+    if remaining:
+        if retrieval_top_k is not None:
+            contract_text = select_relevant_sections(contract_text, retrieval_top_k)
+        if normalize:
+            contract_text = normalize_contract_text(contract_text)
+        field_names = None if len(remaining) == len(CONTRACT_FIELDS) else remaining
+        extracted_data = _generate_fields(contract_text, api_key, model_name, field_names, scheduler, context_cache,
+                                          repair=repair)
+        if repair:
+            extracted_data = _repair_invalid_fields(extracted_data, contract_text, api_key, model_name, field_names,
+                                                    scheduler, context_cache)
+    else:
+        logging.info("Every field was resolved by rules; skipping LLM call.")
+        extracted_data = {}
+
+    if resolved:
+        extracted_data = _merge_resolved_fields(extracted_data, resolved)
+    if provenance is not None:
+        provenance.update((field, rule_provenance.get(field, {"source": "llm"})) for field in extracted_data)
+
+    if cache is not None:
+        cache.set(cache_key, extracted_data)
+    return extracted_data
+
+
+# --- Map-Reduce Extraction ---
+
+_MONTHS = ("january", "february", "march", "april", "may", "june", "july",
+           "august", "september", "october", "november", "december")
+# "April 22, 2024", "April 22 , 2024" (PDF spacing), "04/22/2024"
+_DATE_RE = re.compile(
+    r"\b(?:(" + "|".join(_MONTHS) + r")\s+(\d{1,2})\s*,?\s*(\d{4})|(\d{1,2})/(\d{1,2})/(\d{4}))\b",
+    re.IGNORECASE,
+)
+_ORDER_FORM_RE = re.compile(r"order\s+form\s+no\.?\s*\d+", re.IGNORECASE)
+# How far after its heading an Order Form's effective-date label is looked for
+_ORDER_FORM_LABEL_CHARS = 1500
+# How far after its heading an unlabelled date is taken as the Order Form's date
+_ORDER_FORM_HEADING_DATE_CHARS = 200
+
+
+def _parse_date_match(match):
+    """Converts a _DATE_RE match to a datetime.date, or None if it isn't a real date."""
+    try:
+        if match.group(1):
+            month = _MONTHS.index(match.group(1).lower()) + 1
+            return datetime(int(match.group(3)), month, int(match.group(2))).date()
+        return datetime(int(match.group(6)), int(match.group(4)), int(match.group(5))).date()
+    except ValueError:
+        return None # e.g. "February 30, 2024"
+
+
+def _iter_contract_dates(text):
+    """Yields (match, datetime.date) for every well-formed date written out in `text`."""
+    for match in _DATE_RE.finditer(text):
+        date = _parse_date_match(match)
+        if date is not None:
+            yield match, date
+
+
+def split_contract_windows(contract_text, window_chars=MAX_CONTRACT_CHARS, overlap_chars=WINDOW_OVERLAP_CHARS):
+    """
+    Splits a contract into overlapping windows that each fit in one prompt.
+
+    Windows are built from whole sections (see `split_contract_sections`)
+    where possible; a section longer than `window_chars - overlap_chars`
+    is cut into fixed-size pieces. Each window after the first starts with up to
+    `overlap_chars` of the previous window's text, so a clause straddling
+    a boundary is seen whole by at least one window.
+
+    Args:
+        contract_text: The string content of the contract.
+        window_chars: Maximum characters per window.
+        overlap_chars: Characters repeated from the end of the previous window.
+
+    Returns:
+        A list of window strings, in document order.
+    """
+    if overlap_chars >= window_chars:
+        raise ValueError("overlap_chars must be smaller than window_chars.")
+    if len(contract_text) <= window_chars:
+        return [contract_text]
+
+    # Pieces leave room for the overlap carried into the next window, so no window exceeds window_chars
+    piece_chars = window_chars - overlap_chars
+    pieces = []
+    for section in split_contract_sections(contract_text):
+        text = section["text"]
+        while len(text) > piece_chars:
+            pieces.append(text[:piece_chars])
+            text = text[piece_chars:]
+        pieces.append(text)
+
+    windows, current = [], ""
+    for piece in pieces:
+        # After a flush `current` starts as the overlap, which counts towards the limit
+        if current and len(current) + len(piece) > window_chars:
+            windows.append(current)
+            current = current[-overlap_chars:] if overlap_chars else ""
+        current += piece
+    if current:
+        windows.append(current)
+    return windows
+
+
+def _order_form_date(text, start, end):
+    """
+    The date of the Order Form whose heading ends at `start`, looking no
+    further than `end`: the date its effective-date label defines, else a
+    date right after the heading, else None.
+    """
+    lowered = text.lower()
+    label_end = min(end, start + _ORDER_FORM_LABEL_CHARS)
+    for anchor in _EFFECTIVE_DATE_ANCHOR_RE.finditer(lowered, start, label_end):
+        # '... April 22, 2024 ("Effective Date")'
+        before = _DEFINED_DATE_BEFORE_RE.search(lowered, max(start, anchor.start() - _RULE_WINDOW_CHARS), anchor.start())
+        if before:
+            date = _parse_date_match(before)
+            if date is not None:
+                return date
+            continue
+        # 'Effective Date: 04/22/2024' / '"Effective Date" means April 22, 2024'
+        after = _DATE_AFTER_RE.match(lowered, anchor.end(), label_end)
+        date_match = _DATE_RE.match(lowered, after.end(), label_end) if after and after.end() > anchor.end() else None
+        date = _parse_date_match(date_match) if date_match else None
+        if date is not None:
+            return date
+    heading_match = _DATE_RE.search(text, start, min(end, start + _ORDER_FORM_HEADING_DATE_CHARS))
+    return _parse_date_match(heading_match) if heading_match else None
+
+
+def _window_precedence(window_text):
+    """
+    Sort key for reducing window results: windows that contain an Order Form
+    win (Order Forms take precedence over the agreement, per its §1.5), the
+    latest-dated Order Form first. An Order Form is dated by its own
+    effective-date label or heading (see `_order_form_date`), not by other
+    dates that happen to share its window.
+    """
+    headings = list(_ORDER_FORM_RE.finditer(window_text))
+    if not headings:
+        return (0, datetime.min.date())
+    dates = []
+    for i, heading in enumerate(headings):
+        end = headings[i + 1].start() if i + 1 < len(headings) else len(window_text)
+        date = _order_form_date(window_text, heading.end(), end)
+        if date is not None:
+            dates.append(date)
+    return (1, max(dates) if dates else datetime.min.date())
+
+
+def reduce_window_results(window_results):
+    """
+    Deterministically merges per-window extractions into one result.
+
+    For each field, the non-null value from the highest-precedence window is
+    kept: Order Form windows beat agreement windows, later-dated Order Forms
+    beat earlier ones, and ties go to the later window in the document.
+
+    Args:
+        window_results: A list of (window_text, extracted_data) tuples in
+                        document order.
+
+    Returns:
+        A single dictionary with one value per field, in first-seen field order.
+    """
+    ranked = sorted(
+        enumerate(window_results),
+        key=lambda item: (_window_precedence(item[1][0]), item[0]),
+        reverse=True,
+    )
+    merged = {}
+    for _, data in window_results:
+        for field in data:
+            merged.setdefault(field, None)
+    for field in merged:
+        for _, (_, data) in ranked:
+            if data.get(field) is not None:
+                merged[field] = data[field]
+                break
+    return merged
+
+
+def get_contract_data_mapreduce(contract_text, api_key, window_chars=MAX_CONTRACT_CHARS,
+                                overlap_chars=WINDOW_OVERLAP_CHARS, max_workers=4, **extract_options):
+    """
+    Extracts a contract too large for a single prompt by mapping over windows.
+
+    The text is split with `split_contract_windows`, each window is extracted
+    concurrently with `get_contract_data`, and the partial results are merged
+    with `reduce_window_results`. Contracts that fit in one window go straight
+    to `get_contract_data`.
+
+    Args:
+        contract_text: The string content of the contract.
+        api_key: The Gemini API key.
+        window_chars: Maximum characters of contract text per request.
+        overlap_chars: Characters shared between consecutive windows.
+        max_workers: Maximum number of windows extracted at the same time.
+        **extract_options: Passed through to `get_contract_data` (e.g., model_name, cache).
+
+    Returns:
+        A dictionary containing the merged contract data.
+
+    Raises:
+        ValueError: If contract_text or api_key is empty.
+        LLMConfigurationError, LLMGenerationError, JSONParsingError: If every
+            window fails; the first window's error is raised. Failures of
+            individual windows are logged and skipped.
+    """
+    if not contract_text:
+        raise ValueError("Contract text cannot be empty.")
+    windows = split_contract_windows(contract_text, window_chars, overlap_chars)
+    if len(windows) == 1:
+        return get_contract_data(contract_text, api_key, **extract_options)
+
+    logging.info(f"Contract is {len(contract_text)} characters; extracting {len(windows)} windows.")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(get_contract_data, window, api_key, **extract_options) for window in windows]
+
+    window_results, errors = [], []
+    for i, (window, future) in enumerate(zip(windows, futures)):
+        try:
+            window_results.append((window, future.result()))
+        except (LLMGenerationError, JSONParsingError, LLMConfigurationError) as e:
+            logging.warning(f"Window {i + 1}/{len(windows)} failed: {e}")
+            errors.append(e)
+    if not window_results:
+        raise errors[0]
+    return reduce_window_results(window_results)
+
+
+# --- Incremental Re-Extraction ---
+
+def _section_fingerprint(section):
+    """Whitespace-insensitive hash of a section, so PDF reflows don't count as changes."""
+    return hashlib.sha256(" ".join(section["text"].split()).encode('utf-8')).hexdigest()
+
+
+def diff_contract_sections(previous_text, new_text):
+    """
+    Compares two versions of a contract section by section.
+
+    Args:
+        previous_text: The earlier version of the contract.
+        new_text: The amended version.
+
+    Returns:
+        A dict with 'previous_sections' and 'new_sections' (as returned by
+        `split_contract_sections`), 'added' (indexes of new sections whose
+        text doesn't appear in the previous version) and 'removed' (indexes
+        of previous sections missing from the new version). Moved but
+        unchanged sections are neither added nor removed.
+    """
+    previous_sections = split_contract_sections(previous_text)
+    new_sections = split_contract_sections(new_text)
+    previous_prints = [_section_fingerprint(section) for section in previous_sections]
+    new_prints = [_section_fingerprint(section) for section in new_sections]
+    previous_set, new_set = set(previous_prints), set(new_prints)
+    return {
+        "previous_sections": previous_sections,
+        "new_sections": new_sections,
+        "added": [i for i, fingerprint in enumerate(new_prints) if fingerprint not in previous_set],
+        "removed": [i for i, fingerprint in enumerate(previous_prints) if fingerprint not in new_set],
+    }
+
+
+def _supporting_sections(sections, top_k, field_groups):
+    """Maps each field group to the indexes of its top_k sections, plus the opening section."""
+    index = SectionIndex(sections)
+    return {name: {0, *index.top(group["query"], top_k)} for name, group in field_groups.items()}
+
+
+def get_contract_data_incremental(previous_text, new_text, api_key, previous_data=None, top_k=3, field_groups=None,
+                                  model_name=MODEL_NAME, cache=None, scheduler=None, context_cache=False,
+                                  provenance=None, retrieval_top_k=None, rules=None, normalize=False, fields=None,
+                                  fast_model_name=None, repair=False):
+    """
+    Re-extracts an amended contract, asking the model only for fields whose sections changed.
+
+    The two versions are diffed with `diff_contract_sections`. A field group
+    needs re-extraction when a changed section ranks among its `top_k`
+    sections (BM25, as in `select_relevant_sections`) in the new version, or
+    a removed one did in the previous version; the opening section counts
+    for every group. Only those groups' fields are requested, and only their
+    supporting sections of the new text are sent. Every other value is
+    carried forward from `previous_data`. Fields outside every group are
+    re-extracted whenever anything changed.
+
+    The extraction options (`retrieval_top_k`, `rules`, `normalize`,
+    `fields`, `fast_model_name`, `repair`) mean the same as for
+    `get_contract_data`. They apply to the re-extraction, and select which
+    cached extraction of `previous_text` is reused, so both versions are
+    extracted with the same settings.
+
+    Args:
+        previous_text: The earlier version of the contract.
+        new_text: The amended version.
+        api_key: The Gemini API key.
+        previous_data: The extraction of `previous_text`. If None, it is
+                       looked up in `cache` under the same options; without
+                       it, `new_text` is extracted in full.
+        top_k: Sections per field group considered to support its fields.
+        field_groups: Mapping of group name to {'fields', 'query'}; defaults to FIELD_GROUPS.
+        model_name: The Gemini model to use. Defaults to MODEL_NAME.
+        cache: Optional ExtractionCache; the merged result is stored as the
+               extraction of `new_text` with these options.
+        scheduler: Optional RequestScheduler, as for `get_contract_data`.
+        context_cache: As for `get_contract_data`.
+        provenance: Optional dict, filled with {"source": "carried"} for
+                    carried-forward fields and, for re-extracted ones, what
+                    `get_contract_data` reports.
+
+    Returns:
+        A dictionary containing the contract data for `new_text`.
+
+    Raises:
+        Same as `get_contract_data`.
+    """
+    if not previous_text or not new_text:
+        raise ValueError("Contract text cannot be empty.")
+    if not api_key:
+        raise ValueError("API key must be provided.")
+    field_groups = FIELD_GROUPS if field_groups is None else field_groups
+    requested = _requested_fields(fields)
+    extract_options = {
+        "model_name": model_name, "scheduler": scheduler, "context_cache": context_cache,
+        "retrieval_top_k": retrieval_top_k, "rules": rules, "normalize": normalize,
+        "fast_model_name": fast_model_name, "repair": repair,
+    }
+
+    def cache_key(contract_text):
+        return _extraction_cache_key(cache, contract_text, model_name, fast_model_name, retrieval_top_k, rules,
+                                     normalize, requested, repair)
+
+    if previous_data is None and cache is not None:
+        previous_data = cache.get(cache_key(previous_text))
+        if previous_data is None:
+            logging.info("No cached extraction of the previous version with these options.")
+    if previous_data is None:
+        logging.warning("No extraction of the previous version available; extracting the new version in full.")
+        return get_contract_data(new_text, api_key, cache=cache, provenance=provenance, fields=fields,
+                                 **extract_options)
+
+    diff = diff_contract_sections(previous_text, new_text)
+    added, removed = set(diff["added"]), set(diff["removed"])
+    # Fields the previous extraction lacks can't be carried forward
+    stale = {field for field in requested if field not in previous_data}
+    send = {0}
+    if added or removed:
+        new_support = _supporting_sections(diff["new_sections"], top_k, field_groups)
+        previous_support = _supporting_sections(diff["previous_sections"], top_k, field_groups)
+        grouped = set()
+        for name, group in field_groups.items():
+            grouped.update(group["fields"])
+            if new_support[name] & added or previous_support[name] & removed:
+                stale.update(field for field in group["fields"] if field in requested)
+                send |= new_support[name]
+        stale.update(field for field in requested if field not in grouped)
+    refresh = [field for field in requested if field in stale]
+
+    logging.info(f"Amendment changed {len(added)} and removed {len(removed)} of "
+                 f"{len(diff['previous_sections'])} sections; re-extracting {len(refresh)}/{len(requested)} fields.")
+    extracted, refreshed_provenance = {}, {}
+    if refresh:
+        if len(refresh) == len(requested) or not (added or removed):
+            context = new_text
+        else:
+            context = "".join(diff["new_sections"][i]["text"] for i in sorted(send))
+        extracted = get_contract_data(context, api_key, provenance=refreshed_provenance, fields=refresh,
+                                      **extract_options)
+
+    merged = {field: extracted.get(field) if field in stale else previous_data[field] for field in requested}
+    if provenance is not None:
+        provenance.update((field, refreshed_provenance.get(field, {"source": "llm"}) if field in stale
+                           else {"source": "carried"}) for field in merged)
+    if cache is not None:
+        cache.set(cache_key(new_text), merged)
+    return merged
+
+
+# --- Rule-Based Pre-Extraction ---
+# Fields that contracts usually state in a handful of standard phrasings are
+# resolved locally before the LLM is called. A rule only fires when every
+# match in the contract agrees; anything ambiguous is left to the model.
+
+_NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9,
+    "ten": 10, "eleven": 11, "twelve": 12, "fourteen": 14, "fifteen": 15, "twenty": 20, "thirty": 30,
+    "forty-five": 45, "sixty": 60, "ninety": 90,
+}
+# "90", "ninety", "ninety (90)"; group 'n' is the word or digits, group 'n2' the parenthesized digits
+_COUNT = r"(?P<n>\d+|" + "|".join(sorted(_NUMBER_WORDS, key=len, reverse=True)) + r")(?:\s*\(\s*(?P<n2>\d+)\s*\))?"
+# How far around an anchor a rule looks for the rest of its phrase
+_RULE_WINDOW_CHARS = 60
+
+# Rules run on the lowercased text and every pattern starts with a literal
+# anchor, which the regex engine can search for much faster than a pattern
+# that starts with a character class or alternation.
+_EFFECTIVE_DATE_ANCHOR_RE = re.compile(r"effective\s+date")
+_DEFINED_DATE_BEFORE_RE = re.compile(_DATE_RE.pattern + r"\s*\(\s*(?:the\s+)?[\"“]$")
+_DEFINED_TERM_CLOSE_RE = re.compile(r"[\"”]\s*\)")
+_DATE_AFTER_RE = re.compile(r"[\"”]?\s*(?::|means|shall\s+be|is)\s*")
+_TRIAL_ANCHOR_RE = re.compile(r"trial")
+_TRIAL_PERIOD_RE = re.compile(r"trial\s+period\s+of\s+" + _COUNT + r"[\s-]+(?:calendar[\s-]+)?days?\b")
+_DAYS_BEFORE_TRIAL_RE = re.compile(r"(?<![\w-])" + _COUNT + r"[\s-]+(?:calendar[\s-]+)?days?\s+$")
+_TERM_LENGTH_RE = re.compile(r"term\s+of\s+" + _COUNT + r"[\s-]+(?P<unit>years?|days?)\b")
+_WITHIN_HOURS_RE = re.compile(r"within\s+" + _COUNT + r"[\s-]+hours?\b")
+_DELETION_WORD_RE = re.compile(r"delet|destroy|destruction|eras")
+_REPORT_ANCHOR_RE = re.compile(r"reports?\b")
+_FREQUENCY_BEFORE_REPORT_RE = re.compile(
+    r"(?<![\w-])(?P<freq>weekly|monthly|quarterly|semi-annual|annual)\s+(?:performance\s+|usage\s+|utilization\s+)?$"
+)
+_BAA_RE = re.compile(r"business\s+associate\s+agreement")
+_DSA_RE = re.compile(r"data\s+sharing\s+agreement")
+# 'the parties shall execute a', 'Subscriber agrees to enter into the mutually agreed'
+_AGREEMENT_OBLIGATION_RE = re.compile(
+    r"\b(?:shall|will|must|agrees?\s+to|(?:is|are)\s+required\s+to)\s+(?:\w+\s+){0,2}?"
+    r"(?:execute|enter\s+into|sign)\s+(?:\w+\s+){0,3}$"
+)
+_NEGATION_RE = re.compile(r"\b(?:not|no|never|neither|nor|without|unless|except|n't)\b|n't\b")
+# Where the clause around an agreement mention ends
+_CLAUSE_END_RE = re.compile(r"[.;]\s")
+
+
+def _lower_preserving_offsets(text):
+    """Lowercases `text` without changing its length, so match offsets stay valid for the original."""
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    # A few characters (e.g., 'İ') lower to two; leave those as they are
+    return "".join(char.lower() if len(char.lower()) == 1 else char for char in text)
+
+
+def _count_value(match):
+    """Reads a _COUNT group as an int, preferring parenthesized digits ("ninety (90)")."""
+    digits = match.group("n2")
+    if digits:
+        return int(digits)
+    word = match.group("n")
+    return int(word) if word.isdigit() else _NUMBER_WORDS[word]
+
+
+def _at_word_start(lowered, pos):
+    return pos == 0 or not lowered[pos - 1].isalnum()
+
+
+def _resolve_unique(rule, text, candidates):
+    """
+    Picks the value from (value, start, end) candidates if they all agree.
+
+    Returns:
+        (value, provenance), or None if there were no candidates or they conflict.
+    """
+    found = None
+    for value, start, end in candidates:
+        if value is None:
+            continue
+        if found is None:
+            found = (value, start, end)
+        elif found[0] != value:
+            return None # Conflicting statements: leave it to the LLM
+    if found is None:
+        return None
+    value, start, end = found
+    return value, {"source": "rule", "rule": rule, "start": start, "end": end, "text": " ".join(text[start:end].split())}
+
+
+def _rule_effective_date(text, lowered):
+    def candidates():
+        for anchor in _EFFECTIVE_DATE_ANCHOR_RE.finditer(lowered):
+            # '... April 22, 2024 ("Effective Date")'
+            window_start = max(0, anchor.start() - _RULE_WINDOW_CHARS)
+            before = _DEFINED_DATE_BEFORE_RE.search(lowered, window_start, anchor.start())
+            if before:
+                date = _parse_date_match(before)
+                close = _DEFINED_TERM_CLOSE_RE.match(lowered, anchor.end())
+                yield (date.strftime("%m/%d/%Y") if date else None), before.start(), close.end() if close else anchor.end()
+                continue
+            # 'Effective Date: 04/22/2024' / '"Effective Date" means April 22, 2024'
+            after = _DATE_AFTER_RE.match(lowered, anchor.end())
+            date_match = _DATE_RE.match(lowered, after.end()) if after and after.end() > anchor.end() else None
+            if date_match:
+                date = _parse_date_match(date_match)
+                yield (date.strftime("%m/%d/%Y") if date else None), anchor.start(), date_match.end()
+    return _resolve_unique("effective_date_defined_term", text, candidates())
+
+
+def _rule_trial_period(text, lowered):
+    def candidates():
+        for anchor in _TRIAL_ANCHOR_RE.finditer(lowered):
+            if not _at_word_start(lowered, anchor.start()):
+                continue
+            # 'trial period of ninety (90) calendar days'
+            match = _TRIAL_PERIOD_RE.match(lowered, anchor.start())
+            if match:
+                yield _count_value(match), match.start(), match.end()
+                continue
+            # 'a 30-day trial'
+            window_start = max(0, anchor.start() - _RULE_WINDOW_CHARS)
+            match = _DAYS_BEFORE_TRIAL_RE.search(lowered, window_start, anchor.start())
+            if match:
+                yield _count_value(match), match.start(), anchor.end()
+    return _resolve_unique("trial_period_days", text, candidates())
+
+
+def _rule_term_length(text, lowered):
+    def candidates():
+        for match in _TERM_LENGTH_RE.finditer(lowered):
+            if _at_word_start(lowered, match.start()):
+                count = _count_value(match)
+                yield (count * 365 if match.group("unit").startswith("year") else count), match.start(), match.end()
+    return _resolve_unique("term_length", text, candidates())
+
+
+def _rule_deletion_timeframe(text, lowered):
+    def candidates():
+        for match in _WITHIN_HOURS_RE.finditer(lowered):
+            # Only a deadline stated in the same sentence as a deletion duty counts
+            sentence_start = lowered.rfind(".", 0, match.start()) + 1
+            sentence_end = lowered.find(".", match.end())
+            sentence_end = len(lowered) if sentence_end == -1 else sentence_end
+            if _DELETION_WORD_RE.search(lowered, sentence_start, sentence_end):
+                yield _count_value(match), match.start(), match.end()
+    return _resolve_unique("deletion_within_hours", text, candidates())
+
+
+def _rule_report_frequency(text, lowered):
+    def candidates():
+        for anchor in _REPORT_ANCHOR_RE.finditer(lowered):
+            window_start = max(0, anchor.start() - _RULE_WINDOW_CHARS)
+            match = _FREQUENCY_BEFORE_REPORT_RE.search(lowered, window_start, anchor.start())
+            if match:
+                yield match.group("freq"), match.start(), anchor.end()
+    return _resolve_unique("report_frequency", text, candidates())
+
+
+def _agreement_obligation(lowered, mention):
+    """
+    The start of the obligation ('shall execute a ...') that `mention` is the
+    object of, or None if there is none or its clause is negated.
+    """
+    window_start = max(0, mention.start() - _RULE_WINDOW_CHARS * 2)
+    clause_end = _CLAUSE_END_RE.search(lowered, mention.end(), mention.end() + _RULE_WINDOW_CHARS * 2)
+    after = lowered[mention.end():clause_end.start() if clause_end else mention.end() + _RULE_WINDOW_CHARS]
+    before = lowered[window_start:mention.start()]
+    clause_start = max((boundary.end() for boundary in _CLAUSE_END_RE.finditer(before)), default=0)
+    if _NEGATION_RE.search(before, clause_start) or _NEGATION_RE.search(after):
+        return None
+    obligation = _AGREEMENT_OBLIGATION_RE.search(lowered, window_start + clause_start, mention.start())
+    return obligation.start() if obligation else None
+
+
+def _rule_agreement_type(text, lowered):
+    candidates = []
+    for value, pattern in (("Business associate agreement", _BAA_RE), ("Data sharing agreement", _DSA_RE)):
+        for mention in pattern.finditer(lowered):
+            start = _agreement_obligation(lowered, mention)
+            if start is None:
+                return None # A bare, conditional or negated mention: leave it to the LLM
+            candidates.append((value, start, mention.end()))
+    # Neither (could be worded differently) or both: _resolve_unique leaves it to the LLM
+    return _resolve_unique("agreement_obligation", text, candidates)
+
+
+# Field name -> rule(text, lowered_text) returning (value, provenance) or None
+FIELD_RULES = {
+    "Effective date": _rule_effective_date,
+    "Term length (days)": _rule_term_length,
+    "Timeframe (hours)": _rule_deletion_timeframe,
+    "Performance Reports Frequency": _rule_report_frequency,
+    "Data sharing agreement or business associate agreement": _rule_agreement_type,
+    "Trial period": _rule_trial_period,
+}
+
+
+class RuleExtractor:
+    """
+    Deterministic pre-extraction stage that runs before the LLM.
+
+    Each rule in FIELD_RULES resolves its field only when the contract states
+    it unambiguously. Hit rates and timings are tracked per field. Safe to
+    share across threads.
+    """
+
+    def __init__(self, rules=None):
+        """
+        Args:
+            rules: Optional {field: rule} mapping; defaults to FIELD_RULES. A
+                   rule is called with the contract text and its lowercased
+                   copy, and returns (value, provenance) or None.
+        """
+        self.rules = dict(FIELD_RULES if rules is None else rules)
+        self._lock = threading.Lock()
+        self._stats = {field: {"runs": 0, "hits": 0, "seconds": 0.0} for field in self.rules}
+
+    def extract(self, contract_text):
+        """
+        Runs every rule over `contract_text`.
+
+        Returns:
+            A (values, provenance) tuple: {field: value} for the fields that
+            resolved, and {field: {"source": "rule", "rule", "start", "end",
+            "text"}} describing the match each value came from.
+        """
+        values, provenance = {}, {}
+        timings = []
+        lowered = _lower_preserving_offsets(contract_text)
+        for field, rule in self.rules.items():
+            started = time.perf_counter()
+            try:
+                result = rule(contract_text, lowered)
+            except Exception as e:
+                logging.warning(f"Rule for '{field}' failed: {e}")
+                result = None
+            timings.append((field, time.perf_counter() - started, result is not None))
+            if result is not None:
+                values[field], provenance[field] = result
+        with self._lock:
+            for field, seconds, hit in timings:
+                stats = self._stats[field]
+                stats["runs"] += 1
+                stats["hits"] += hit
+                stats["seconds"] += seconds
+        return values, provenance
+
+    def stats(self):
+        """Returns {field: {"runs", "hits", "hit_rate", "mean_us"}}."""
+        with self._lock:
+            return {
+                field: {
+                    "runs": stats["runs"],
+                    "hits": stats["hits"],
+                    "hit_rate": round(stats["hits"] / stats["runs"], 3) if stats["runs"] else 0.0,
+                    "mean_us": round(stats["seconds"] / stats["runs"] * 1e6, 1) if stats["runs"] else 0.0,
+                }
+                for field, stats in self._stats.items()
+            }
+
+
+# --- Cascade Extraction ---
+
+def _values_agree(field_name, first, second):
+    """Compares two values of a field, ignoring date zero-padding and string case/whitespace."""
+    if isinstance(first, str) and isinstance(second, str):
+        if _FIELDS_BY_NAME[field_name]["type"] == "date":
+            try:
+                return datetime.strptime(first.strip(), "%m/%d/%Y") == datetime.strptime(second.strip(), "%m/%d/%Y")
+            except ValueError:
+                pass
+        return first.strip().casefold() == second.strip().casefold()
+    return first == second and type(first) is type(second)
+
+
+def get_contract_data_cascade(contract_text, api_key, fast_model_name=FAST_MODEL_NAME, model_name=MODEL_NAME,
+                              cache=None, retrieval_top_k=None, scheduler=None, context_cache=False, rules=None,
+                              provenance=None, normalize=False, repair=False, fields=None):
+    """
+    Extracts every field with a fast model, and re-asks the large model only
+    for the fields whose answers look wrong.
+
+    The fast model's answers are checked with `validate_contract_data`
+    (declared type and accepted values). When `rules` is given, the values
+    it resolves are used as checks rather than being trusted outright: a
+    fast-model answer that disagrees with one is treated like an invalid
+    answer. All flagged fields go to `model_name` in one request cut down to
+    those fields (see `_reprompt_fields`), and its answers replace the fast
+    model's. If the fast model's response can't be used at all, the large
+    model extracts every field.
+
+    Args:
+        contract_text: The string content of the contract.
+        api_key: The Gemini API key.
+        fast_model_name: The first-pass model. Defaults to FAST_MODEL_NAME.
+        model_name: The model flagged fields are escalated to. Defaults to MODEL_NAME.
+        cache: Optional ExtractionCache; cascade results are keyed on both
+               model names, apart from single-model extractions.
+        retrieval_top_k: As for `get_contract_data`; applies to both models.
+        scheduler: Optional RequestScheduler, as for `get_contract_data`.
+        context_cache: As for `get_contract_data`.
+        rules: Optional RuleExtractor whose values are used to check the fast model.
+        provenance: Optional dict, filled in place with {"source": "llm",
+                    "model": ...} for each field, plus "escalated" (the reason)
+                    for fields the large model answered, or {"source": "cache"}.
+        normalize: As for `get_contract_data`; applies to both models.
+        repair: If True, malformed responses are patched up locally (see
+                `repair_json_text`); fields lost that way are escalated.
+        fields: Optional field names to extract, as for `get_contract_data`.
+
+    Returns:
+        A dictionary containing the parsed contract data.
+
+    Raises:
+        Same as `get_contract_data`.
+    """
+    if not contract_text:
+        raise ValueError("Contract text cannot be empty.")
+    if not api_key:
+        raise ValueError("API key must be provided.")
+
+    requested = _requested_fields(fields)
+    field_names = None if len(requested) == len(CONTRACT_FIELDS) else requested
+
+    cache_key = None
+    if cache is not None:
+        cache_key = _extraction_cache_key(cache, contract_text, model_name, fast_model_name, retrieval_top_k, rules,
+                                          normalize, requested, repair)
+        cached_data = cache.get(cache_key)
+        if cached_data is not None:
+            logging.info("Extraction cache hit; skipping LLM call.")
+            if provenance is not None:
+                provenance.update((field, {"source": "cache"}) for field in cached_data)
+            return cached_data
+
+    rule_values = rules.extract(contract_text)[0] if rules is not None else {}
+    prompt_text = contract_text
+    if retrieval_top_k is not None:
+        prompt_text = select_relevant_sections(prompt_text, retrieval_top_k)
+    if normalize:
+        prompt_text = normalize_contract_text(prompt_text)
+
+    try:
+        fast_data = _generate_fields(prompt_text, api_key, fast_model_name, field_names, scheduler, context_cache,
+                                     repair=repair)
+    except (JSONParsingError, LLMGenerationError) as e:
+        logging.warning(f"Fast model {fast_model_name} failed ({e}); extracting every field with {model_name}.")
+        fast_data = {}
+        escalate = {field: "fast model failed" for field in requested}
+    else:
+        escalate = validate_contract_data(fast_data, requested)
+        for field, value in rule_values.items():
+            if field in requested and field not in escalate and not _values_agree(field, fast_data.get(field), value):
+                escalate[field] = f"disagrees with rule value {value!r}"
+
+    extracted_data = {field: fast_data.get(field) for field in requested}
+    if escalate:
+        logging.info(f"Cascade: escalating {len(escalate)}/{len(requested)} fields to {model_name}.")
+        if len(escalate) == len(requested):
+            escalated_data = _generate_fields(prompt_text, api_key, model_name, field_names, scheduler, context_cache,
+                                              repair=repair)
+        else:
+            escalated_data = _reprompt_fields(prompt_text, api_key, model_name, escalate, scheduler, context_cache)
+        for field in escalate:
+            extracted_data[field] = escalated_data.get(field, _NULL_AS.get(field))
+        still_invalid = validate_contract_data(extracted_data, list(escalate))
+        if still_invalid:
+            logging.warning(f"{model_name} also returned invalid values: {still_invalid}")
+    else:
+        logging.info(f"Cascade: every field from {fast_model_name} passed validation.")
+
+    if provenance is not None:
+        for field in extracted_data:
+            if field in escalate:
+                provenance[field] = {"source": "llm", "model": model_name, "escalated": escalate[field]}
+            else:
+                provenance[field] = {"source": "llm", "model": fast_model_name}
+
+    if cache is not None:
+        cache.set(cache_key, extracted_data)
+    return extracted_data
+
+
+# --- Packed Extraction ---
+
+def build_packed_response_schema(fields=FIELD_REGISTRY):
+    """
+    Builds the response schema for a packed request: {"contracts": [...]} with
+    one flat field object per contract, each tagged with its "contract_id".
+    """
+    item = build_response_schema(fields)
+    item = {
+        "type": "OBJECT",
+        "properties": {"contract_id": {"type": "STRING"}, **item["properties"]},
+        "required": ["contract_id"] + item["required"],
+    }
+    return {"type": "OBJECT", "properties": {"contracts": {"type": "ARRAY", "items": item}}, "required": ["contracts"]}
+
+
+# Passed to the pooled packed models in place of GENERATION_CONFIG
+PACKED_GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": build_packed_response_schema(),
+}
+
+
+def build_packed_system_instruction(fields=FIELD_REGISTRY):
+    """
+    Builds the static instruction prefix for packed requests: the same field
+    list as `build_system_instruction`, but asking for one object per contract.
+
+    Args:
+        fields: Field registry entries to ask for. Defaults to all of FIELD_REGISTRY.
+    """
+    return f"""
+Each request contains several separate contracts, each between its own START CONTRACT and END CONTRACT markers and labelled with a contract ID. Extract the fields below from each contract independently, using only that contract's own text. Return a JSON object with a "contracts" array holding one flat JSON object per contract: its "contract_id" plus each field name mapped to its value. Adhere strictly to each field's type and accepted values. Convert dates written in any format (e.g., 'Month DD, YYYY') to MM/DD/YYYY. If information for a field is not found, use null unless the field says otherwise.
+
+Fields:
+{_format_field_instructions(fields)}
+"""
+
+
+PACKED_SYSTEM_INSTRUCTION = build_packed_system_instruction()
+# Cache prompt version for packed results, kept apart from single-contract extractions
+PACKED_PROMPT_VERSION = PROMPT_VERSION + "+packed"
+
+
+def build_packed_prompt(packed_contracts):
+    """
+    Builds the per-request prompt for several contracts, sent after PACKED_SYSTEM_INSTRUCTION.
+
+    Args:
+        packed_contracts: A list of (contract_id, contract_text) tuples.
+    """
+    parts = [f"""
+This request contains {len(packed_contracts)} separate contracts.
+"""]
+    for contract_id, contract_text in packed_contracts:
+        parts.append(f"""
+Contract ID: {contract_id}
+--- START CONTRACT {contract_id} ---
+{contract_text}
+--- END CONTRACT {contract_id} ---
+""")
+    parts.append("\nJSON Output:\n")
+    return "".join(parts)
+
+
+def parse_packed_response(response_text, contract_ids):
+    """
+    Splits a packed LLM response into per-contract data dicts.
+
+    Results are validated one by one: an item whose "contract_id" is unknown
+    or repeated, or which lacks any of CONTRACT_FIELDS, is dropped (and
+    logged), so the caller can extract that contract on its own.
+
+    Args:
+        response_text: The raw string response from the LLM.
+        contract_ids: The IDs the request was built with.
+
+    Returns:
+        A dict mapping contract_id to the same kind of dict `parse_llm_response`
+        returns, for every contract that came back valid.
+
+    Raises:
+        JSONParsingError: If no JSON object with a "contracts" array is found.
+    """
+    if not response_text or not isinstance(response_text, str):
+        raise JSONParsingError("Invalid or empty response text received.")
+    parsed_json, decode_error = find_json_object(response_text)
+    if parsed_json is None:
+        logging.error(f"Could not decode packed LLM response ({decode_error}). Raw response: {response_text[:500]}...")
+        if decode_error is not None:
+            raise JSONParsingError(f"Error decoding JSON from packed LLM response: {decode_error}.")
+        raise JSONParsingError("Could not find valid JSON structure in the packed LLM response.")
+    items = parsed_json.get("contracts")
+    if not isinstance(items, list):
+        raise JSONParsingError("Packed LLM response has no 'contracts' array.")
+
+    expected = set(contract_ids)
+    results = {}
+    for item in items:
+        contract_id = item.get("contract_id") if isinstance(item, dict) else None
+        if not isinstance(contract_id, str) or contract_id not in expected or contract_id in results:
+            logging.warning(f"Ignoring packed result with unexpected or duplicate contract_id: {contract_id!r}")
+            continue
+        missing = [field for field in CONTRACT_FIELDS if field not in item]
+        if missing:
+            logging.warning(f"Packed result for {contract_id} is missing {len(missing)} field(s), e.g. '{missing[0]}'.")
+            continue
+        results[contract_id] = _extract_field_values({k: v for k, v in item.items() if k != "contract_id"})
+    return results
+
+
+def pack_contracts(token_counts, token_budget=PACK_TOKEN_BUDGET, max_contracts=PACK_MAX_CONTRACTS):
+    """
+    Greedily groups contracts, in order, into packs that fit the token budget.
+
+    Args:
+        token_counts: Estimated tokens of each contract's text.
+        token_budget: Maximum total tokens per pack.
+        max_contracts: Maximum contracts per pack.
+
+    Returns:
+        A list of packs, each a list of indices into `token_counts`. A contract
+        larger than the budget gets a pack of its own.
+    """
+    packs, current, current_tokens = [], [], 0
+    for i, tokens in enumerate(token_counts):
+        if current and (current_tokens + tokens > token_budget or len(current) >= max_contracts):
+            packs.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        packs.append(current)
+    return packs
+
+
+def _extract_pack(contract_texts, api_key, model_name, scheduler, context_cache):
+    """Extracts several contracts in one request; returns {position in contract_texts: data} for the valid ones."""
+    contract_ids = [f"C{i + 1}" for i in range(len(contract_texts))]
+    try:
+        model = get_model(api_key, model_name, context_cache, packed=True)
+        prompt = build_packed_prompt(list(zip(contract_ids, contract_texts)))
+        if scheduler is None:
+            response = model.generate_content(prompt)
+        else:
+            response = scheduler.call(lambda: model.generate_content(prompt),
+                                      _request_tokens(prompt, packed=True))
+        by_id = parse_packed_response(_extract_response_text(response), contract_ids)
+    except LLMConfigurationError:
+        raise
+    except Exception as e:
+        raise _wrap_llm_error(e)
+    return {i: by_id[contract_id] for i, contract_id in enumerate(contract_ids) if contract_id in by_id}
+
+
+def get_contract_data_packed(contract_texts, api_key, token_budget=PACK_TOKEN_BUDGET,
+                             max_contracts_per_pack=PACK_MAX_CONTRACTS, max_workers=4, return_exceptions=True,
+                             model_name=MODEL_NAME, cache=None, scheduler=None, context_cache=False):
+    """
+    Extracts many small contracts with several contracts per request.
+
+    Contracts not already in the cache are grouped with `pack_contracts` and
+    each pack is sent as a single request, so the round trip and the
+    instruction prefix are paid once per pack instead of once per contract.
+    Any contract whose packed result is missing or invalid, or whose whole
+    pack failed, is retried on its own with `get_contract_data`. A contract
+    larger than `token_budget` is always extracted on its own.
+
+    Args:
+        contract_texts: An iterable of contract text strings.
+        api_key: The Gemini API key.
+        token_budget: Maximum estimated contract-text tokens per packed request.
+        max_contracts_per_pack: Maximum contracts per packed request.
+        max_workers: Maximum number of requests in flight at the same time.
+        return_exceptions: If True (default), a failed contract yields its
+                           exception in the results. If False, the first
+                           failure is raised once all packs have finished.
+        model_name: The Gemini model to use. Defaults to MODEL_NAME.
+        cache: Optional ExtractionCache. Packed results are stored under
+               their own prompt version (PACKED_PROMPT_VERSION), since they
+               are not validated or repaired; single-contract results from
+               `get_contract_data` (default options) are also reused.
+        scheduler: Optional RequestScheduler shared by all requests.
+        context_cache: As for `get_contract_data`.
+
+    Returns:
+        A list with one entry per contract, in input order: the parsed data
+        dict, or the exception raised for that contract.
+
+    Raises:
+        ValueError: If api_key is empty.
+    """
+    if not api_key:
+        raise ValueError("API key must be provided.")
+    contract_texts = list(contract_texts)
+    results = [None] * len(contract_texts)
+    cache_keys = {}
+    pending = []
+    for i, contract_text in enumerate(contract_texts):
+        if not contract_text:
+            results[i] = ValueError("Contract text cannot be empty.")
+            continue
+        if cache is not None:
+            cache_keys[i] = cache.make_key(contract_text, model_name, PACKED_PROMPT_VERSION)
+            # A single-contract extraction is as good as a packed one
+            cached_data = cache.get(cache_keys[i])
+            if cached_data is None:
+                cached_data = cache.get(_extraction_cache_key(cache, contract_text, model_name))
+            if cached_data is not None:
+                results[i] = cached_data
+                continue
+        pending.append(i)
+
+    packs = pack_contracts([estimate_tokens(contract_texts[i]) for i in pending], token_budget, max_contracts_per_pack)
+    packs = [[pending[j] for j in pack] for pack in packs]
+    logging.info(f"Extracting {len(pending)} contracts in {len(packs)} requests "
+                 f"({len(contract_texts) - len(pending)} served from cache or skipped).")
+
+    def extract_single(i):
+        try:
+            return get_contract_data(contract_texts[i], api_key, model_name=model_name, cache=cache,
+                                     scheduler=scheduler, context_cache=context_cache)
+        except (ValueError, LLMConfigurationError, LLMGenerationError, JSONParsingError) as e:
+            return e
+
+    def extract_pack(pack):
+        if len(pack) == 1:
+            return {pack[0]: extract_single(pack[0])}
+        try:
+            extracted = _extract_pack([contract_texts[i] for i in pack], api_key, model_name, scheduler, context_cache)
+        except (LLMConfigurationError, LLMGenerationError, JSONParsingError) as e:
+            logging.warning(f"Packed request for {len(pack)} contracts failed ({e}); extracting them one by one.")
+            extracted = {}
+        pack_results = {}
+        for position, i in enumerate(pack):
+            if position in extracted:
+                pack_results[i] = extracted[position]
+                if cache is not None:
+                    cache.set(cache_keys[i], extracted[position])
+            else:
+                pack_results[i] = extract_single(i)
+        return pack_results
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for pack_results in executor.map(extract_pack, packs):
+            for i, result in pack_results.items():
+                results[i] = result
+
+    if not return_exceptions:
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+    return results
+
+
+# --- Streaming Extraction ---
+
+class IncrementalFieldParser:
+    """
+    Incremental parser for a streamed top-level JSON object of fields.
+
+    Feed it response chunks as they arrive; each call returns the fields whose
+    values completed in that chunk. Field values may be plain JSON values or
+    legacy {"description", "type", "value"} objects (the 'value' is
+    returned). Text before the first '{' (e.g., a ```json fence) is
+    ignored. Each chunk is scanned once and only the key or value in
+    progress is kept across chunks, so work is linear in the total response
+    length.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._key = None
+        self._in_value = False
+        # The key or value being read: its text from earlier chunks, and where it starts in the current one
+        self._capture_parts = None
+        self._capture_start = None
+        self._done = False
+
+    def _start_capture(self, pos):
+        self._capture_parts = []
+        self._capture_start = pos
+
+    def _end_capture(self, chunk, end):
+        self._capture_parts.append(chunk[self._capture_start:end])
+        captured = "".join(self._capture_parts)
+        self._capture_parts = None
+        self._capture_start = None
+        return captured
+
+    def _emit(self, chunk, end):
+        raw = self._end_capture(chunk, end).strip()
+        key = self._key
+        self._key = None
+        self._in_value = False
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            logging.warning(f"Could not decode streamed value for '{key}': {raw[:100]}")
+            return None
+        if isinstance(value, dict):
+            value = value.get('value', None)
+        if value is None and key in _NULL_AS:
+            value = _NULL_AS[key]
+        return key, value
+
+    def feed(self, chunk):
+        """
+        Consumes the next piece of the response.
+
+        Returns:
+            A list of (field, value) tuples completed by this chunk.
+        """
+        completed = []
+        if self._done or not chunk:
+            return completed
+        self._chunks.append(chunk)
+        for pos, char in enumerate(chunk):
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._key is None and not self._in_value:
+                        self._key = json.loads(self._end_capture(chunk, pos + 1))
+                continue
+            if self._depth == 0:
+                if char == '{':
+                    self._depth = 1
+                continue
+            if char == '"':
+                self._in_string = True
+                if self._depth == 1 and self._key is None and not self._in_value:
+                    self._start_capture(pos)
+            elif char in '{[':
+                self._depth += 1
+            elif char in '}]':
+                self._depth -= 1
+                if self._depth == 1 and self._in_value and char == '}':
+                    # A field's value object just closed: emit it without waiting for the comma
+                    field = self._emit(chunk, pos + 1)
+                    if field:
+                        completed.append(field)
+                elif self._depth == 0:
+                    if self._in_value:
+                        field = self._emit(chunk, pos)
+                        if field:
+                            completed.append(field)
+                    self._done = True
+                    break
+            elif self._depth == 1:
+                if char == ':' and self._key is not None:
+                    self._in_value = True
+                    self._start_capture(pos + 1)
+                elif char == ',' and self._in_value:
+                    field = self._emit(chunk, pos)
+                    if field:
+                        completed.append(field)
+        if self._capture_parts is not None and not self._done:
+            self._capture_parts.append(chunk[self._capture_start:])
+            self._capture_start = 0
+        return completed
+
+    @property
+    def text(self):
+        """Everything fed so far."""
+        return "".join(self._chunks)
+
+
+def stream_contract_data(contract_text, api_key, model_name=MODEL_NAME, cache=None, retrieval_top_k=None,
+                         scheduler=None, context_cache=False, normalize=False, repair=False, fields=None):
+    """
+    Streaming version of `get_contract_data` that yields fields as soon as the model writes them.
+
+    The response is consumed chunk by chunk through an IncrementalFieldParser,
+    so the first fields are available after a fraction of the full generation
+    time. When the stream ends the complete response is parsed with
+    `parse_llm_response` (and, with `repair`, missing or invalid fields are
+    re-asked as in `get_contract_data`); any field that could not be decoded
+    incrementally (or whose value differs) is yielded then, and the final
+    result is stored in the cache.
+
+    Args:
+        Same as `get_contract_data`.
+
+    Yields:
+        (field, value) tuples. A field may be yielded twice if the final
+        parse corrects an incrementally parsed value; the last one wins.
+
+    Raises:
+        Same as `get_contract_data`.
+    """
+    if not contract_text:
+        raise ValueError("Contract text cannot be empty.")
+    if not api_key:
+        raise ValueError("API key must be provided.")
+
+    requested = _requested_fields(fields)
+    field_names = None if len(requested) == len(CONTRACT_FIELDS) else requested
+
+    cache_key = None
+    if cache is not None:
+        cache_key = _extraction_cache_key(cache, contract_text, model_name, retrieval_top_k=retrieval_top_k,
+                                          normalize=normalize, fields=requested, repair=repair)
+        cached_data = cache.get(cache_key)
+        if cached_data is not None:
+            logging.info("Extraction cache hit; skipping LLM call.")
+            yield from cached_data.items()
+            return
+
+    model = get_model(api_key, model_name, context_cache, field_names)
+    if retrieval_top_k is not None:
+        contract_text = select_relevant_sections(contract_text, retrieval_top_k)
+    if normalize:
+        contract_text = normalize_contract_text(contract_text)
+    prompt = build_contract_prompt(contract_text)
+
+    parser = IncrementalFieldParser()
+    streamed = {}
+    try:
+        if scheduler is None:
+            response = model.generate_content(prompt, stream=True)
+        else:
+            response = scheduler.call(lambda: model.generate_content(prompt, stream=True),
+                                      _request_tokens(prompt, field_names))
+        for chunk in response:
+            for field, value in parser.feed(_extract_response_text(chunk)):
+                if field_names is not None and field not in requested:
+                    continue
+                streamed[field] = value
+                yield field, value
+        extracted_data = parse_llm_response(parser.text, repair=repair, fields=field_names)
+    except Exception as e:
+        raise _wrap_llm_error(e)
+    if repair:
+        extracted_data = _repair_invalid_fields(extracted_data, contract_text, api_key, model_name, field_names,
+                                                scheduler, context_cache)
+
+    for field, value in extracted_data.items():
+        if field not in streamed or streamed[field] != value:
+            yield field, value
+    if cache is not None:
+        cache.set(cache_key, extracted_data)
+
+
+# --- Async API ---
+
+async def aget_contract_data(contract_text, api_key, semaphore=None, model_name=MODEL_NAME, cache=None,
+                             scheduler=None, context_cache=False, retrieval_top_k=None, rules=None, provenance=None,
+                             normalize=False, repair=False, fields=None):
+    """
+    Async counterpart of `get_contract_data`, built on `generate_content_async`.
+
+    The coroutine never blocks the event loop while waiting on Gemini, so a
+    single process can keep many extractions in flight. Cancelling the task
+    cancels the underlying request. Results share the cache with
+    `get_contract_data` under the same options.
+
+    Args:
+        contract_text: The string content of the contract.
+        api_key: The Gemini API key.
+        semaphore: Optional asyncio.Semaphore bounding concurrent API calls;
+                   share one across calls to enforce a global limit.
+        model_name: The Gemini model to use. Defaults to MODEL_NAME.
+        cache: Optional ExtractionCache, as for `get_contract_data`.
+        scheduler: Optional RequestScheduler, as for `get_contract_data`.
+        context_cache: As for `get_contract_data`.
+        retrieval_top_k, rules, provenance, normalize, fields: As for `get_contract_data`.
+        repair: As for `get_contract_data`. The follow-up request for
+                invalid fields runs in a worker thread, under `semaphore`.
+
+    Returns:
+        A dictionary containing the parsed contract data.
+
+    Raises:
+        Same as `get_contract_data`, plus asyncio.CancelledError if cancelled.
+    """
+    if not contract_text:
+        raise ValueError("Contract text cannot be empty.")
+    if not api_key:
+        raise ValueError("API key must be provided.")
+    requested = _requested_fields(fields)
+
+    cache_key = None
+    if cache is not None:
+        cache_key = _extraction_cache_key(cache, contract_text, model_name, None, retrieval_top_k, rules, normalize,
+                                          requested, repair)
+        cached_data = cache.get(cache_key)
+        if cached_data is not None:
+            if provenance is not None:
+                provenance.update((field, {"source": "cache"}) for field in cached_data)
+            return cached_data
+
+    resolved, rule_provenance = rules.extract(contract_text) if rules is not None else ({}, {})
+    resolved = {field: value for field, value in resolved.items() if field in requested}
+    remaining = [field for field in requested if field not in resolved]
+    extracted_data = {}
+    if remaining:
+        if retrieval_top_k is not None:
+            contract_text = select_relevant_sections(contract_text, retrieval_top_k)
+        if normalize:
+            contract_text = normalize_contract_text(contract_text)
+        field_names = None if len(remaining) == len(CONTRACT_FIELDS) else remaining
+        model = _get_async_model(api_key, model_name, context_cache, field_names)
+        prompt = build_contract_prompt(contract_text)
+
+        async def generate():
+            if scheduler is None:
+                return await model.generate_content_async(prompt)
+            return await scheduler.acall(lambda: model.generate_content_async(prompt),
+                                         _request_tokens(prompt, field_names))
+
+        async def extract():
+            response = await generate()
+            data = parse_llm_response(_extract_response_text(response), repair=repair, fields=field_names)
+            if repair:
+                data = await asyncio.to_thread(_repair_invalid_fields, data, contract_text, api_key, model_name,
+                                               field_names, scheduler, context_cache)
+            return data
+
+        try:
+            if semaphore is None:
+                extracted_data = await extract()
+            else:
+                async with semaphore:
+                    extracted_data = await extract()
+        except Exception as e:
+            # asyncio.CancelledError is a BaseException, so cancellation propagates untouched
+            raise _wrap_llm_error(e)
+
+    if resolved:
+        extracted_data = _merge_resolved_fields(extracted_data, resolved)
+    if provenance is not None:
+        provenance.update((field, rule_provenance.get(field, {"source": "llm"})) for field in extracted_data)
+
+    if cache is not None:
+        cache.set(cache_key, extracted_data)
+    return extracted_data
+
+
+async def aget_contract_data_batch(contract_texts, api_key, max_concurrency=8, return_exceptions=True,
+                                   model_name=MODEL_NAME, cache=None, scheduler=None, context_cache=False,
+                                   **extract_options):
+    """
+    Extracts many contracts concurrently with at most `max_concurrency` calls in flight.
+
+    Args:
+        contract_texts: An iterable of contract text strings.
+        api_key: The Gemini API key.
+        max_concurrency: Maximum number of simultaneous API calls.
+        return_exceptions: If True (default), a failed contract yields its
+                           exception in the results instead of aborting the
+                           batch. If False, the first failure cancels the
+                           remaining extractions and is raised.
+        model_name: The Gemini model to use. Defaults to MODEL_NAME.
+        cache: Optional ExtractionCache shared by all extractions in the batch.
+        scheduler: Optional RequestScheduler shared by all extractions in the batch.
+        context_cache: If True, all extractions share one cached instruction prefix.
+        **extract_options: Passed through to `aget_contract_data`
+                           (retrieval_top_k, rules, normalize, repair, fields).
+
+    Returns:
+        A list with one entry per contract, in input order: the parsed data
+        dict, or the exception raised for that contract.
+    """
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be at least 1.")
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+    tasks = [
+        asyncio.ensure_future(aget_contract_data(text, api_key, semaphore=semaphore, model_name=model_name,
+                                                 cache=cache, scheduler=scheduler, context_cache=context_cache,
+                                                 **extract_options))
+        for text in contract_texts
+    ]
+    try:
+        return await asyncio.gather(*tasks, return_exceptions=return_exceptions)
+    finally:
+        # On cancellation or a raised failure, don't leave orphaned requests running
+        for task in tasks:
+            if not task.done():
+                task.cancel()